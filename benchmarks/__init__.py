@@ -0,0 +1,17 @@
+"""
+Benchmark suite for BC-GCC
+
+Benchmarks run against synthetic traces (see benchmarks/synthetic.py), so
+they work without the real pickles under data/.
+
+Usage (from the repository root):
+    python -m benchmarks.run --scale small --out bench_results.json
+    python -m benchmarks.compare baseline.json bench_results.json
+"""
+import sys
+from pathlib import Path
+
+# Training modules use flat imports (`from config import Config`)
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
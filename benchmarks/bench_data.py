@@ -0,0 +1,100 @@
+"""
+Data pipeline benchmarks: trace loading, normalisation, preprocessing and DataLoader throughput
+"""
+import time
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from dataset import GCCDataset, normalize_features
+from prepare_data import prepare_split
+
+from .common import benchmark, quiet, summarize_times, time_call
+
+
+def _build_dataset(ctx, files):
+    with quiet():
+        return GCCDataset(files, ctx.config, mode='bench')
+
+
+def _tensor_dataset(ctx, num_samples: int):
+    """Random preprocessed-style tensors (features in raw units, like train_tensors.pt)"""
+    generator = torch.Generator().manual_seed(0)
+    features = torch.rand(num_samples, ctx.config.WINDOW_SIZE, ctx.config.TOTAL_FEATURE_DIM,
+                          generator=generator) * 1e6
+    targets = torch.rand(num_samples, 1, generator=generator) * 5e6
+    weights = torch.ones(num_samples, 1)
+    return TensorDataset(features, targets, weights)
+
+
+@benchmark('load_file')
+def bench_load_file(ctx):
+    """GCCDataset._load_file over the synthetic corpus (pickle -> windowed samples)"""
+    dataset = _build_dataset(ctx, [])
+    per_file = []
+    with quiet():
+        for path in ctx.files:
+            start = time.perf_counter()
+            dataset._load_file(path)
+            per_file.append(time.perf_counter() - start)
+
+    total = sum(per_file)
+    return {
+        'files': len(ctx.files),
+        'samples': len(dataset),
+        'total_s': total,
+        'samples_per_sec': len(dataset) / total if total > 0 else 0.0,
+        'per_file': summarize_times(per_file),
+    }
+
+
+@benchmark('normalize_features')
+def bench_normalize_features(ctx):
+    """normalize_features on one [BATCH_SIZE, WINDOW_SIZE, TOTAL_FEATURE_DIM] batch"""
+    features = _tensor_dataset(ctx, ctx.batch_size).tensors[0].to(ctx.device)
+    sync = torch.cuda.synchronize if ctx.device == 'cuda' else None
+    times = time_call(lambda: normalize_features(features, ctx.config), ctx.repeats * 10, warmup=3, sync=sync)
+    return summarize_times(times, items_per_call=ctx.batch_size)
+
+
+@benchmark('prepare_split')
+def bench_prepare_split(ctx):
+    """prepare_data.prepare_split: dataset -> stacked tensors -> .pt file"""
+    dataset = _build_dataset(ctx, ctx.files)
+    loader = DataLoader(dataset, batch_size=ctx.batch_size)
+    save_path = ctx.work_dir / 'bench_split.pt'
+
+    start = time.perf_counter()
+    with quiet():
+        prepare_split(loader, 'bench', save_path, ctx.config)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'samples': len(dataset),
+        'total_s': elapsed,
+        'samples_per_sec': len(dataset) / elapsed if elapsed > 0 else 0.0,
+        'file_mb': save_path.stat().st_size / 1024**2,
+    }
+    save_path.unlink()
+    return result
+
+
+@benchmark('dataloader')
+def bench_dataloader(ctx):
+    """One full pass of a DataLoader, for GCCDataset and for preprocessed TensorDataset"""
+    results = {}
+    datasets = {
+        'gcc_dataset': _build_dataset(ctx, ctx.files),
+    }
+    datasets['tensor_dataset'] = _tensor_dataset(ctx, len(datasets['gcc_dataset']))
+
+    for name, dataset in datasets.items():
+        loader = DataLoader(dataset, batch_size=ctx.batch_size, shuffle=True, num_workers=0)
+
+        def epoch():
+            for _ in loader:
+                pass
+
+        times = time_call(epoch, max(ctx.repeats // 2, 1), warmup=1)
+        results[name] = summarize_times(times, items_per_call=len(dataset))
+    return results
@@ -0,0 +1,55 @@
+"""
+Ensemble benchmark: K GCCBC_LSTM members, one forward per member vs GCCBC_Ensemble
+
+Latency of the mean/spread prediction for growing K, for the online case
+(a single window) and for a BATCH_SIZE batch, with the LSTM forced onto the
+stacked cell, forced onto per-member native calls and chosen by 'auto',
+plus the largest deviation of either path from the per-member forwards.
+"""
+import torch
+
+from ensemble import GCCBC_Ensemble
+from model import GCCBC_LSTM
+
+from .bench_model import _batch, _sync
+from .common import benchmark, summarize_times, time_call
+
+MEMBERS = [1, 2, 4, 8]
+
+
+@benchmark('ensemble')
+def bench_ensemble(ctx):
+    """Mean/spread latency vs number of members: sequential forwards vs one stacked forward"""
+    torch.manual_seed(0)
+    models = [GCCBC_LSTM(ctx.config).to(ctx.device).eval() for _ in range(max(MEMBERS))]
+    results = {}
+    for k in MEMBERS:
+        members = models[:k]
+        ensemble = GCCBC_Ensemble(members, path='auto').to(ctx.device).eval()
+
+        def sequential(x):
+            outputs = torch.stack([model(x)[0] for model in members])
+            return outputs.mean(dim=0), outputs.std(dim=0, unbiased=False)
+
+        entry = {}
+        for batch_size in [1, ctx.batch_size]:
+            features, _, _ = _batch(ctx, batch_size)
+            repeats = ctx.repeats * 20 if batch_size == 1 else ctx.repeats
+            with torch.no_grad():
+                reference = torch.stack([m(features)[0] for m in members])
+                deviation = max((ensemble.members(features, path) - reference).abs().max().item()
+                                for path in ('stacked', 'member'))
+                stats = {'sequential': time_call(lambda: sequential(features), repeats, warmup=2, sync=_sync(ctx))}
+                for path in ('stacked', 'member'):
+                    stats[path] = time_call(lambda: ensemble.members(features, path), repeats, warmup=2,
+                                            sync=_sync(ctx))
+                stats['auto'] = time_call(lambda: ensemble(features), repeats, warmup=2, sync=_sync(ctx))
+            stats = {name: summarize_times(times, items_per_call=batch_size) for name, times in stats.items()}
+            entry[f'batch_{batch_size}'] = dict(
+                stats,
+                selected_path=ensemble.select_path(features),
+                speedup=stats['sequential']['median_ms'] / stats['auto']['median_ms'],
+                max_abs_diff=float(deviation),
+            )
+        results[f'k_{k}'] = entry
+    return results
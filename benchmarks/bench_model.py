@@ -0,0 +1,67 @@
+"""
+Model benchmarks: training step (forward/backward) and prediction latency
+"""
+import torch
+
+from model import GCCBC_LSTM, CombinedLoss
+
+from .common import benchmark, summarize_times, time_call
+
+
+def _sync(ctx):
+    return torch.cuda.synchronize if ctx.device == 'cuda' else None
+
+
+def _batch(ctx, batch_size: int):
+    generator = torch.Generator().manual_seed(0)
+    features = torch.rand(batch_size, ctx.config.WINDOW_SIZE, ctx.config.TOTAL_FEATURE_DIM, generator=generator)
+    targets = torch.rand(batch_size, 1, generator=generator)
+    weights = torch.ones(batch_size, 1)
+    return features.to(ctx.device), targets.to(ctx.device), weights.to(ctx.device)
+
+
+@benchmark('forward_backward')
+def bench_forward_backward(ctx):
+    """GCCBC_LSTM forward, backward and full train step at BATCH_SIZE"""
+    torch.manual_seed(0)
+    model = GCCBC_LSTM(ctx.config).to(ctx.device)
+    criterion = CombinedLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=ctx.config.LEARNING_RATE)
+    features, targets, weights = _batch(ctx, ctx.batch_size)
+    model.train()
+
+    def forward():
+        with torch.no_grad():
+            model(features)
+
+    def train_step():
+        predictions, _ = model(features)
+        loss = criterion(predictions, targets, weights)
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        optimizer.step()
+
+    return {
+        'batch_size': ctx.batch_size,
+        'parameters': model.count_parameters(),
+        'forward': summarize_times(time_call(forward, ctx.repeats, warmup=2, sync=_sync(ctx)),
+                                   items_per_call=ctx.batch_size),
+        'train_step': summarize_times(time_call(train_step, ctx.repeats, warmup=2, sync=_sync(ctx)),
+                                      items_per_call=ctx.batch_size),
+    }
+
+
+@benchmark('predict')
+def bench_predict(ctx):
+    """GCCBC_LSTM.predict latency for a single window and for small batches"""
+    torch.manual_seed(0)
+    model = GCCBC_LSTM(ctx.config).to(ctx.device)
+    results = {}
+    for batch_size in [1, 16, 256]:
+        features, _, _ = _batch(ctx, batch_size)
+        if batch_size == 1:
+            features = features[0]  # [seq_len, feature_dim], the online inference case
+        times = time_call(lambda: model.predict(features), ctx.repeats * 20, warmup=5, sync=_sync(ctx))
+        results[f'batch_{batch_size}'] = summarize_times(times, items_per_call=batch_size)
+    return results
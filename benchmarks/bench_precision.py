@@ -0,0 +1,136 @@
+"""
+CPU precision benchmark: fp32 vs bfloat16 autocast (Config.USE_BF16_CPU)
+
+Measures train-step and predict throughput in both precisions, how far bf16
+predictions drift from fp32 with identical weights, and the validation
+loss / R² reached after the same number of training steps on the synthetic
+corpus.
+"""
+import torch
+from torch.utils.data import DataLoader
+
+from config import config_from_dict
+from dataset import GCCDataset, normalize_features
+from model import GCCBC_LSTM, CombinedLoss
+
+from .common import benchmark, quiet, summarize_times, time_call
+
+
+def _normalize_targets(targets, config):
+    stats = config.NORM_STATS['bandwidth_prediction']
+    return (targets - stats['min']) / (stats['max'] - stats['min'])
+
+
+def _load_batches(ctx):
+    """Normalized (features, targets, weights) batches split by file into train/val"""
+    split = max(len(ctx.files) * 3 // 4, 1)
+    batches = {}
+    for name, files in [('train', ctx.files[:split]), ('val', ctx.files[split:] or ctx.files[:1])]:
+        with quiet():
+            dataset = GCCDataset(files, ctx.config, mode='bench')
+        loader = DataLoader(dataset, batch_size=ctx.batch_size, shuffle=(name == 'train'),
+                            generator=torch.Generator().manual_seed(0))
+        batches[name] = [
+            (normalize_features(f, ctx.config), _normalize_targets(t, ctx.config), w)
+            for f, t, w in loader
+        ]
+    return batches['train'], batches['val']
+
+
+def _train_and_evaluate(config, bf16: bool, train_batches, val_batches, steps: int):
+    torch.manual_seed(0)
+    model = GCCBC_LSTM(config)
+    criterion = CombinedLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=config.LEARNING_RATE)
+
+    model.train()
+    for step in range(steps):
+        features, targets, weights = train_batches[step % len(train_batches)]
+        with torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+            predictions, _ = model(features)
+        loss = criterion(predictions.float(), targets, weights)
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        optimizer.step()
+
+    model.eval()
+    total_loss, total, preds, targs = 0.0, 0, [], []
+    with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+        for features, targets, weights in val_batches:
+            predictions = model(features)[0].float()
+            total_loss += criterion(predictions, targets, weights).item() * len(features)
+            total += len(features)
+            preds.append(predictions)
+            targs.append(targets)
+    preds, targs = torch.cat(preds), torch.cat(targs)
+    ss_res = ((targs - preds) ** 2).sum()
+    ss_tot = ((targs - targs.mean()) ** 2).sum()
+    return {
+        'val_loss': total_loss / total,
+        'val_r2': float(1 - ss_res / ss_tot) if ss_tot > 0 else 0.0,
+    }
+
+
+@benchmark('cpu_bf16')
+def bench_cpu_bf16(ctx):
+    """fp32 vs bf16 autocast on CPU: train-step/predict throughput and accuracy"""
+    if ctx.device != 'cpu':
+        return {'skipped': 'CPU-only benchmark'}
+
+    results = {
+        'cpu_capability': torch.backends.cpu.get_cpu_capability()
+        if hasattr(torch.backends, 'cpu') else None,
+    }
+    train_batches, val_batches = _load_batches(ctx)
+    features, targets, weights = train_batches[0]
+
+    # --- Throughput ---
+    for precision, bf16 in [('fp32', False), ('bf16', True)]:
+        torch.manual_seed(0)
+        model = GCCBC_LSTM(ctx.config)
+        criterion = CombinedLoss()
+        optimizer = torch.optim.Adam(model.parameters(), lr=ctx.config.LEARNING_RATE)
+        model.train()
+
+        def train_step():
+            with torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+                predictions, _ = model(features)
+            loss = criterion(predictions.float(), targets, weights)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        infer_model = GCCBC_LSTM(config_from_dict({'USE_BF16_CPU': bf16}, base=ctx.config))
+        single = features[0]
+        results[precision] = {
+            'train_step': summarize_times(time_call(train_step, ctx.repeats, warmup=2),
+                                          items_per_call=len(features)),
+            'predict_batch': summarize_times(time_call(lambda: infer_model.predict(features), ctx.repeats, warmup=2),
+                                             items_per_call=len(features)),
+            'predict_single': summarize_times(time_call(lambda: infer_model.predict(single), ctx.repeats * 20, warmup=5),
+                                              items_per_call=1),
+        }
+
+    results['train_speedup'] = (results['fp32']['train_step']['median_ms']
+                                / results['bf16']['train_step']['median_ms'])
+    results['predict_batch_speedup'] = (results['fp32']['predict_batch']['median_ms']
+                                        / results['bf16']['predict_batch']['median_ms'])
+
+    # --- Numerical agreement with identical weights ---
+    torch.manual_seed(0)
+    model = GCCBC_LSTM(ctx.config).eval()
+    with torch.no_grad():
+        ref = model(features)[0]
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            low = model(features)[0].float()
+    results['prediction_abs_err_mean'] = float((low - ref).abs().mean())
+    results['prediction_abs_err_max'] = float((low - ref).abs().max())
+
+    # --- Accuracy after the same number of optimizer steps ---
+    steps = ctx.repeats * 10
+    results['train_steps'] = steps
+    for precision, bf16 in [('fp32', False), ('bf16', True)]:
+        results[precision].update(_train_and_evaluate(ctx.config, bf16, train_batches, val_batches, steps))
+
+    return results
@@ -0,0 +1,43 @@
+"""
+Replay buffer benchmarks: batched insert, prioritized sample and priority update
+"""
+import numpy as np
+
+from replay_buffer import ReplayBuffer
+
+from .common import benchmark, summarize_times, time_call
+
+
+@benchmark('replay_buffer')
+def bench_replay_buffer(ctx):
+    """ReplayBuffer insert / sample / update_priorities throughput at BATCH_SIZE"""
+    capacity = ctx.scale['replay_capacity']
+    batch_size = ctx.batch_size
+    rng = np.random.default_rng(0)
+    shape = (batch_size, ctx.config.WINDOW_SIZE, ctx.config.TOTAL_FEATURE_DIM)
+    states = rng.random(shape, dtype=np.float32)
+    actions = rng.random(batch_size, dtype=np.float32)
+    dones = actions > 0.99
+
+    results = {'capacity': capacity, 'batch_size': batch_size}
+    for name, path in [('ram', None), ('memmap', ctx.work_dir / 'replay')]:
+        buffer = ReplayBuffer(capacity, ctx.config.WINDOW_SIZE, ctx.config.TOTAL_FEATURE_DIM,
+                              path=path, seed=0)
+        # Fill once so inserts overwrite touched pages and samples see a full buffer
+        for _ in range(-(-capacity // batch_size)):
+            buffer.add(states, actions, actions, states, dones)
+        batch = buffer.sample(batch_size)
+        td_errors = rng.random(batch_size)
+        results[name] = {
+            'insert': summarize_times(time_call(lambda: buffer.add(states, actions, actions, states, dones),
+                                                ctx.repeats * 10), items_per_call=batch_size),
+            'sample': summarize_times(time_call(lambda: buffer.sample(batch_size), ctx.repeats * 10),
+                                      items_per_call=batch_size),
+            'sample_uniform': summarize_times(time_call(lambda: buffer.sample(batch_size, prioritized=False),
+                                                        ctx.repeats * 10), items_per_call=batch_size),
+            'update_priorities': summarize_times(
+                time_call(lambda: buffer.update_priorities(batch['indices'], td_errors), ctx.repeats * 10),
+                items_per_call=batch_size),
+        }
+        del buffer
+    return results
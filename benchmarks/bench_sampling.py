@@ -0,0 +1,122 @@
+"""
+Training sampler benchmark: uniform shuffle vs loss-aware hard-example mining
+
+Trains the same model from the same initialization with both samplers on the
+synthetic corpus and records the validation R² curve against optimizer steps
+and training wall-clock (evaluation excluded), the time and steps to reach
+each target R², and the sampler's own cost per batch.
+"""
+import time
+
+import torch
+
+from config import config_from_dict
+from dataset import GCCDataset, LossAwareSampler, normalize_features
+from model import GCCBC_LSTM, CombinedLoss
+
+from .common import benchmark, quiet
+
+TARGET_R2 = [0.8, 0.9, 0.95]
+EVALUATIONS = 10
+
+
+def _normalize_targets(targets, config):
+    stats = config.NORM_STATS['bandwidth_prediction']
+    return (targets - stats['min']) / (stats['max'] - stats['min'])
+
+
+def _load_split(ctx, files):
+    with quiet():
+        dataset = GCCDataset(files, ctx.config, mode='bench')
+    features = torch.stack([dataset[i][0] for i in range(len(dataset))])
+    targets = torch.tensor([[s['target']] for s in dataset.samples], dtype=torch.float32)
+    weights = torch.tensor(dataset.weights, dtype=torch.float32).unsqueeze(1)
+    return normalize_features(features, ctx.config), _normalize_targets(targets, ctx.config), weights
+
+
+def _r2(model, val):
+    features, targets, _ = val
+    model.eval()
+    with torch.no_grad():
+        predictions = model(features)[0]
+    model.train()
+    ss_res = ((targets - predictions) ** 2).sum()
+    ss_tot = ((targets - targets.mean()) ** 2).sum()
+    return float(1 - ss_res / ss_tot) if ss_tot > 0 else 0.0
+
+
+def _train(config, train, val, total_steps: int, hard: bool):
+    features, targets, weights = train
+    n = len(features)
+    torch.manual_seed(0)
+    model = GCCBC_LSTM(config)
+    criterion = CombinedLoss(config.MSE_WEIGHT, config.MAPE_WEIGHT)
+    optimizer = torch.optim.Adam(model.parameters(), lr=config.LEARNING_RATE)
+    sampler = LossAwareSampler(n, config.BATCH_SIZE, config) if hard else None
+    generator = torch.Generator().manual_seed(0)
+
+    def batches():
+        while True:
+            if sampler is None:
+                order = torch.randperm(n, generator=generator)
+                for start in range(0, n, config.BATCH_SIZE):
+                    yield order[start:start + config.BATCH_SIZE], None
+            else:
+                for indices in sampler:
+                    _, importance = sampler.next_batch()
+                    yield torch.as_tensor(indices), importance
+
+    eval_every = max(1, total_steps // EVALUATIONS)
+    curve, train_s, sampler_s, step = [], 0.0, 0.0, 0
+    model.train()
+    start = time.perf_counter()
+    for indices, importance in batches():
+        fetched = time.perf_counter()
+        if sampler is not None:
+            sampler_s += fetched - start
+        predictions, _ = model(features[indices])
+        if sampler is None:
+            loss = criterion(predictions, targets[indices], weights[indices])
+        else:
+            sample_losses = criterion(predictions, targets[indices], weights[indices], reduce=False)
+            sampler.update(indices, sample_losses)
+            loss = (sample_losses * importance).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        optimizer.step()
+        step += 1
+        train_s += time.perf_counter() - start
+        if step % eval_every == 0 or step == total_steps:
+            curve.append({'step': step, 'train_s': train_s, 'val_r2': _r2(model, val)})
+        if step == total_steps:
+            break
+        start = time.perf_counter()
+
+    result = {'curve': curve, 'final_val_r2': curve[-1]['val_r2']}
+    for target in TARGET_R2:
+        reached = next((point for point in curve if point['val_r2'] >= target), None)
+        result[f'time_to_r2_{target}'] = reached['train_s'] if reached else None
+        result[f'steps_to_r2_{target}'] = reached['step'] if reached else None
+    if sampler is not None:
+        result['sampler_ms_per_batch'] = sampler_s / step * 1000
+    return result
+
+
+@benchmark('hard_mining')
+def bench_hard_mining(ctx):
+    """Validation R² vs training time: uniform shuffle vs LossAwareSampler (HARD_MINING)"""
+    split = max(len(ctx.files) * 3 // 4, 1)
+    train = _load_split(ctx, ctx.files[:split])
+    val = _load_split(ctx, ctx.files[split:] or ctx.files[:1])
+    config = config_from_dict({'LEARNING_RATE': 1e-3}, base=ctx.config)
+    steps = ctx.repeats * 20
+
+    results = {'train_samples': len(train[0]), 'train_steps': steps}
+    for name, hard in [('uniform', False), ('hard_mining', True)]:
+        results[name] = _train(config, train, val, steps, hard)
+    for target in TARGET_R2:
+        uniform = results['uniform'][f'time_to_r2_{target}']
+        hard = results['hard_mining'][f'time_to_r2_{target}']
+        results[f'speedup_to_r2_{target}'] = uniform / hard if uniform and hard else None
+    return results
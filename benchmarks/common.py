@@ -0,0 +1,127 @@
+"""
+Shared benchmark infrastructure: registry, timing helpers and run context
+"""
+import contextlib
+import io
+import platform
+import subprocess
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from config import Config, config_from_dict
+
+
+# Name -> benchmark function(ctx) -> dict of metrics
+BENCHMARKS: Dict[str, Callable] = {}
+
+# Corpus size / iteration presets
+SCALES = {
+    'small':  {'traces_per_dataset': 4,  'length': 400,  'batch_size': 256,  'repeats': 5,  'replay_capacity': 100_000},
+    'medium': {'traces_per_dataset': 16, 'length': 1500, 'batch_size': 1024, 'repeats': 10, 'replay_capacity': 500_000},
+    'large':  {'traces_per_dataset': 64, 'length': 6000, 'batch_size': 2048, 'repeats': 20, 'replay_capacity': 2_000_000},
+}
+
+
+def benchmark(name: str):
+    """Register a benchmark function under `name`"""
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return decorator
+
+
+@dataclass
+class BenchContext:
+    """Everything a benchmark needs: config, synthetic corpus and scale settings"""
+    config: type
+    corpus_dir: Path
+    work_dir: Path
+    scale: Dict
+    device: str = 'cpu'
+    files: List[str] = field(default_factory=list)
+
+    @property
+    def repeats(self) -> int:
+        return self.scale['repeats']
+
+    @property
+    def batch_size(self) -> int:
+        return self.scale['batch_size']
+
+
+def make_bench_config(corpus_dir, batch_size: int, device: str = 'cpu', **overrides):
+    """Config for benchmarks: synthetic corpus, no oversampling"""
+    values = {
+        'DATA_DIR': str(corpus_dir),
+        'BATCH_SIZE': batch_size,
+        'DEVICE': device,
+        'OVERSAMPLE_FILES': [],
+        'OVERSAMPLE_MULTIPLIERS': [],
+    }
+    values.update(overrides)
+    return config_from_dict(values, base=Config)
+
+
+def time_call(fn: Callable, repeats: int, warmup: int = 1, sync: Callable = None) -> List[float]:
+    """Run fn warmup+repeats times and return per-call wall-clock seconds"""
+    for _ in range(warmup):
+        fn()
+    if sync is not None:
+        sync()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        if sync is not None:
+            sync()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize_times(times: List[float], items_per_call: int = None) -> Dict[str, float]:
+    """Mean / median / p95 / min in milliseconds, plus items/s when given"""
+    arr = np.asarray(times)
+    stats = {
+        'mean_ms': float(arr.mean() * 1000),
+        'median_ms': float(np.median(arr) * 1000),
+        'p95_ms': float(np.percentile(arr, 95) * 1000),
+        'min_ms': float(arr.min() * 1000),
+        'repeats': len(times),
+    }
+    if items_per_call:
+        stats['items_per_sec'] = float(items_per_call / np.median(arr))
+    return stats
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress prints of the training code while benchmarking"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def environment_info() -> Dict[str, str]:
+    """Versions and host info recorded next to every result file"""
+    import torch
+
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+    try:
+        info['git_commit'] = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).resolve().parent, stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['git_commit'] = None
+    return info
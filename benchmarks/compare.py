@@ -0,0 +1,88 @@
+"""
+Compare two benchmark result files and flag regressions
+
+Metrics ending in `_ms` / `_s` are lower-is-better, `per_sec` metrics are
+higher-is-better; everything else is informational and skipped.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10] [--fail]
+"""
+import argparse
+import json
+import sys
+from typing import Dict
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Flatten nested metric dicts into 'bench.sub.metric' -> value"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def metric_direction(name: str):
+    """+1 if higher is better, -1 if lower is better, None if not a performance metric"""
+    leaf = name.rsplit('.', 1)[-1]
+    if leaf.endswith('per_sec'):
+        return 1
+    if leaf.endswith('_ms') or leaf.endswith('_s'):
+        return -1
+    return None
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float = 0.10):
+    """
+    Returns:
+        List of (metric, baseline, candidate, relative_change, status) rows, where
+        relative_change > 0 always means "candidate is better"
+    """
+    base = flatten(baseline['results'])
+    cand = flatten(candidate['results'])
+    rows = []
+    for name in sorted(set(base) & set(cand)):
+        direction = metric_direction(name)
+        if direction is None or base[name] == 0:
+            continue
+        change = (cand[name] - base[name]) / abs(base[name]) * direction
+        if change < -threshold:
+            status = 'REGRESSION'
+        elif change > threshold:
+            status = 'improved'
+        else:
+            status = ''
+        rows.append((name, base[name], cand[name], change, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change to flag (default 10%%)')
+    parser.add_argument('--fail', action='store_true', help='Exit with status 1 on any regression')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    print(f"{'metric':<60} {'baseline':>14} {'candidate':>14} {'change':>9}")
+    print('-' * 100)
+    for name, b, c, change, status in rows:
+        print(f"{name:<60} {b:>14.4g} {c:>14.4g} {change*100:>+8.1f}% {status}")
+
+    regressions = [r for r in rows if r[4] == 'REGRESSION']
+    print(f"\n{len(regressions)} regression(s) beyond {args.threshold*100:.0f}%")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Run the benchmark suite and write machine-readable results
+
+Usage:
+    python -m benchmarks.run [--scale small|medium|large] [--only load_file,predict]
+                             [--out bench_results.json] [--corpus-dir DIR] [--device cpu]
+"""
+import argparse
+import json
+import tempfile
+import time
+import traceback
+from pathlib import Path
+
+from . import bench_data, bench_ensemble, bench_model, bench_precision, bench_replay, bench_sampling  # noqa: F401  (register benchmarks)
+from .common import BENCHMARKS, SCALES, BenchContext, environment_info, make_bench_config
+from .synthetic import write_corpus
+
+
+def run_benchmarks(scale: str = 'small', only=None, corpus_dir=None, device: str = 'cpu'):
+    """
+    Run registered benchmarks
+
+    Returns:
+        Result dict: {'meta': {...}, 'results': {name: metrics}}
+    """
+    settings = SCALES[scale]
+    names = only or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}. Available: {list(BENCHMARKS)}")
+
+    with tempfile.TemporaryDirectory(prefix='bcgcc_bench_') as tmp:
+        work_dir = Path(tmp)
+        if corpus_dir is None:
+            corpus_dir = work_dir / 'corpus'
+            print(f"Generating synthetic corpus ({scale})...")
+            files = write_corpus(corpus_dir, settings['traces_per_dataset'], settings['length'])
+        else:
+            files = sorted(Path(corpus_dir).rglob('*.pickle'))
+
+        ctx = BenchContext(
+            config=make_bench_config(corpus_dir, settings['batch_size'], device=device),
+            corpus_dir=Path(corpus_dir),
+            work_dir=work_dir,
+            scale=settings,
+            device=device,
+            files=[str(f) for f in files],
+        )
+
+        results = {}
+        for name in names:
+            print(f"Running {name}...")
+            start = time.perf_counter()
+            try:
+                results[name] = BENCHMARKS[name](ctx)
+            except Exception as e:
+                traceback.print_exc()
+                results[name] = {'error': f'{type(e).__name__}: {e}'}
+            print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scale': scale,
+            'scale_settings': settings,
+            'device': device,
+            'num_files': len(files),
+            **environment_info(),
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BC-GCC benchmark suite')
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--only', default=None, help='Comma-separated benchmark names')
+    parser.add_argument('--out', default='bench_results.json', help='Output JSON file')
+    parser.add_argument('--corpus-dir', default=None, help='Use an existing corpus instead of a synthetic one')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--list', action='store_true', help='List benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, fn in BENCHMARKS.items():
+            print(f"{name:<22} {(fn.__doc__ or '').strip()}")
+        return
+
+    only = args.only.split(',') if args.only else None
+    report = run_benchmarks(args.scale, only=only, corpus_dir=args.corpus_dir, device=args.device)
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
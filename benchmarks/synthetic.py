@@ -0,0 +1,190 @@
+"""
+Synthetic GCC trace generator
+
+Simulates a GCC-like sender over a bottleneck link, vectorized across traces
+(one NumPy step per 200 ms interval for all traces at once):
+
+    capacity    log random walk with occasional regime jumps (handovers)
+    queue       fluid queue fed by the sending rate, drained at capacity;
+                overflow beyond the buffer becomes packet loss
+    delay       base RTT + queueing delay + jitter
+    GCC         delay-gradient overuse -> back off to 0.85 x receiving rate,
+                heavy loss -> multiplicative decrease, otherwise increase
+
+Output traces have the same dict-of-lists layout as the real pickles:
+trace_name, delay, loss_ratio, receiving_rate, sending_rate,
+bandwidth_prediction.
+
+Usage:
+    python -m benchmarks.synthetic <output_dir> [--traces-per-dataset N] [--length T]
+"""
+import argparse
+import pickle
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+
+STEP_S = 0.2  # 200 ms between samples, as in the recorded traces
+
+# Rough per-dataset characteristics (capacity in bps, delays in ms)
+PROFILES = {
+    'ghent':      {'capacity': 2.0e6, 'volatility': 0.08, 'base_delay': 60,  'jitter': 8,  'loss_burst_prob': 0.003, 'buffer_s': 0.3},
+    'norway':     {'capacity': 0.3e6, 'volatility': 0.15, 'base_delay': 150, 'jitter': 40, 'loss_burst_prob': 0.002, 'buffer_s': 2.0},
+    'NY':         {'capacity': 4.0e6, 'volatility': 0.12, 'base_delay': 120, 'jitter': 30, 'loss_burst_prob': 0.006, 'buffer_s': 1.0},
+    'opennetlab': {'capacity': 1.0e6, 'volatility': 0.10, 'base_delay': 80,  'jitter': 15, 'loss_burst_prob': 0.015, 'buffer_s': 0.5},
+}
+
+
+def generate_traces(num_traces: int, length: int, profile: str = 'NY', seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Generate a batch of synthetic traces
+
+    Args:
+        num_traces: Number of traces (simulated in parallel)
+        length: Steps per trace (200 ms each)
+        profile: Key of PROFILES
+        seed: RNG seed
+
+    Returns:
+        Dict of [num_traces, length] float64 arrays
+    """
+    p = PROFILES[profile]
+    rng = np.random.default_rng(seed)
+    n = num_traces
+
+    # Capacity: log random walk + rare regime jumps, mean-reverting to the profile level
+    log_level = np.log(p['capacity'])
+    log_cap = log_level + rng.normal(0, 0.5, n)
+
+    capacity = np.empty((n, length))
+    delay = np.empty((n, length))
+    loss_ratio = np.empty((n, length))
+    receiving_rate = np.empty((n, length))
+    sending_rate = np.empty((n, length))
+    bandwidth_prediction = np.empty((n, length))
+
+    base_delay = p['base_delay'] * rng.uniform(0.7, 1.3, n)
+    queue_bits = np.zeros(n)
+    estimate = np.exp(log_cap) * rng.uniform(0.3, 0.8, n)
+    smoothed_delay = base_delay.copy()
+    burst_left = np.zeros(n, dtype=np.int64)
+
+    for t in range(length):
+        jump = rng.random(n) < 0.01
+        log_cap += (0.02 * (log_level - log_cap)
+                    + rng.normal(0, p['volatility'], n)
+                    + jump * rng.normal(0, 0.8, n))
+        cap = np.clip(np.exp(log_cap), 5e4, 50e6)
+        buffer_bits = cap * p['buffer_s']
+
+        # Sender follows the previous GCC estimate
+        send = estimate * rng.uniform(0.9, 1.0, n)
+
+        # Fluid queue
+        queue_bits += (send - cap) * STEP_S
+        overflow = np.maximum(queue_bits - buffer_bits, 0.0)
+        queue_bits = np.clip(queue_bits, 0.0, buffer_bits)
+        congestion_loss = overflow / np.maximum(send * STEP_S, 1.0)
+
+        # Random loss bursts (wireless / handover)
+        new_burst = (burst_left == 0) & (rng.random(n) < p['loss_burst_prob'])
+        burst_left = np.where(new_burst, rng.integers(1, 10, n), np.maximum(burst_left - 1, 0))
+        random_loss = np.where(burst_left > 0, rng.uniform(0.01, 0.3, n), 0.0)
+
+        loss = np.clip(congestion_loss + random_loss, 0.0, 1.0)
+        recv = np.minimum(send, cap) * (1.0 - loss)
+
+        d = base_delay + queue_bits / cap * 1000.0 + np.abs(rng.normal(0, p['jitter'], n))
+
+        # GCC-like estimate update on the smoothed delay gradient (trendline filter)
+        prev_smoothed = smoothed_delay
+        smoothed_delay = 0.9 * smoothed_delay + 0.1 * d
+        gradient = smoothed_delay - prev_smoothed
+        overuse = gradient > max(3.0, 0.3 * p['jitter'])
+        heavy_loss = loss > 0.1
+        estimate = np.where(
+            overuse, 0.85 * recv,
+            np.where(heavy_loss, estimate * (1.0 - 0.5 * loss),
+                     np.where(loss < 0.02, estimate * 1.016, estimate)))
+        estimate = np.clip(estimate, 5e4, 2 * cap + 1e5)
+
+        capacity[:, t] = cap
+        delay[:, t] = d
+        loss_ratio[:, t] = loss
+        receiving_rate[:, t] = recv
+        sending_rate[:, t] = send
+        bandwidth_prediction[:, t] = estimate
+
+    return {
+        'delay': delay,
+        'loss_ratio': loss_ratio,
+        'receiving_rate': receiving_rate,
+        'sending_rate': sending_rate,
+        'bandwidth_prediction': bandwidth_prediction,
+        'capacity': capacity,
+    }
+
+
+def trace_to_record(traces: Dict[str, np.ndarray], index: int, trace_name: str) -> Dict:
+    """Convert row `index` of generate_traces() output into the pickle layout"""
+    return {
+        'trace_name': trace_name,
+        'delay': traces['delay'][index].tolist(),
+        'loss_ratio': traces['loss_ratio'][index].tolist(),
+        'receiving_rate': traces['receiving_rate'][index].tolist(),
+        'sending_rate': traces['sending_rate'][index].tolist(),
+        'bandwidth_prediction': traces['bandwidth_prediction'][index].tolist(),
+    }
+
+
+def write_corpus(output_dir, traces_per_dataset: int = 8, length: int = 1500,
+                 datasets: List[str] = None, seed: int = 0, vary_length: bool = True) -> List[Path]:
+    """
+    Write a synthetic corpus laid out like data/ (one sub-directory per dataset)
+
+    Returns:
+        List of written pickle paths
+    """
+    output_dir = Path(output_dir)
+    datasets = datasets or list(PROFILES)
+    rng = np.random.default_rng(seed)
+    written = []
+
+    for ds_idx, dataset in enumerate(datasets):
+        ds_dir = output_dir / dataset
+        ds_dir.mkdir(parents=True, exist_ok=True)
+        traces = generate_traces(traces_per_dataset, length, profile=dataset, seed=seed + ds_idx)
+
+        for i in range(traces_per_dataset):
+            # Real traces vary in length; trim each one independently
+            trace_len = int(length * rng.uniform(0.5, 1.0)) if vary_length else length
+            trace_name = f'synthetic_{dataset}_{i:04d}'
+            record = trace_to_record(traces, i, trace_name)
+            record = {k: (v[:trace_len] if isinstance(v, list) else v) for k, v in record.items()}
+
+            path = ds_dir / f'rates_delay_loss_gcc_{trace_name}.pickle'
+            with open(path, 'wb') as f:
+                pickle.dump(record, f)
+            written.append(path)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic GCC trace corpus')
+    parser.add_argument('output_dir', help='Output directory (dataset sub-directories are created)')
+    parser.add_argument('--traces-per-dataset', type=int, default=8)
+    parser.add_argument('--length', type=int, default=1500, help='Max steps per trace (200 ms each)')
+    parser.add_argument('--datasets', nargs='*', default=None, help=f'Subset of {list(PROFILES)}')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    written = write_corpus(args.output_dir, args.traces_per_dataset, args.length,
+                           datasets=args.datasets, seed=args.seed)
+    print(f"Wrote {len(written)} synthetic traces to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Time-to-accuracy harness: end-to-end Trainer runs to a validation target
+
+The micro-benchmarks in run.py time individual stages; this runs the whole
+pipeline (corpus -> optional preprocessing -> Trainer setup -> epochs with
+validation, checkpointing and logging) until the validation R² and/or MAE
+target is reached (Config.TARGET_VAL_R2 / TARGET_VAL_MAE), and records:
+
+    setup_s / prepare_s       preprocessing and Trainer construction
+    time_to_target_s          from the start of the run to the first epoch
+                              meeting the target (None if never reached)
+    epochs_to_target
+    train_samples_per_sec     over all training epochs
+    peak_rss_mb               of this process (and of reaped DataLoader workers)
+    peak_gpu_mb               torch.cuda.max_memory_allocated, on CUDA
+    history                   per-epoch validation metrics
+
+The corpus is a fixed synthetic one (same seed on every run) or an existing
+directory (--corpus-dir), and the default settings (HARNESS_OVERRIDES) train a
+small model, so a CPU-only run finishes in a few minutes. The output has the
+same layout as run.py, so two commits compare with benchmarks.compare.
+
+Usage:
+    python -m benchmarks.time_to_accuracy --out tta.json
+    python -m benchmarks.time_to_accuracy --pipeline per-trace --target-r2 0.97 --set HARD_MINING=true
+    python -m benchmarks.compare tta_main.json tta.json
+"""
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from config import parse_assignment
+
+from .common import environment_info, make_bench_config
+from .synthetic import write_corpus
+
+# Small model / batch so that a CPU-only run takes minutes
+HARNESS_OVERRIDES = {
+    'LSTM_HIDDEN_SIZE': 64,
+    'LSTM_NUM_LAYERS': 2,
+    'FC_HIDDEN_SIZES': [64, 32],
+    'LEARNING_RATE': 1e-3,
+    'SCHEDULER': 'cosine',
+    'USE_AMP': False,
+}
+TARGET_R2 = 0.95
+MAX_EPOCHS = 20
+TRACES_PER_DATASET = 8
+TRACE_LENGTH = 1500
+PIPELINES = ['raw', 'tensors', 'per-trace']
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def prepare(config, pipeline: str):
+    """Write the preprocessed files a pipeline trains from (none for 'raw')"""
+    processed_dir = Path(config.DATA_DIR) / 'processed'
+    if pipeline == 'raw':
+        return
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    if pipeline == 'per-trace':
+        from dataset import split_files
+        from prepare_data import prepare_trace_split
+        for split, files in zip(('train', 'val', 'test'), split_files(config)):
+            prepare_trace_split(files, split, processed_dir / f'{split}_traces.pt')
+    else:
+        from dataset import create_dataloaders
+        from prepare_data import prepare_split
+        for split, loader in zip(('train', 'val', 'test'), create_dataloaders(config)):
+            prepare_split(loader, split, processed_dir / f'{split}_tensors.pt', config)
+
+
+def run_to_target(config, pipeline: str = 'raw') -> dict:
+    """One end-to-end training run; returns the time-to-accuracy metrics"""
+    from train import Trainer
+
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    prepare(config, pipeline)
+    prepare_s = time.perf_counter() - start
+    trainer = Trainer(config)
+    setup_s = time.perf_counter() - start
+    trainer.train()
+    total_s = time.perf_counter() - start
+
+    history = trainer.history
+    reached = next((h for h in history if trainer.target_reached(h['val_mae'], h['val_r2'])), None)
+    train_s = sum(h['epoch_s'] for h in history)
+    samples = sum(h['train_samples'] for h in history)
+    last = history[-1] if history else {}
+    return {
+        'reached': reached is not None,
+        'time_to_target_s': setup_s + reached['elapsed_s'] if reached else None,
+        'epochs_to_target': reached['epoch'] if reached else None,
+        'prepare_s': prepare_s,
+        'setup_s': setup_s,
+        'total_s': total_s,
+        'epochs': len(history),
+        'train_samples': samples,
+        'train_samples_per_sec': samples / train_s if train_s > 0 else None,
+        'final_val_r2': last.get('val_r2'),
+        'final_val_mae_mbps': last['val_mae'] / 1e6 if last else None,
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_worker_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'peak_gpu_mb': torch.cuda.max_memory_allocated() / 1024 ** 2 if torch.cuda.is_available() else None,
+        'history': history,
+    }
+
+
+def summarize_runs(runs) -> dict:
+    """Median over repeated runs of every numeric top-level metric"""
+    summary = {}
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs]
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            summary[key] = float(np.median(values))
+    summary['reached'] = sum(run['reached'] for run in runs)
+    return summary
+
+
+def config_overrides(args) -> dict:
+    """Settings that differ from Config for this harness run (recorded in the meta block)"""
+    overrides = dict(HARNESS_OVERRIDES, BATCH_SIZE=args.batch_size, DEVICE=args.device)
+    overrides.update(parse_assignment(a) for a in args.set)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end time-to-accuracy benchmark')
+    parser.add_argument('--target-r2', type=float, default=TARGET_R2, help='Validation R² target (<= 0 disables)')
+    parser.add_argument('--target-mae', type=float, default=None, help='Validation MAE target (Mbps)')
+    parser.add_argument('--max-epochs', type=int, default=MAX_EPOCHS)
+    parser.add_argument('--pipeline', choices=PIPELINES, default='raw',
+                        help='Train from pickles, fixed-window tensors or per-trace splits')
+    parser.add_argument('--runs', type=int, default=1, help='Repeated runs (medians are reported)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Config override (VALUE as JSON), e.g. BATCH_SIZE=512')
+    parser.add_argument('--corpus-dir', default=None, help='Use an existing corpus instead of a synthetic one')
+    parser.add_argument('--traces-per-dataset', type=int, default=TRACES_PER_DATASET)
+    parser.add_argument('--length', type=int, default=TRACE_LENGTH)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--out', default='tta_results.json', help='Output JSON file')
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='bcgcc_tta_') as tmp:
+        work_dir = Path(tmp)
+        for run in range(args.runs):
+            # Fresh data dir per run: preprocessing and caches are part of the measurement
+            data_dir = work_dir / f'run_{run}'
+            if args.corpus_dir is None:
+                write_corpus(data_dir, args.traces_per_dataset, args.length)
+            else:
+                data_dir.mkdir(parents=True)
+                for sub in Path(args.corpus_dir).iterdir():
+                    if sub.is_dir() and sub.name not in ('processed', 'trace_store'):
+                        (data_dir / sub.name).symlink_to(sub.resolve())
+
+            overrides = dict(HARNESS_OVERRIDES)
+            overrides.update({
+                'NUM_EPOCHS': args.max_epochs,
+                'TARGET_VAL_R2': args.target_r2 if args.target_r2 > 0 else None,
+                'TARGET_VAL_MAE': args.target_mae * 1e6 if args.target_mae else None,
+                'CHECKPOINT_DIR': str(data_dir / 'checkpoints'),
+                'LOG_DIR': str(data_dir / 'logs'),
+            })
+            overrides.update(parse_assignment(a) for a in args.set)
+            config = make_bench_config(data_dir, args.batch_size, device=args.device, **overrides)
+
+            print(f"\nRun {run + 1}/{args.runs}: pipeline={args.pipeline}, target R²={config.TARGET_VAL_R2}, "
+                  f"MAE={config.TARGET_VAL_MAE}")
+            result = run_to_target(config, args.pipeline)
+            runs.append(result)
+            reached = f"{result['time_to_target_s']:.1f}s / {result['epochs_to_target']} epochs" \
+                if result['reached'] else 'not reached'
+            print(f"Run {run + 1}: target {reached}, {result['train_samples_per_sec']:,.0f} samples/s, "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'pipeline': args.pipeline,
+            'target_r2': args.target_r2,
+            'target_mae_mbps': args.target_mae,
+            'max_epochs': args.max_epochs,
+            'corpus': args.corpus_dir or {'synthetic': {'traces_per_dataset': args.traces_per_dataset,
+                                                        'length': args.length, 'seed': 0}},
+            'overrides': config_overrides(args),
+            **environment_info(),
+        },
+        'results': {'time_to_accuracy': summarize_runs(runs)},
+        'runs': runs,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Checkpoint management for BC-GCC training
+
+State is snapshotted to CPU memory on the training thread (the only part that
+has to block), then serialized and written by a background thread. Every file
+is written to a temporary name and atomically renamed, so a crash mid-write
+never leaves a truncated checkpoint behind.
+"""
+import io
+import os
+import queue
+import random
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+
+def snapshot_to_cpu(obj):
+    """Recursively copy tensors to CPU and rebuild containers (detached from live state)"""
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot_to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [snapshot_to_cpu(v) for v in obj]
+    if isinstance(obj, tuple):
+        return tuple(snapshot_to_cpu(v) for v in obj)
+    return obj
+
+
+def capture_rng_state() -> Dict:
+    """Capture Python, NumPy and torch (CPU + CUDA) RNG states"""
+    np_state = np.random.get_state()
+    state = {
+        'python': random.getstate(),
+        # Store the NumPy key array as a tensor so the checkpoint has no ndarray pickles
+        'numpy': (np_state[0], torch.from_numpy(np_state[1].copy()), *np_state[2:]),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: Dict):
+    """Restore RNG states captured by capture_rng_state()"""
+    random.setstate(state['python'])
+    name, keys, *rest = state['numpy']
+    np.random.set_state((name, keys.numpy().astype(np.uint32), *rest))
+    torch.set_rng_state(state['torch'].cpu())
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([s.cpu() for s in state['cuda']])
+
+
+def atomic_write_bytes(path: Path, payload: bytes):
+    """Write bytes to path via a temporary file and atomic rename"""
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointManager:
+    """
+    Asynchronous checkpoint writer with a rotating window of epoch checkpoints
+
+    Files written to checkpoint_dir:
+        epoch_XXXX.pt  - last `keep_last` epochs (older ones are removed)
+        latest.pt      - most recent checkpoint
+        best.pt        - best checkpoint so far (when is_best=True)
+    """
+
+    EPOCH_PATTERN = re.compile(r'^epoch_(\d+)\.pt$')
+
+    def __init__(self, checkpoint_dir, keep_last: int = 3, async_write: bool = True):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.keep_last = keep_last
+        self.async_write = async_write
+
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = None
+
+        if async_write:
+            # Bounded queue: if the disk falls behind, save() blocks instead of
+            # piling up CPU snapshots in memory
+            self._queue = queue.Queue(maxsize=2)
+            self._thread = threading.Thread(target=self._worker, name='checkpoint-writer', daemon=True)
+            self._thread.start()
+
+    def save(self, state: Dict, epoch: int, is_best: bool = False):
+        """
+        Snapshot state to CPU and schedule it for writing
+
+        Args:
+            state: Checkpoint dict (may contain device tensors)
+            epoch: Epoch index used for the rotating file name
+            is_best: Also write best.pt
+        """
+        self._raise_pending_error()
+        if self._closed:
+            raise RuntimeError("CheckpointManager is closed")
+
+        job = (snapshot_to_cpu(state), epoch, is_best)
+        if self.async_write:
+            self._queue.put(job)
+        else:
+            self._write(*job)
+
+    def wait(self):
+        """Block until all scheduled checkpoints are on disk"""
+        if self.async_write and not self._closed:
+            self._queue.join()
+        self._raise_pending_error()
+
+    def close(self):
+        """Flush pending checkpoints and stop the writer thread"""
+        if self._closed:
+            return
+        if self.async_write:
+            self._queue.join()
+            self._queue.put(None)
+            self._thread.join()
+        self._closed = True
+        self._raise_pending_error()
+
+    def list_epoch_checkpoints(self):
+        """Return rotating checkpoint paths sorted by epoch"""
+        found = []
+        for path in self.checkpoint_dir.iterdir():
+            match = self.EPOCH_PATTERN.match(path.name)
+            if match:
+                found.append((int(match.group(1)), path))
+        return [path for _, path in sorted(found)]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                if self._error is None:
+                    self._write(*job)
+            except BaseException as e:  # surfaced on the training thread
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshot: Dict, epoch: int, is_best: bool):
+        # Serialize once, write the same bytes to every target
+        buffer = io.BytesIO()
+        torch.save(snapshot, buffer)
+        payload = buffer.getvalue()
+
+        atomic_write_bytes(self.checkpoint_dir / f'epoch_{epoch:04d}.pt', payload)
+        atomic_write_bytes(self.checkpoint_dir / 'latest.pt', payload)
+        if is_best:
+            atomic_write_bytes(self.checkpoint_dir / 'best.pt', payload)
+
+        self._rotate()
+
+    def _rotate(self):
+        if self.keep_last is None or self.keep_last <= 0:
+            return
+        for path in self.list_epoch_checkpoints()[:-self.keep_last]:
+            path.unlink(missing_ok=True)
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Background checkpoint write failed: {error}") from error
+
+
+def load_checkpoint_file(path, map_location='cpu') -> Dict:
+    """Load a checkpoint written by CheckpointManager (or a legacy Trainer checkpoint)"""
+    # Legacy checkpoints pickle the Config class, so full unpickling is required
+    return torch.load(path, map_location=map_location, weights_only=False)
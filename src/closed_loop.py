@@ -0,0 +1,436 @@
+"""
+Closed-loop policy evaluation on recorded traces
+
+Open-loop evaluation regresses the model against the logged
+bandwidth_prediction, i.e. on states produced by the original GCC sender.
+Here the model drives the sender itself: every recorded trace is replayed
+as a link whose capacity, propagation delay and random loss follow the
+recording, and the receiving rate, queueing delay and congestion loss
+respond to the bitrate the policy picks.
+
+Per trace, derived once from the log:
+    capacity    receiving rate / (1 - loss) at congested steps (queueing delay
+                or loss above threshold), interpolated in between and never
+                below what was actually delivered
+    base delay  rolling minimum of the logged delay (~10 s window)
+    random loss logged loss at uncongested steps
+    buffer      p99 of the logged queueing delay (>= MIN_BUFFER_S)
+
+Per 200 ms step, for all B sessions at once (fluid queue, as in
+benchmarks/synthetic.py):
+    delivered = min(queue + send * dt, capacity * dt)
+    queue    += send * dt - delivered, overflow beyond the buffer is lost
+    delay     = base delay + queue / capacity
+    recv      = delivered / dt * (1 - random loss)
+
+BatchedTraceEnv keeps batch_size sessions in flight and refills a slot with
+the next trace as soon as one ends, so the model forward runs on a full
+batch until the unplayed traces run out (the last iterations step fewer
+sessions). Features are computed with features.features_from_windows from
+each session's own history, exactly as the dataset does for logs.
+
+Usage:
+    python closed_loop.py models/bcgcc_lstm --split test --out reports/closed_loop.csv
+    python closed_loop.py --policy logged          # replay GCC's logged bitrates
+    python closed_loop.py --policy sending_rate    # replay the recorded sending rates (calibration)
+"""
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import Config, config_from_dict, data_overrides
+from features import feature_layout, features_from_windows, required_columns
+from trace_store import load_trace
+
+
+STEP_S = 0.2                 # 200 ms between samples, as in the recorded traces
+CONGESTED_QUEUE_MS = 50.0    # Queueing delay above which the link counts as saturated
+CONGESTED_LOSS = 0.02        # Loss ratio above which the link counts as saturated
+BASE_DELAY_WINDOW = 51       # Steps of the rolling-min propagation delay estimate
+MIN_BUFFER_S = 0.2
+MIN_RATE = 5e4               # Sending rate limits applied to policy outputs (bps)
+MAX_RATE = 50e6
+
+TRACE_COLUMNS = ['delay', 'loss_ratio', 'receiving_rate', 'bandwidth_prediction']
+
+
+def trace_processes(data: Dict) -> Dict:
+    """
+    Capacity, base delay, random loss and buffer size of one recorded trace
+
+    Returns:
+        {'capacity', 'base_delay', 'random_loss'}: per-step arrays, 'buffer_s': float
+    """
+    delay = np.asarray(data['delay'], dtype=np.float64)
+    loss = np.clip(np.asarray(data['loss_ratio'], dtype=np.float64), 0.0, 1.0)
+    recv = np.asarray(data['receiving_rate'], dtype=np.float64)
+
+    half = BASE_DELAY_WINDOW // 2
+    padded = np.pad(delay, (half, half), mode='edge')
+    base_delay = sliding_window_view(padded, BASE_DELAY_WINDOW).min(axis=1)
+    queue_ms = delay - base_delay
+
+    delivered = recv / np.maximum(1.0 - loss, 1e-3)
+    congested = (queue_ms > CONGESTED_QUEUE_MS) | (loss > CONGESTED_LOSS)
+    if congested.any():
+        idx = np.flatnonzero(congested)
+        capacity = np.interp(np.arange(len(delay)), idx, delivered[idx])
+    else:
+        capacity = np.full(len(delay), delivered.max(initial=0.0))
+    capacity = np.maximum(np.maximum(capacity, delivered), MIN_RATE)
+
+    return {
+        'capacity': capacity,
+        'base_delay': base_delay,
+        'random_loss': np.where(congested, 0.0, loss),
+        'buffer_s': max(float(np.percentile(queue_ms, 99)) / 1000.0, MIN_BUFFER_S) if len(delay) else MIN_BUFFER_S,
+    }
+
+
+class BatchedTraceEnv:
+    """Replays many recorded traces at once as links driven by a policy's bitrate"""
+
+    def __init__(self, files: List[str], config=Config, batch_size: int = 256,
+                 min_rate: float = MIN_RATE, max_rate: float = MAX_RATE):
+        """
+        Args:
+            files: Trace pickles (served from the trace store when available)
+            config: Config the policy was trained with (window size, feature layout)
+            batch_size: Sessions stepped per call
+            min_rate, max_rate: Limits applied to the policy's bitrate (bps)
+        """
+        window_size = config.WINDOW_SIZE
+        self.window_size = window_size
+        self.layout = feature_layout(config)
+        missing = [c for c in required_columns(self.layout) if c not in TRACE_COLUMNS]
+        if missing:
+            raise ValueError(f"Features need trace columns the environment does not simulate: {missing}")
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+
+        # All traces concatenated; trace k occupies [offsets[k], offsets[k] + lengths[k])
+        self.paths = []
+        logged = {name: [] for name in TRACE_COLUMNS + ['sending_rate']}
+        self.missing_sending_rate = 0   # Traces replaying bandwidth_prediction for sending_rate
+        processes = {'capacity': [], 'base_delay': [], 'random_loss': []}
+        buffer_s = []
+        for path in files:
+            data = load_trace(path, columns=TRACE_COLUMNS + ['sending_rate'])
+            if len(data['delay']) <= window_size:
+                continue
+            self.paths.append(str(path))
+            for name in TRACE_COLUMNS:
+                logged[name].append(np.asarray(data[name], dtype=np.float64))
+            if len(data.get('sending_rate', [])) == len(data['delay']):
+                logged['sending_rate'].append(np.asarray(data['sending_rate'], dtype=np.float64))
+            else:
+                logged['sending_rate'].append(logged['bandwidth_prediction'][-1])
+                self.missing_sending_rate += 1
+            proc = trace_processes(data)
+            for name in processes:
+                processes[name].append(proc[name])
+            buffer_s.append(proc['buffer_s'])
+
+        self.lengths = np.array([len(x) for x in logged['delay']], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        join = lambda arrays: np.concatenate(arrays) if arrays else np.empty(0)
+        self.logged = {name: join(arrays) for name, arrays in logged.items()}
+        self.capacity = join(processes['capacity'])
+        self.base_delay = join(processes['base_delay'])
+        self.random_loss = join(processes['random_loss'])
+        self.buffer_s = np.array(buffer_s)
+
+        # Simulated per-step outputs (NaN during each trace's warm-up window)
+        total = int(self.lengths.sum())
+        self.sim = {name: np.full(total, np.nan) for name in ('delay', 'loss_ratio', 'receiving_rate', 'action')}
+
+        self.batch_size = min(batch_size, len(self.paths)) or 1
+        self.reset()
+
+    def __len__(self):
+        return len(self.paths)
+
+    # --- Session slots ---
+
+    def reset(self) -> np.ndarray:
+        """Start the first batch_size traces; returns their observations"""
+        b, w = self.batch_size, self.window_size
+        self.slot_trace = np.full(b, -1, dtype=np.int64)
+        self.slot_pos = np.zeros(b, dtype=np.int64)
+        self.slot_queue = np.zeros(b)
+        self.history = {name: np.zeros((b, w)) for name in TRACE_COLUMNS}
+        self.next_trace = 0
+        self.steps_taken = 0
+        for values in self.sim.values():
+            values.fill(np.nan)
+        for slot in range(b):
+            self._start(slot)
+        return self.observe()
+
+    def _start(self, slot: int):
+        """Load the next unplayed trace into a slot (or mark it idle)"""
+        if self.next_trace >= len(self.paths):
+            self.slot_trace[slot] = -1
+            return
+        trace = self.next_trace
+        self.next_trace += 1
+        start = self.offsets[trace]
+        self.slot_trace[slot] = trace
+        self.slot_pos[slot] = self.window_size
+        self.slot_queue[slot] = 0.0
+        # Warm-up history comes from the log, like the first window of the dataset
+        for name in TRACE_COLUMNS:
+            self.history[name][slot] = self.logged[name][start:start + self.window_size]
+
+    @property
+    def active(self) -> np.ndarray:
+        """Indices of slots that are playing a trace"""
+        return np.flatnonzero(self.slot_trace >= 0)
+
+    @property
+    def done(self) -> bool:
+        return not (self.slot_trace >= 0).any()
+
+    # --- Stepping ---
+
+    def observe(self) -> np.ndarray:
+        """Raw (unnormalized) features of the active slots [n_active, window, feature_dim]"""
+        slots = self.active
+        windows = {name: self.history[name][slots] for name in TRACE_COLUMNS}
+        steps = self.slot_pos[slots, None] - self.window_size + np.arange(self.window_size)
+        return features_from_windows(windows, self.layout, steps).astype(np.float32)
+
+    def logged_actions(self, column: str = 'bandwidth_prediction') -> np.ndarray:
+        """Logged bandwidth_prediction or sending_rate at the current step of each active slot"""
+        slots = self.active
+        return self.logged[column][self.offsets[self.slot_trace[slots]] + self.slot_pos[slots]]
+
+    def step(self, actions) -> np.ndarray:
+        """
+        Send at the given bitrates for one step
+
+        Args:
+            actions: Bitrate (bps) per active slot, in the order of self.active
+
+        Returns:
+            Observations of the slots active after the step (finished traces
+            are replaced by the next ones)
+        """
+        slots = self.active
+        trace = self.slot_trace[slots]
+        g = self.offsets[trace] + self.slot_pos[slots]
+
+        send = np.clip(np.asarray(actions, dtype=np.float64).reshape(-1), self.min_rate, self.max_rate)
+        capacity = self.capacity[g]
+        buffer_bits = capacity * self.buffer_s[trace]
+        queue = self.slot_queue[slots]
+
+        sent_bits = send * STEP_S
+        delivered = np.minimum(queue + sent_bits, capacity * STEP_S)
+        queue = queue + sent_bits - delivered
+        overflow = np.maximum(queue - buffer_bits, 0.0)
+        queue -= overflow
+
+        random_loss = self.random_loss[g]
+        congestion_loss = overflow / np.maximum(sent_bits, 1.0)
+        loss = 1.0 - (1.0 - congestion_loss) * (1.0 - random_loss)
+        recv = delivered / STEP_S * (1.0 - random_loss)
+        delay = self.base_delay[g] + queue / capacity * 1000.0
+
+        self.slot_queue[slots] = queue
+        for name, value in (('delay', delay), ('loss_ratio', loss),
+                            ('receiving_rate', recv), ('bandwidth_prediction', send)):
+            hist = self.history[name]
+            hist[slots, :-1] = hist[slots, 1:]
+            hist[slots, -1] = value
+        self.sim['delay'][g] = delay
+        self.sim['loss_ratio'][g] = loss
+        self.sim['receiving_rate'][g] = recv
+        self.sim['action'][g] = send
+        self.steps_taken += len(slots)
+
+        self.slot_pos[slots] += 1
+        for slot in slots[self.slot_pos[slots] >= self.lengths[trace]]:
+            self._start(slot)
+        return self.observe()
+
+    # --- Results ---
+
+    def trace_metrics(self) -> List[Dict]:
+        """Closed-loop and logged metrics per played trace (steps after the warm-up)"""
+        rows = []
+        for k, path in enumerate(self.paths):
+            sl = slice(self.offsets[k] + self.window_size, self.offsets[k] + self.lengths[k])
+            if np.isnan(self.sim['delay'][sl]).any():
+                continue  # Not played (run stopped early)
+            capacity = self.capacity[sl]
+            mean_capacity = capacity.mean()
+            recv, delay = self.sim['receiving_rate'][sl], self.sim['delay'][sl]
+            logged_recv, logged_delay = self.logged['receiving_rate'][sl], self.logged['delay'][sl]
+            rows.append({
+                'file': Path(path).name,
+                'dataset': Path(path).parent.name,
+                'steps': int(len(capacity)),
+                'capacity_mbps': mean_capacity / 1e6,
+                'utilization': recv.mean() / mean_capacity,
+                'mean_delay': delay.mean(),
+                'p95_delay': float(np.percentile(delay, 95)),
+                'loss': self.sim['loss_ratio'][sl].mean(),
+                'overshoot': np.maximum(self.sim['action'][sl] - capacity, 0.0).mean() / mean_capacity,
+                'logged_utilization': min(logged_recv.mean() / mean_capacity, 1.0),
+                'logged_mean_delay': logged_delay.mean(),
+                'logged_p95_delay': float(np.percentile(logged_delay, 95)),
+                'logged_loss': self.logged['loss_ratio'][sl].mean(),
+            })
+        return rows
+
+
+def summarize_by_dataset(rows: List[Dict]) -> Dict[str, Dict]:
+    """Step-weighted mean of every metric per dataset (plus 'all')"""
+    metrics = [k for k in rows[0] if k not in ('file', 'dataset', 'steps')] if rows else []
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['dataset'], []).append(row)
+    groups['all'] = rows
+    summary = {}
+    for name, group in groups.items():
+        steps = np.array([r['steps'] for r in group], dtype=np.float64)
+        summary[name] = {'traces': len(group), 'steps': int(steps.sum())}
+        for key in metrics:
+            summary[name][key] = float(np.average([r[key] for r in group], weights=steps))
+    return summary
+
+
+def model_policy(model, config, device='cpu', monitor=None) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Wrap GCCBC_LSTM as obs [n, window, feature_dim] -> bitrate (bps) [n]
+
+    monitor: Optional drift.FeatureDriftMonitor that sees every raw observation
+    """
+    import torch
+    from dataset import normalize_features, denormalize_target
+
+    device = torch.device(device)
+
+    def policy(obs):
+        if monitor is not None:
+            monitor.observe(obs)
+        with torch.no_grad():
+            x = normalize_features(torch.from_numpy(obs).to(device), config)
+            output, _ = model(x)
+            return denormalize_target(output.float(), config).reshape(-1).cpu().numpy()
+
+    return policy
+
+
+def run_closed_loop(env: BatchedTraceEnv, policy: Optional[Callable] = None,
+                    max_steps: Optional[int] = None, verbose: bool = True,
+                    replay_column: str = 'bandwidth_prediction') -> List[Dict]:
+    """
+    Play every trace in env with the policy (None = replay the logged replay_column)
+
+    Returns:
+        trace_metrics() rows
+    """
+    obs = env.reset()
+    iterations = 0
+    start = time.perf_counter()
+    while not env.done and (max_steps is None or iterations < max_steps):
+        actions = env.logged_actions(replay_column) if policy is None else policy(obs)
+        obs = env.step(actions)
+        iterations += 1
+        if verbose and iterations % 500 == 0:
+            rate = env.steps_taken / (time.perf_counter() - start)
+            print(f"  {env.next_trace - len(env.active)}/{len(env)} traces done, {rate:,.0f} session-steps/s")
+    return env.trace_metrics()
+
+
+def write_results(rows: List[Dict], summary: Dict, path):
+    """JSON (rows + summary) or CSV (one row per trace) by file extension"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == '.csv':
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['file'])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump({'traces': rows, 'summary': summary}, f, indent=2, default=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Closed-loop evaluation on recorded traces')
+    parser.add_argument('model', nargs='?', default=None,
+                        help='Inference artifact directory or training checkpoint')
+    parser.add_argument('--policy', choices=['model', 'logged', 'sending_rate'], default='model',
+                        help="'logged' replays GCC's recorded bandwidth_prediction through the simulated links, "
+                             "'sending_rate' the recorded sending rate (calibrates the link model)")
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--datasets', default=None, help='Comma-separated datasets (default: Config.DATASETS)')
+    parser.add_argument('--split', choices=['train', 'val', 'test', 'all'], default='all')
+    parser.add_argument('--batch-size', type=int, default=256, help='Sessions stepped together')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--out', default=None, help='Write per-trace results (.json or .csv)')
+    parser.add_argument('--drift-reference', default=None,
+                        help='Monitor the policy inputs against this drift reference (drift.py reference)')
+    args = parser.parse_args()
+
+    if args.policy == 'model' and args.model is None:
+        parser.error("a model is required unless --policy logged or sending_rate")
+
+    config, policy, monitor = Config, None, None
+    if args.policy == 'model':
+        from inference import load_model
+        model, config = load_model(args.model, device=args.device)
+        if args.drift_reference:
+            from drift import FeatureDriftMonitor, load_reference
+            monitor = FeatureDriftMonitor(load_reference(args.drift_reference), config, interval=None)
+        policy = model_policy(model, config, args.device, monitor)
+
+    data_config = config_from_dict(data_overrides(args.data_dir, args.datasets), base=config)
+
+    from dataset import split_files
+    train_files, val_files, test_files = split_files(data_config)
+    files = {'train': train_files, 'val': val_files, 'test': test_files,
+             'all': train_files + val_files + test_files}[args.split]
+
+    start = time.perf_counter()
+    env = BatchedTraceEnv(files, config, args.batch_size)
+    load_s = time.perf_counter() - start
+    print(f"Loaded {len(env)} traces ({int(env.lengths.sum()):,} steps) in {load_s:.1f}s")
+    if args.policy == 'sending_rate' and env.missing_sending_rate:
+        print(f"  {env.missing_sending_rate} traces have no sending_rate; replaying bandwidth_prediction there")
+
+    start = time.perf_counter()
+    replay_column = 'sending_rate' if args.policy == 'sending_rate' else 'bandwidth_prediction'
+    rows = run_closed_loop(env, policy, replay_column=replay_column)
+    elapsed = time.perf_counter() - start
+    summary = summarize_by_dataset(rows)
+
+    print(f"\nClosed loop ({args.policy}): {env.steps_taken:,} session-steps in {elapsed:.1f}s "
+          f"({env.steps_taken / max(elapsed, 1e-9):,.0f} steps/s)\n")
+    print(f"{'Dataset':<12} {'Traces':>6} {'Util':>6} {'Delay':>8} {'P95':>8} {'Loss':>7} {'Over':>6} "
+          f"| {'Util':>6} {'Delay':>8} {'Loss':>7}  (logged)")
+    for name, s in summary.items():
+        print(f"{name:<12} {s['traces']:>6} {s['utilization']:>6.2f} {s['mean_delay']:>8.1f} "
+              f"{s['p95_delay']:>8.1f} {s['loss']:>7.2%} {s['overshoot']:>6.2f} "
+              f"| {s['logged_utilization']:>6.2f} {s['logged_mean_delay']:>8.1f} {s['logged_loss']:>7.2%}")
+
+    if monitor is not None:
+        from drift import print_report
+        print_report(monitor.report())
+
+    if args.out:
+        write_results(rows, summary, args.out)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
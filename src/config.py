@@ -2,8 +2,13 @@
 Configuration for BC-GCC Training
 """
 
+import copy
+import json
 from pathlib import Path
 
+# Version of the stats files written by fit_norm_stats.py
+NORM_STATS_FORMAT_VERSION = 1
+
 class Config:
     # Dataset paths
     PROJECT_ROOT = Path(__file__).parent.parent
@@ -72,6 +77,10 @@ class Config:
     
     TOTAL_FEATURE_DIM = len(CORE_FEATURES) + len(RESERVED_FEATURES)  # 16 + 16 = 32
     
+    # Registered features (see features.py) computed into the reserved slots:
+    # a reserved name (e.g. 'timestep') fills its own slot, others the next custom_* slot
+    EXTENSION_FEATURES = []
+    
     # Target
     TARGET = 'bandwidth_prediction'
     
@@ -106,9 +115,19 @@ class Config:
         'bandwidth_prediction': {'min': 0, 'max': 10e6},  # 10 Mbps
     }
     
+    # Fitted bounds written by fit_norm_stats.py (e.g. PROJECT_ROOT / 'data' / 'norm_stats.json').
+    # When set, its entries replace the literals above; features it lacks keep them.
+    NORM_STATS_FILE = None
+    
     # Enable clipping for extreme values outside normalization range
     USE_CLIPPING = True
     
+    # Replay buffer for RL fine-tuning (prioritized experience replay)
+    REPLAY_CAPACITY = 1_000_000
+    PER_ALPHA = 0.6    # Priority exponent (0 = uniform sampling)
+    PER_BETA = 0.4     # Importance-sampling exponent
+    PER_EPSILON = 1e-6 # Minimum priority
+    
     # Model architecture (optimized for RTX 3090)
     LSTM_HIDDEN_SIZE = 256  # Increased from 128 (more capacity)
     LSTM_NUM_LAYERS = 2
@@ -121,6 +140,7 @@ class Config:
     NUM_EPOCHS = 100
     WEIGHT_DECAY = 1e-5
     USE_AMP = True  # Mixed precision training for RTX 3090
+    USE_BF16_CPU = False  # bfloat16 autocast when running on CPU (no loss scaling needed)
     
     # Sample weighting (to handle data imbalance)
     # Reduced from [1.0, 50.0, 10.0] to prevent gradient explosion
@@ -128,6 +148,19 @@ class Config:
     LOSS_WEIGHT_HAS_LOSS = 10.0      # Reduced from 50 (still 10x emphasis)
     LOSS_WEIGHT_HIGH_DELAY = 5.0     # Reduced from 10 (still 5x emphasis)
     
+    # Training loss: MSE_WEIGHT * weighted MSE + MAPE_WEIGHT * weighted MAPE
+    MSE_WEIGHT = 0.7
+    MAPE_WEIGHT = 0.3
+    
+    # Loss-aware hard-example mining (training batches drawn in proportion to each
+    # sample's recent loss, corrected by importance weights; see dataset.LossAwareSampler)
+    HARD_MINING = False
+    HARD_MINING_ALPHA = 1.0     # Sampling priority = recent loss ** alpha
+    HARD_MINING_UNIFORM = 0.2   # Share of uniform sampling (importance weights <= 1 / share)
+    HARD_MINING_BETA = 1.0      # Importance-weight exponent (1 = unbiased)
+    HARD_MINING_EMA = 0.5       # Weight of the newest loss in a sample's running loss
+    HARD_MINING_REFRESH = 32    # Batches drawn per refresh of the sampling distribution
+    
     # Loss thresholds for weighting
     LOSS_THRESHOLD = 0.01   # 1% packet loss
     HIGH_DELAY_THRESHOLD = 300  # ms
@@ -149,16 +182,26 @@ class Config:
     
     # Early stopping
     EARLY_STOPPING_PATIENCE = 10
+    TARGET_VAL_R2 = None    # Also stop once validation R² reaches this (None = off)
+    TARGET_VAL_MAE = None   # ... and/or validation MAE drops to this (bps); all set targets must be met
     
     # Checkpointing
     CHECKPOINT_DIR = 'checkpoints'
     SAVE_BEST_ONLY = True
+    ASYNC_CHECKPOINT = True    # Write checkpoints on a background thread
+    CHECKPOINT_KEEP_LAST = 3   # Rotating window of per-epoch checkpoints
+    RESUME_CHECKPOINT = None   # e.g. 'checkpoints/latest.pt' to resume training
     
     # Logging
     LOG_DIR = 'logs'
     LOG_INTERVAL = 10  # Log every N batches
     VAL_INTERVAL = 1   # Validate every N epochs
     
+    # Profiling (opt-in, adds CUDA syncs at stage boundaries)
+    PROFILE = False        # Per-stage timers (data/h2d/normalize/fwd/bwd/optim) + samples/s
+    PROFILE_TORCH = False  # torch.profiler traces of the first epoch -> LOG_DIR/profiler
+    PROFILE_SCHEDULE = {'wait': 5, 'warmup': 5, 'active': 10, 'repeat': 1}
+    
     # Device
     DEVICE = 'cuda'  # or 'cpu'
     
@@ -182,3 +225,87 @@ class Config:
         print(f"Sample Weights: No loss={cls.LOSS_WEIGHT_NO_LOSS}, Has loss={cls.LOSS_WEIGHT_HAS_LOSS}")
         print(f"Device: {cls.DEVICE}")
         print("=" * 80)
+
+
+def load_norm_stats(path, base_stats=None) -> dict:
+    """
+    Read a fitted stats file and return it as a NORM_STATS mapping
+
+    Args:
+        path: JSON file written by fit_norm_stats.py
+        base_stats: NORM_STATS used for features missing from the file
+    """
+    with open(path) as f:
+        payload = json.load(f)
+    version = payload.get('version')
+    if version != NORM_STATS_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported norm stats version {version!r} "
+                         f"(expected {NORM_STATS_FORMAT_VERSION})")
+    stats = copy.deepcopy(base_stats) if base_stats is not None else {}
+    for name, entry in payload['features'].items():
+        stats[name] = {'min': float(entry['min']), 'max': float(entry['max'])}
+    return stats
+
+
+def config_to_dict(config) -> dict:
+    """
+    Return all upper-case settings of a Config class or instance as a plain dict
+
+    Paths are converted to strings so the result can be pickled without the
+    Config class and serialized to JSON.
+    """
+    values = {}
+    for key in dir(config):
+        if not key.isupper():
+            continue
+        value = getattr(config, key)
+        values[key] = str(value) if isinstance(value, Path) else copy.deepcopy(value)
+    return values
+
+
+def config_from_dict(values: dict, base=None):
+    """
+    Build a Config subclass with the given settings overriding the defaults
+
+    Args:
+        values: Mapping of upper-case setting names to values
+        base: Config class to derive from (defaults to Config)
+    """
+    base = Config if base is None else base
+    overrides = {k: copy.deepcopy(v) for k, v in values.items() if k.isupper()}
+    if 'CORE_FEATURES' in overrides or 'RESERVED_FEATURES' in overrides:
+        core = overrides.get('CORE_FEATURES', base.CORE_FEATURES)
+        reserved = overrides.get('RESERVED_FEATURES', base.RESERVED_FEATURES)
+        overrides.setdefault('TOTAL_FEATURE_DIM', len(core) + len(reserved))
+    if overrides.get('NORM_STATS_FILE') and 'NORM_STATS' not in overrides:
+        overrides['NORM_STATS'] = load_norm_stats(overrides['NORM_STATS_FILE'], base.NORM_STATS)
+    return type(base.__name__, (base,), overrides)
+
+
+def data_overrides(data_dir=None, datasets=None) -> dict:
+    """
+    DATA_DIR / DATASETS settings from the --data-dir / --datasets options of the scripts
+
+    Args:
+        data_dir: Data directory (None = keep the default)
+        datasets: Comma-separated dataset names (None = keep the default)
+    """
+    overrides = {}
+    if data_dir:
+        overrides['DATA_DIR'] = data_dir
+    if datasets:
+        overrides['DATASETS'] = datasets.split(',')
+    return overrides
+
+
+def parse_assignment(text: str):
+    """KEY=VALUE with VALUE parsed as JSON (falls back to a plain string)"""
+    key, _, value = text.partition('=')
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+if Config.NORM_STATS_FILE:
+    Config.NORM_STATS = load_norm_stats(Config.NORM_STATS_FILE, Config.NORM_STATS)
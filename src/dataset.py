@@ -1,15 +1,52 @@
 """
 Dataset loader for BC-GCC training
 """
-import pickle
 import numpy as np
+import os
+from collections import deque
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Sequence
 import random
 
 from config import Config
+from features import (compute_features, feature_layout, features_from_windows,
+                      normalization_bounds, required_columns)
+from trace_store import load_trace
+
+
+# Layout tag of the per-trace split files written by prepare_data.py --per-trace
+TRACE_SPLIT_FORMAT = 'bcgcc-trace-split-v1'
+
+
+def load_processed(path):
+    """
+    Load a preprocessed split file (prepare_data.py), memory-mapped where supported
+    
+    Mapped tensors are backed by the page cache, so concurrent training
+    processes on one machine (sweep.py) share a single copy of the data.
+    """
+    try:
+        return torch.load(path, mmap=True)
+    except (TypeError, RuntimeError):  # torch < 2.1, or a legacy (non-zip) file
+        return torch.load(path)
+
+
+def oversample_multiplier(config: Config, file_path: str) -> int:
+    """How many times the samples of a file are repeated (Config.OVERSAMPLE_FILES)"""
+    for oversample_file, mult in zip(config.OVERSAMPLE_FILES, config.OVERSAMPLE_MULTIPLIERS):
+        if oversample_file in file_path:
+            return mult
+    return 1
+
+
+def sample_weights(losses: np.ndarray, delays: np.ndarray, config: Config) -> np.ndarray:
+    """Loss weight per sample from the loss ratio and delay at its target step"""
+    return np.where(
+        losses > config.LOSS_THRESHOLD, config.LOSS_WEIGHT_HAS_LOSS,
+        np.where(delays > config.HIGH_DELAY_THRESHOLD,
+                 config.LOSS_WEIGHT_HIGH_DELAY, config.LOSS_WEIGHT_NO_LOSS))
 
 
 class GCCDataset(Dataset):
@@ -30,6 +67,11 @@ class GCCDataset(Dataset):
         self.samples = []
         self.weights = []
         
+        # Origin of each sample: index into self.files and step t of its target
+        self.files = []
+        self.sample_file_ids = []
+        self.sample_steps = []
+        
         print(f"\nLoading {mode} data...")
         for file_path in pickle_files:
             self._load_file(file_path)
@@ -41,151 +83,44 @@ class GCCDataset(Dataset):
                   f"mean={np.mean(self.weights):.2f}")
     
     def _load_file(self, file_path: str):
-        """Load a single pickle file and extract samples"""
+        """Load a single trace (from the trace store if available) and extract samples"""
         try:
-            with open(file_path, 'rb') as f:
-                data = pickle.load(f)
+            file_id = len(self.files)
+            self.files.append(os.path.abspath(file_path))
+            layout = feature_layout(self.config)
+            columns = set(required_columns(layout)) | {'delay', 'loss_ratio', 'bandwidth_prediction'}
+            data = load_trace(file_path, columns=sorted(columns))
             
-            # Extract time series
-            delays = np.array(data['delay'])
-            losses = np.array(data['loss_ratio'])
-            recv_rates = np.array(data['receiving_rate'])
-            bw_preds = np.array(data['bandwidth_prediction'])
+            # Extract time series (read-only views when served from the trace store)
+            delays = np.asarray(data['delay'])
+            losses = np.asarray(data['loss_ratio'])
+            bw_preds = np.asarray(data['bandwidth_prediction'])
             
             # Check if this file should be oversampled
-            oversample_mult = 1
-            for oversample_file, mult in zip(self.config.OVERSAMPLE_FILES, 
-                                             self.config.OVERSAMPLE_MULTIPLIERS):
-                if oversample_file in file_path:
-                    oversample_mult = mult
-                    print(f"  Oversampling {Path(file_path).name} by {mult}x")
-                    break
+            oversample_mult = oversample_multiplier(self.config, file_path)
+            if oversample_mult > 1:
+                print(f"  Oversampling {Path(file_path).name} by {oversample_mult}x")
+            
+            # Features of all sliding windows at once: [num_windows, window_size, feature_dim]
+            # (window k is the input for target step t = k + window_size)
+            window_features = compute_features(data, layout, self.window_size)
+            
+            # Sample weight based on loss and delay at the target step
+            weights = sample_weights(losses[self.window_size:], delays[self.window_size:], self.config)
             
             # Create samples with sliding window
             for _ in range(oversample_mult):
-                for t in range(self.window_size, len(delays)):
-                    # Extract window
-                    window_delays = delays[t-self.window_size:t]
-                    window_losses = losses[t-self.window_size:t]
-                    window_recv = recv_rates[t-self.window_size:t]
-                    window_bw = bw_preds[t-self.window_size:t]
-                    
-                    # Compute features for each time step in window
-                    features_sequence = []
-                    
-                    # Pre-compute window statistics (for efficiency)
-                    prev_delay_grad = 0
-                    
-                    for i in range(self.window_size):
-                        # === Basic features ===
-                        delay = window_delays[i]
-                        loss = window_losses[i]
-                        recv_rate = window_recv[i]
-                        prev_bw = window_bw[i-1] if i > 0 else window_bw[0]
-                        
-                        # === Delay gradient (1st order) ===
-                        delay_grad = window_delays[i] - window_delays[i-1] if i > 0 else 0
-                        
-                        # === Effective throughput (considering loss) ===
-                        throughput_effective = recv_rate * (1.0 - loss)
-                        
-                        # === Delay statistics (GCC core signals) ===
-                        # Use data up to current time step
-                        delay_window = window_delays[:i+1]
-                        delay_mean = np.mean(delay_window)
-                        delay_std = np.std(delay_window) if len(delay_window) > 1 else 0
-                        delay_min = np.min(delay_window)
-                        
-                        # Queue delay (estimate of buffering delay)
-                        queue_delay = delay - delay_min
-                        
-                        # Delay acceleration (2nd order gradient)
-                        delay_accel = delay_grad - prev_delay_grad if i > 0 else 0
-                        prev_delay_grad = delay_grad
-                        
-                        # Delay trend (linear regression slope on delay gradients)
-                        # Simplified: use average of recent gradients as trend
-                        if i >= 2:
-                            recent_grads = [window_delays[j] - window_delays[j-1] 
-                                          for j in range(1, i+1)]
-                            # Simple trend: slope of linear fit
-                            # Using numpy's polyfit would be more accurate but slower
-                            # Approximation: difference between early and late averages
-                            mid_point = len(recent_grads) // 2
-                            early_avg = np.mean(recent_grads[:mid_point]) if mid_point > 0 else 0
-                            late_avg = np.mean(recent_grads[mid_point:])
-                            delay_trend = late_avg - early_avg
-                        else:
-                            delay_trend = 0
-                        
-                        # === Loss features ===
-                        loss_change = loss - window_losses[i-1] if i > 0 else 0
-                        
-                        # === Bandwidth utilization ===
-                        bw_utilization = recv_rate / (prev_bw + 1e-6)
-                        
-                        # === Receiving rate statistics ===
-                        recv_window = window_recv[:i+1]
-                        recv_rate_mean = np.mean(recv_window)
-                        recv_rate_std = np.std(recv_window) if len(recv_window) > 1 else 0
-                        
-                        # === Assemble all features ===
-                        core_feats = [
-                            # Basic (6)
-                            delay,
-                            loss,
-                            recv_rate,
-                            prev_bw,
-                            delay_grad,
-                            throughput_effective,
-                            
-                            # Delay statistics (6)
-                            delay_mean,
-                            delay_std,
-                            delay_min,
-                            queue_delay,
-                            delay_accel,
-                            delay_trend,
-                            
-                            # Loss (1)
-                            loss_change,
-                            
-                            # Bandwidth (3)
-                            bw_utilization,
-                            recv_rate_mean,
-                            recv_rate_std,
-                        ]
-                        
-                        # Reserved features (zeros for BC training)
-                        reserved_feats = [0.0] * len(self.config.RESERVED_FEATURES)
-                        
-                        # Combine
-                        features = core_feats + reserved_feats
-                        features_sequence.append(features)
-                    
-                    features_sequence = np.array(features_sequence)  # [window_size, feature_dim]
-                    
-                    # Target (current bandwidth prediction)
-                    target = bw_preds[t]
-                    
-                    # Compute sample weight based on loss and delay
-                    current_loss = losses[t]
-                    current_delay = delays[t]
-                    
-                    if current_loss > self.config.LOSS_THRESHOLD:
-                        weight = self.config.LOSS_WEIGHT_HAS_LOSS
-                    elif current_delay > self.config.HIGH_DELAY_THRESHOLD:
-                        weight = self.config.LOSS_WEIGHT_HIGH_DELAY
-                    else:
-                        weight = self.config.LOSS_WEIGHT_NO_LOSS
-                    
+                for k in range(len(window_features)):
+                    t = k + self.window_size
                     self.samples.append({
-                        'features': features_sequence,
-                        'target': target,
-                        'loss_ratio': current_loss,
-                        'delay': current_delay,
+                        'features': window_features[k],  # [window_size, feature_dim]
+                        'target': bw_preds[t],
+                        'loss_ratio': losses[t],
+                        'delay': delays[t],
                     })
-                    self.weights.append(weight)
+                    self.weights.append(float(weights[k]))
+                    self.sample_file_ids.append(file_id)
+                    self.sample_steps.append(t)
             
         except Exception as e:
             print(f"Error loading {file_path}: {e}")
@@ -203,6 +138,268 @@ class GCCDataset(Dataset):
         weight = torch.FloatTensor([weight])
         
         return features, target, weight
+    
+    def indices_for_ranges(self, ranges) -> np.ndarray:
+        """
+        Sample indices whose target step lies in the given ranges
+        
+        Args:
+            ranges: (path, start, stop) tuples, e.g. trace_query.MatchRange
+        
+        Returns:
+            Sorted sample indices (oversampled duplicates included)
+        """
+        if len(self) == 0 or not ranges:
+            return np.zeros(0, dtype=np.int64)
+        
+        file_ids = {path: i for i, path in enumerate(self.files)}
+        steps = np.asarray(self.sample_steps, dtype=np.int64)
+        stride = int(steps.max()) + 1
+        keys = np.asarray(self.sample_file_ids, dtype=np.int64) * stride + steps
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        
+        lo, hi = [], []
+        for path, start, stop in ranges:
+            file_id = file_ids.get(os.path.abspath(path))
+            if file_id is None:
+                continue
+            lo.append(file_id * stride + min(start, stride))
+            hi.append(file_id * stride + min(stop, stride))
+        if not lo:
+            return np.zeros(0, dtype=np.int64)
+        
+        lo = np.searchsorted(sorted_keys, lo, side='left')
+        hi = np.searchsorted(sorted_keys, hi, side='left')
+        indices = np.concatenate([order[a:b] for a, b in zip(lo, hi)])
+        return np.unique(indices)
+
+
+class TraceWindowDataset(Dataset):
+    """
+    Windows of any WINDOW_SIZE served from per-trace step columns
+    
+    Built from the window-independent files written by `prepare_data.py
+    --per-trace` (raw columns of every trace, concatenated). Nothing is
+    materialized per window: a batch of samples gathers its [batch, window]
+    column slices and runs the feature kernels on them, so each window's
+    expanding statistics start at its own first step exactly as in
+    GCCDataset, for whatever WINDOW_SIZE and EXTENSION_FEATURES the config
+    asks for. Weights and oversampling also follow the config at load time.
+    """
+    
+    def __init__(self, source, config: Config, mode='train', oversample: bool = True):
+        """
+        Args:
+            source: Path of a *_traces.pt file or its loaded payload
+            config: Configuration object
+            mode: 'train', 'val', or 'test'
+            oversample: Repeat the samples of Config.OVERSAMPLE_FILES
+        """
+        payload = source if isinstance(source, dict) else load_processed(source)
+        if payload.get('format') != TRACE_SPLIT_FORMAT:
+            raise ValueError(f"{source}: not a per-trace split file")
+        self.config = config
+        self.mode = mode
+        self.window_size = config.WINDOW_SIZE
+        self.layout = feature_layout(config)
+        self.columns = {name: column.numpy() for name, column in payload['columns'].items()}
+        self.window_columns = required_columns(self.layout)
+        missing = [c for c in self.window_columns if c not in self.columns]
+        if missing:
+            raise ValueError(f"Enabled features need columns missing from the split file: {missing}")
+        
+        self.files = list(payload['files'])
+        offsets = payload['offsets'].numpy()
+        lengths = payload['lengths'].numpy()
+        
+        # One sample per target step t >= window_size of every trace
+        file_ids, steps = [], []
+        for file_id, (path, length) in enumerate(zip(self.files, lengths)):
+            if length <= self.window_size:
+                continue
+            targets = np.arange(self.window_size, length)
+            mult = oversample_multiplier(config, path) if oversample else 1
+            file_ids.append(np.full(len(targets) * mult, file_id, dtype=np.int64))
+            steps.append(np.tile(targets, mult))
+        self.sample_file_ids = np.concatenate(file_ids) if file_ids else np.zeros(0, dtype=np.int64)
+        self.sample_steps = np.concatenate(steps) if steps else np.zeros(0, dtype=np.int64)
+        self.target_rows = offsets[self.sample_file_ids] + self.sample_steps
+        
+        self.weights = sample_weights(self.columns['loss_ratio'][self.target_rows],
+                                      self.columns['delay'][self.target_rows], config).astype(np.float32)
+        self.targets = self.columns['bandwidth_prediction'][self.target_rows].astype(np.float32)
+        
+        print(f"Total {mode} samples: {len(self)} (window={self.window_size}, "
+              f"{len(self.files)} traces)")
+    
+    def __len__(self):
+        return len(self.target_rows)
+    
+    def window_batch(self, indices) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Features, targets and weights of many samples at once
+        
+        Returns:
+            features [n, window_size, feature_dim], targets [n, 1], weights [n, 1]
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        offsets = np.arange(-self.window_size, 0)
+        rows = self.target_rows[indices, None] + offsets
+        windows = {name: self.columns[name][rows] for name in self.window_columns}
+        steps = self.sample_steps[indices, None] + offsets
+        features = features_from_windows(windows, self.layout, steps)
+        return (torch.from_numpy(features.astype(np.float32)),
+                torch.from_numpy(self.targets[indices, None]),
+                torch.from_numpy(self.weights[indices, None]))
+    
+    def __getitem__(self, idx):
+        features, target, weight = self.window_batch([idx])
+        return features[0], target[0], weight[0]
+    
+    def __getitems__(self, indices):
+        # Batched fetch used by DataLoader: one vectorized feature pass per batch
+        features, targets, weights = self.window_batch(indices)
+        return list(zip(features, targets, weights))
+    
+    indices_for_ranges = GCCDataset.indices_for_ranges
+
+
+class RangeSampler(Sampler):
+    """
+    Sampler over the dataset windows matched by a trace query
+    
+    Example:
+        matches = QueryIndex.load_or_build(files, path).query("loss > 5% and delay > 300")
+        loader = DataLoader(dataset, batch_size=..., sampler=RangeSampler(dataset, matches))
+    """
+    
+    def __init__(self, dataset: GCCDataset, ranges: Sequence, shuffle: bool = True,
+                 generator: torch.Generator = None):
+        self.indices = torch.from_numpy(dataset.indices_for_ranges(ranges))
+        self.shuffle = shuffle
+        self.generator = generator
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def __iter__(self):
+        if self.shuffle:
+            perm = torch.randperm(len(self.indices), generator=self.generator)
+            return iter(self.indices[perm].tolist())
+        return iter(self.indices.tolist())
+
+
+class LossAwareSampler(Sampler):
+    """
+    Batch sampler that draws training samples in proportion to their recent loss
+    
+    Every sample keeps a running (EMA) loss in a tensor on the training
+    device, updated from the per-sample losses of the batches it appears in.
+    Samples are drawn with replacement from
+    
+        p_i = (1 - u) * loss_i^alpha / sum(loss^alpha) + u / N
+    
+    (samples never drawn count as the hardest seen so far; until any loss has
+    been seen all priorities are equal, i.e. uniform sampling) and the trainer
+    multiplies their loss weights by the importance weights (N * p_i)^-beta,
+    which keep the expected gradient that of uniform sampling for beta = 1.
+    The uniform share u bounds those weights by 1 / u. The distribution is
+    refreshed every HARD_MINING_REFRESH batches with one cumsum over the
+    losses, so sampling costs O(N) per refresh plus O(batch * log N).
+    
+    Pass as `batch_sampler=` to the DataLoader; the trainer takes the indices
+    and importance weights of each batch from `next_batch()` in the same order.
+    """
+    
+    def __init__(self, num_samples: int, batch_size: int, config: Config, device='cpu'):
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.alpha = config.HARD_MINING_ALPHA
+        self.uniform = config.HARD_MINING_UNIFORM
+        self.beta = config.HARD_MINING_BETA
+        self.ema = config.HARD_MINING_EMA
+        self.refresh = max(1, config.HARD_MINING_REFRESH)
+        self.device = torch.device(device)
+        self.generator = torch.Generator(device=self.device)
+        self.generator.manual_seed(config.SEED)
+        
+        # Running loss per sample; inf = never trained on (counts as the max seen)
+        self.losses = torch.full((num_samples,), float('inf'), device=self.device)
+        self.max_loss = torch.zeros((), device=self.device)  # Largest per-sample loss seen so far
+        self.pending = deque()  # (indices, importance weights) of yielded batches
+    
+    def __len__(self):
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+    
+    def priorities(self) -> torch.Tensor:
+        """Unnormalized sampling priority of every sample (loss^alpha)"""
+        priority = torch.minimum(self.losses, self.max_loss).clamp_min_(1e-12)
+        return priority if self.alpha == 1 else priority.pow_(self.alpha)
+    
+    def draw(self, count: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Sample indices [count] and their importance weights [count, 1]"""
+        n = self.num_samples
+        priority = self.priorities()
+        cdf = torch.cumsum(priority, 0, dtype=torch.float64)
+        total = cdf[-1]
+        rand = lambda *shape, **kw: torch.rand(*shape, device=self.device, generator=self.generator, **kw)
+        
+        # Sorted search targets keep the binary searches cache-friendly;
+        # the permutation restores a random order within the refresh
+        targets, _ = torch.sort(rand(count, dtype=torch.float64) * total)
+        indices = torch.searchsorted(cdf, targets).clamp_max_(n - 1)
+        indices = indices[torch.randperm(count, device=self.device, generator=self.generator)]
+        # Mixture: each draw is uniform with probability HARD_MINING_UNIFORM
+        uniform = torch.randint(0, n, (count,), device=self.device, generator=self.generator)
+        indices = torch.where(rand(count) < self.uniform, uniform, indices)
+        
+        probs = (1.0 - self.uniform) * priority[indices].double() / total + self.uniform / n
+        weights = (n * probs) ** -self.beta
+        return indices, weights.float().unsqueeze(1)
+    
+    def __iter__(self):
+        self.pending.clear()
+        num_batches = len(self)
+        for first in range(0, num_batches, self.refresh):
+            batches = min(self.refresh, num_batches - first)
+            draws = min(batches * self.batch_size, self.num_samples - first * self.batch_size)
+            indices, weights = self.draw(draws)
+            indices_cpu = indices.cpu()
+            for start in range(0, draws, self.batch_size):
+                batch = slice(start, start + self.batch_size)
+                self.pending.append((indices[batch], weights[batch]))
+                yield indices_cpu[batch].tolist()
+    
+    def state_dict(self) -> Dict:
+        """Running losses, max loss and generator state (for resuming training)"""
+        return {
+            'losses': self.losses.clone(),
+            'max_loss': self.max_loss.clone(),
+            'generator': self.generator.get_state(),
+        }
+    
+    def load_state_dict(self, state: Dict):
+        if state['losses'].numel() != self.num_samples:
+            raise ValueError(f"Sampler state has {state['losses'].numel()} samples, "
+                             f"the dataset has {self.num_samples}")
+        self.losses = state['losses'].to(self.device, torch.float32)
+        self.max_loss = state['max_loss'].to(self.device, torch.float32)
+        self.generator.set_state(state['generator'].cpu())
+        self.pending.clear()
+    
+    def next_batch(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Indices [batch] and importance weights [batch, 1] of the oldest unconsumed batch"""
+        return self.pending.popleft()
+    
+    @torch.no_grad()
+    def update(self, indices: torch.Tensor, losses: torch.Tensor):
+        """Fold the per-sample losses of a trained batch into the running losses"""
+        losses = losses.detach().reshape(-1).float()
+        previous = self.losses[indices]
+        self.losses[indices] = torch.where(torch.isinf(previous), losses,
+                                           (1.0 - self.ema) * previous + self.ema * losses)
+        self.max_loss = torch.maximum(self.max_loss, losses.max())
 
 
 def normalize_features(features: torch.Tensor, config: Config) -> torch.Tensor:
@@ -218,32 +415,28 @@ def normalize_features(features: torch.Tensor, config: Config) -> torch.Tensor:
     """
     normalized = features.clone()
     
-    # Normalize each core feature
-    for i, feat_name in enumerate(config.CORE_FEATURES):
-        if feat_name in config.NORM_STATS:
-            min_val = config.NORM_STATS[feat_name]['min']
-            max_val = config.NORM_STATS[feat_name]['max']
-            
-            # Avoid division by zero
-            range_val = max_val - min_val if max_val > min_val else 1.0
-            
-            # Clip extreme values if enabled (handles outliers like 455s delay)
-            if hasattr(config, 'USE_CLIPPING') and config.USE_CLIPPING:
-                if features.dim() == 3:  # [batch, seq, feat]
-                    # Clamp values to [min_val, max_val] before normalization
-                    clamped = torch.clamp(features[:, :, i], min_val, max_val)
-                    normalized[:, :, i] = (clamped - min_val) / range_val
-                else:  # [seq, feat]
-                    clamped = torch.clamp(features[:, i], min_val, max_val)
-                    normalized[:, i] = (clamped - min_val) / range_val
-            else:
-                # No clipping (original behavior)
-                if features.dim() == 3:  # [batch, seq, feat]
-                    normalized[:, :, i] = (features[:, :, i] - min_val) / range_val
-                else:  # [seq, feat]
-                    normalized[:, i] = (features[:, i] - min_val) / range_val
-    
-    # Reserved features are already 0, no need to normalize
+    # Normalize each computed feature (core + enabled extension features)
+    for i, min_val, max_val in normalization_bounds(config):
+        # Avoid division by zero
+        range_val = max_val - min_val if max_val > min_val else 1.0
+        
+        # Clip extreme values if enabled (handles outliers like 455s delay)
+        if hasattr(config, 'USE_CLIPPING') and config.USE_CLIPPING:
+            if features.dim() == 3:  # [batch, seq, feat]
+                # Clamp values to [min_val, max_val] before normalization
+                clamped = torch.clamp(features[:, :, i], min_val, max_val)
+                normalized[:, :, i] = (clamped - min_val) / range_val
+            else:  # [seq, feat]
+                clamped = torch.clamp(features[:, i], min_val, max_val)
+                normalized[:, i] = (clamped - min_val) / range_val
+        else:
+            # No clipping (original behavior)
+            if features.dim() == 3:  # [batch, seq, feat]
+                normalized[:, :, i] = (features[:, :, i] - min_val) / range_val
+            else:  # [seq, feat]
+                normalized[:, i] = (features[:, i] - min_val) / range_val
+    
+    # Disabled reserved slots are 0, no need to normalize
     
     return normalized
 
@@ -255,12 +448,12 @@ def denormalize_target(target: torch.Tensor, config: Config) -> torch.Tensor:
     return target * (max_val - min_val) + min_val
 
 
-def create_dataloaders(config: Config) -> Tuple[DataLoader, DataLoader, DataLoader]:
+def split_files(config: Config) -> Tuple[List[str], List[str], List[str]]:
     """
-    Create train, validation, and test dataloaders
+    Collect the pickle files of config.DATASETS and split them (seeded shuffle)
     
     Returns:
-        train_loader, val_loader, test_loader
+        train_files, val_files, test_files
     """
     # Collect all pickle files
     all_files = []
@@ -285,6 +478,17 @@ def create_dataloaders(config: Config) -> Tuple[DataLoader, DataLoader, DataLoad
     test_files = all_files[n_train + n_val:]
     
     print(f"Split: Train={len(train_files)}, Val={len(val_files)}, Test={len(test_files)}")
+    return train_files, val_files, test_files
+
+
+def create_dataloaders(config: Config) -> Tuple[DataLoader, DataLoader, DataLoader]:
+    """
+    Create train, validation, and test dataloaders
+    
+    Returns:
+        train_loader, val_loader, test_loader
+    """
+    train_files, val_files, test_files = split_files(config)
     
     # Create datasets
     train_dataset = GCCDataset(train_files, config, mode='train')
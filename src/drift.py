@@ -0,0 +1,341 @@
+"""
+Input drift monitoring for the inference path
+
+normalize_features silently clips inputs outside NORM_STATS, so a shift in
+the live feature distribution only shows up later as worse bitrate
+decisions. FeatureDriftMonitor watches the raw (unnormalized) model inputs
+and compares them with a reference summary of the training split.
+
+Reference (built once, `python drift.py reference`): per input feature, the
+newest step of every training window goes into a QuantileSketch (same pass
+as fit_norm_stats.py). The sketch is reduced to bins: REFERENCE_BINS
+quantile edges, REFERENCE_BINS / 2 uniform edges over [min, max] of
+NORM_STATS (so point masses such as a zero loss ratio don't swallow the
+whole range) and the min/max themselves. The fraction of training values in
+every bin is stored with the edges.
+
+Monitor (per prediction): observe() copies the newest step of the window
+into a fixed ring buffer, which is a single row copy of about a microsecond.
+When the buffer is full it is binned in one vectorized pass per feature
+against the reference edges. Memory is the buffer plus one count per bin,
+independent of traffic. Since min/max are bin edges, the clip counters are
+the outer bins of the same histogram.
+
+Every `interval` windows (or on report()) each feature is compared with its
+reference:
+    psi         population stability index over the bins
+    ks          max |CDF_live - CDF_ref| at the bin edges
+    clip_low / clip_high    live share of values below min / above max
+and the counts start over, so each report covers one period of traffic.
+Status: 'alert' if psi >= PSI_ALERT or the clip rate rose by CLIP_ALERT or
+more over the reference, 'warn' if psi >= PSI_WARN, else 'ok'.
+
+Usage:
+    python drift.py reference --out ../data/drift_reference.json
+    python drift.py check --reference ../data/drift_reference.json --split test
+    python closed_loop.py models/bcgcc_lstm --drift-reference ../data/drift_reference.json
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from config import Config, config_from_dict, data_overrides
+from features import feature_layout
+from quantile_sketch import QuantileSketch
+
+DRIFT_REFERENCE_FORMAT_VERSION = 1
+REFERENCE_BINS = 20
+BUFFER_WINDOWS = 4096      # Observations binned per vectorized pass
+REPORT_INTERVAL = 100_000  # Windows per report period (None = only on report())
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+CLIP_ALERT = 0.01          # Rise of the clip rate over the reference
+PSI_EPSILON = 1e-4         # Floor of bin shares in the PSI
+
+
+def reference_from_sketch(sketch: QuantileSketch, bounds: Dict, clip_low: int, clip_high: int,
+                          bins: int = REFERENCE_BINS) -> Dict:
+    """
+    Quantile and uniform bin edges (including the NORM_STATS bounds) and the share of values per bin
+
+    Bin i holds edges[i-1] <= x < edges[i]; bin 0 and the last bin are open-ended.
+    Quantile and uniform edges are moved to sketch bucket boundaries, where the
+    sketch's CDF is exact; at min and max the exact clip counts are used.
+    """
+    lo, hi = float(bounds['min']), float(bounds['max'])
+    # x > max <=> x >= nextafter(max), so both clip counters are whole bins
+    hi_edge = float(np.nextafter(hi, np.inf))
+    quantiles = sketch.quantiles(np.arange(1, bins) / bins)
+    # Uniform edges keep the in-range resolution where quantiles collapse onto
+    # a point mass (e.g. loss ratio 0); snapping isolates such a mass in its bucket
+    uniform = np.linspace(lo, hi, bins // 2 + 1)[1:-1]
+    snapped = {sketch.bucket_boundary(x) for x in list(quantiles) + uniform.tolist()}
+    snapped = {edge for edge in snapped if edge not in (lo, hi_edge)}
+    edges = np.array(sorted(snapped | {lo, hi_edge}))
+
+    exact = {lo: clip_low / sketch.count, hi_edge: 1.0 - clip_high / sketch.count}
+    cdf = np.array([exact[edge] if edge in exact else sketch.fraction_below(edge) for edge in edges])
+    fractions = np.diff(np.concatenate([[0.0], cdf, [1.0]]))
+    return {
+        'edges': edges.tolist(),
+        'fractions': np.clip(fractions, 0.0, 1.0).tolist(),
+        'min': lo,
+        'max': hi,
+        'count': sketch.count,
+    }
+
+
+def build_reference(files, config, workers: Optional[int] = None, bins: int = REFERENCE_BINS) -> Dict:
+    """Reference summary of the newest window step of every input feature over the files"""
+    from fit_norm_stats import accumulate
+
+    names = [name for name in feature_layout(config) if name is not None]
+    acc = accumulate(files, config.WINDOW_SIZE, config.NORM_STATS, workers=workers,
+                     feature_names=names, last_step=True)
+    features = {name: reference_from_sketch(acc.sketches[name], config.NORM_STATS[name],
+                                            acc.clip_low[name], acc.clip_high[name], bins)
+                for name in names if acc.sketches.get(name) and acc.sketches[name].count
+                and name in config.NORM_STATS}
+    return {
+        'version': DRIFT_REFERENCE_FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'window_size': config.WINDOW_SIZE,
+        'source': {'num_files': acc.num_files, 'num_windows': acc.num_windows},
+        'features': features,
+    }
+
+
+def write_reference(reference: Dict, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(reference, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_reference(path) -> Dict:
+    with open(path) as f:
+        reference = json.load(f)
+    version = reference.get('version')
+    if version != DRIFT_REFERENCE_FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported drift reference version {version!r} "
+                         f"(expected {DRIFT_REFERENCE_FORMAT_VERSION})")
+    return reference
+
+
+def psi(live: np.ndarray, expected: np.ndarray, epsilon: float = PSI_EPSILON) -> float:
+    """Population stability index of two bin-share vectors"""
+    live = np.maximum(live, epsilon)
+    expected = np.maximum(expected, epsilon)
+    return float(np.sum((live - expected) * np.log(live / expected)))
+
+
+def ks_statistic(live: np.ndarray, expected: np.ndarray) -> float:
+    """Kolmogorov-Smirnov distance of two binned distributions (evaluated at the bin edges)"""
+    return float(np.max(np.abs(np.cumsum(live) - np.cumsum(expected))))
+
+
+class FeatureDriftMonitor:
+    """
+    Constant-memory per-feature histograms and clip counters of live model inputs
+
+    Args:
+        reference: Summary from build_reference / load_reference
+        config: Config of the model being served (feature layout and NORM_STATS
+            must match the ones the reference was built with)
+        buffer_windows: Observations kept before a vectorized binning pass
+        interval: Windows per report period (None = only explicit report() calls)
+        on_report: Called with every periodic report
+    """
+
+    def __init__(self, reference: Dict, config=Config, buffer_windows: int = BUFFER_WINDOWS,
+                 interval: Optional[int] = REPORT_INTERVAL, on_report: Optional[Callable[[Dict], None]] = None):
+        if reference.get('window_size') != config.WINDOW_SIZE:
+            raise ValueError(f"Reference window size {reference.get('window_size')} != "
+                             f"WINDOW_SIZE {config.WINDOW_SIZE}")
+        self.names, self.columns = [], []
+        self.edges, self.expected = [], []
+        self.clip_bins = []
+        for column, name in enumerate(feature_layout(config)):
+            entry = reference['features'].get(name)
+            if entry is None:
+                continue
+            bounds = config.NORM_STATS[name]
+            if (bounds['min'], bounds['max']) != (entry['min'], entry['max']):
+                raise ValueError(f"NORM_STATS bounds of {name} differ from the reference; rebuild it")
+            edges = np.asarray(entry['edges'], dtype=np.float64)
+            self.names.append(name)
+            self.columns.append(column)
+            self.edges.append(edges)
+            self.expected.append(np.asarray(entry['fractions'], dtype=np.float64))
+            # Bins [0, low) hold x < min, bins [high, end) hold x > max
+            low = int(np.searchsorted(edges, entry['min'], side='right'))
+            high = int(np.searchsorted(edges, np.nextafter(entry['max'], np.inf), side='right'))
+            self.clip_bins.append((low, high))
+
+        self.buffer = np.empty((buffer_windows, config.TOTAL_FEATURE_DIM), dtype=np.float32)
+        self.position = 0
+        self.counts = [np.zeros(len(e) + 1, dtype=np.int64) for e in self.edges]
+        self.windows = 0
+        self.total_windows = 0
+        self.interval = interval
+        self.on_report = on_report
+        self.last_report: Optional[Dict] = None
+
+    def observe(self, features):
+        """
+        Record the inputs of one prediction
+
+        Args:
+            features: Raw window(s) [window_size, feature_dim] or [n, window_size, feature_dim]
+                (numpy array or CPU tensor), before normalize_features
+        """
+        if not isinstance(features, np.ndarray):
+            features = features.numpy(force=True)
+        if features.ndim == 2:
+            self.buffer[self.position] = features[-1]
+            self.position += 1
+            count = 1
+            if self.position == len(self.buffer):
+                self.flush()
+        else:
+            newest = features[:, -1]
+            count, start = len(newest), 0
+            while start < count:
+                chunk = newest[start:start + len(self.buffer) - self.position]
+                self.buffer[self.position:self.position + len(chunk)] = chunk
+                self.position += len(chunk)
+                if self.position == len(self.buffer):
+                    self.flush()
+                start += len(chunk)
+        self.windows += count
+        if self.interval is not None and self.windows >= self.interval:
+            self.last_report = self.report()
+            if self.on_report is not None:
+                self.on_report(self.last_report)
+
+    def flush(self):
+        """Bin the buffered observations into the histograms"""
+        values = self.buffer[:self.position]
+        for column, edges, counts in zip(self.columns, self.edges, self.counts):
+            bins = np.searchsorted(edges, values[:, column], side='right')
+            counts += np.bincount(bins, minlength=len(counts))
+        self.position = 0
+
+    def reset(self):
+        """Start a new period"""
+        self.position = 0
+        self.total_windows += self.windows
+        self.windows = 0
+        for counts in self.counts:
+            counts[:] = 0
+
+    def report(self, reset: bool = True) -> Dict:
+        """
+        Drift of the current period against the reference
+
+        Returns:
+            {'windows', 'total_windows', 'status', 'features': {name: {'psi', 'ks',
+             'clip_low', 'clip_high', 'reference_clip', 'status'}}}
+        """
+        self.flush()
+        features = {}
+        for name, counts, expected, (low, high) in zip(self.names, self.counts, self.expected, self.clip_bins):
+            total = counts.sum()
+            live = counts / total if total else np.zeros(len(counts))
+            clip_low, clip_high = float(live[:low].sum()), float(live[high:].sum())
+            reference_clip = float(expected[:low].sum() + expected[high:].sum())
+            entry = {
+                'psi': psi(live, expected) if total else float('nan'),
+                'ks': ks_statistic(live, expected) if total else float('nan'),
+                'clip_low': clip_low,
+                'clip_high': clip_high,
+                'reference_clip': reference_clip,
+            }
+            if total and (entry['psi'] >= PSI_ALERT or clip_low + clip_high - reference_clip >= CLIP_ALERT):
+                entry['status'] = 'alert'
+            elif total and entry['psi'] >= PSI_WARN:
+                entry['status'] = 'warn'
+            else:
+                entry['status'] = 'ok'
+            features[name] = entry
+
+        statuses = [entry['status'] for entry in features.values()]
+        status = 'alert' if 'alert' in statuses else 'warn' if 'warn' in statuses else 'ok'
+        result = {'windows': self.windows, 'total_windows': self.total_windows + self.windows,
+                  'status': status, 'features': features}
+        if reset:
+            self.reset()
+        return result
+
+
+def print_report(report: Dict):
+    print(f"\nDrift over {report['windows']:,} windows: {report['status'].upper()}")
+    print(f"{'Feature':<22} {'PSI':>8} {'KS':>7} {'clip<':>8} {'clip>':>8} {'ref clip':>9}  status")
+    print("-" * 74)
+    for name, entry in report['features'].items():
+        print(f"{name:<22} {entry['psi']:>8.4f} {entry['ks']:>7.4f} {entry['clip_low']:>8.2%} "
+              f"{entry['clip_high']:>8.2%} {entry['reference_clip']:>9.2%}  {entry['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feature drift reference and offline check')
+    parser.add_argument('command', choices=['reference', 'check'])
+    parser.add_argument('--reference', default=None, help='Reference file (default: <data_dir>/drift_reference.json)')
+    parser.add_argument('--out', default=None, help="Output of 'reference' (default: --reference)")
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--datasets', default=None, help='Comma-separated datasets (default: Config.DATASETS)')
+    parser.add_argument('--split', choices=['train', 'val', 'test', 'all'], default='test',
+                        help="Split replayed by 'check' ('reference' always uses train)")
+    parser.add_argument('--bins', type=int, default=REFERENCE_BINS)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all CPUs)')
+    args = parser.parse_args()
+
+    config = config_from_dict(data_overrides(args.data_dir, args.datasets))
+    reference_path = Path(args.reference or Path(config.DATA_DIR) / 'drift_reference.json')
+
+    from dataset import split_files
+    train_files, val_files, test_files = split_files(config)
+
+    if args.command == 'reference':
+        start = time.perf_counter()
+        reference = build_reference(train_files, config, args.workers, args.bins)
+        out = Path(args.out) if args.out else reference_path
+        write_reference(reference, out)
+        print(f"Reference of {len(reference['features'])} features from "
+              f"{reference['source']['num_windows']:,} windows in {time.perf_counter() - start:.1f}s -> {out}")
+        return
+
+    # check: replay a split's windows through a monitor, as the inference path would see them
+    from dataset import TraceWindowDataset
+    from features import required_columns
+    from prepare_data import build_trace_split
+
+    files = {'train': train_files, 'val': val_files, 'test': test_files,
+             'all': train_files + val_files + test_files}[args.split]
+    columns = set(required_columns(feature_layout(config))) | {'delay', 'loss_ratio', 'bandwidth_prediction'}
+    dataset = TraceWindowDataset(build_trace_split(files, args.split, sorted(columns)), config,
+                                 mode=args.split, oversample=False)
+    monitor = FeatureDriftMonitor(load_reference(reference_path), config, interval=None)
+    windows = []
+    for start in range(0, len(dataset), 8192):
+        windows.append(dataset.window_batch(np.arange(start, min(start + 8192, len(dataset))))[0].numpy())
+    windows = np.concatenate(windows) if windows else np.zeros((0, config.WINDOW_SIZE, config.TOTAL_FEATURE_DIM))
+
+    start = time.perf_counter()
+    for window in windows:
+        monitor.observe(window)
+    per_window_us = (time.perf_counter() - start) / max(len(windows), 1) * 1e6
+    print_report(monitor.report())
+    print(f"\nobserve(): {per_window_us:.2f} us per window (single-window calls, binning included)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""
+Ensemble inference for BC-GCC
+
+GCCBC_Ensemble serves K GCCBC_LSTM checkpoints of the same architecture as
+one module. Instead of K separate forwards, the members' parameters are
+stacked along a leading K dimension and evaluated together:
+
+    layer 0 input projection   one [seq*batch, in] x [in, K*4H] matmul
+                               (the input window is shared by all members)
+    deeper input projections   one bmm over [K, seq*batch, H]
+    recurrence                 one baddbmm over [K, batch, H] per time step
+    FC head                    one baddbmm per Linear
+
+so the number of kernel launches and Python steps does not grow with K.
+(torch.func vmap cannot batch nn.LSTM - there is no batching rule for
+aten::lstm - hence the explicit grouped-matmul LSTM cell.)
+
+The unfused cell only wins while the forward is launch-bound: on CPU,
+small hidden sizes at small batches. With the default model (2 x 256
+hidden) it is slower than K separate forwards at every K and batch size
+measured (0.74-0.96x at batch 1, 0.6-0.8x at batch 16-256), since
+oneDNN's fused LSTM kernel beats it. The alternative path runs each
+member's LSTM through torch.lstm on the same stacked weights (the FC head
+stays stacked), which matches or beats the plain per-model forwards.
+path='auto' times both paths on the first call of each (device, dtype,
+batch size bucket) and keeps the faster one.
+
+The result per input is the members' mean prediction and their spread
+(standard deviation), which can gate a fallback to GCC when the models
+disagree.
+
+Usage:
+    python3 ensemble.py models/seed0 models/seed1 models/seed2 [--batch-size 256]
+"""
+import argparse
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from config import config_to_dict
+from model import GCCBC_LSTM
+
+# Settings the members must agree on (same input features, normalisation and shapes)
+SHARED_KEYS = [
+    'CORE_FEATURES', 'RESERVED_FEATURES', 'TOTAL_FEATURE_DIM', 'WINDOW_SIZE',
+    'TARGET', 'NORM_STATS', 'USE_CLIPPING',
+    'LSTM_HIDDEN_SIZE', 'LSTM_NUM_LAYERS', 'FC_HIDDEN_SIZES',
+]
+# LSTM evaluation paths of GCCBC_Ensemble ('auto' = fastest measured per configuration)
+PATHS = ('auto', 'stacked', 'member')
+AUTOTUNE_REPEATS = 5   # Timed calls per path when 'auto' picks one
+
+
+def check_members(models: Sequence[GCCBC_LSTM]):
+    """Raise ValueError unless every model can be stacked with the first"""
+    if not models:
+        raise ValueError("An ensemble needs at least one model")
+    reference = config_to_dict(models[0].config)
+    shapes = {name: p.shape for name, p in models[0].state_dict().items()}
+    for i, model in enumerate(models[1:], start=1):
+        values = config_to_dict(model.config)
+        differing = [key for key in SHARED_KEYS if values.get(key) != reference.get(key)]
+        if differing:
+            raise ValueError(f"Model {i} differs from model 0 in {differing}")
+        if {name: p.shape for name, p in model.state_dict().items()} != shapes:
+            raise ValueError(f"Model {i} has different parameter shapes than model 0")
+
+
+class GCCBC_Ensemble(nn.Module):
+    """
+    K GCCBC_LSTM models evaluated in one stacked forward
+
+    Buffers (K = number of members, nn.LSTM / nn.Linear layouts):
+        weight_ih_l{n}   [K, 4H, in]
+        weight_hh_l{n}   [K, 4H, H]
+        bias_ih_l{n}     [K, 1, 4H]
+        bias_hh_l{n}     [K, 1, 4H]
+        fc_weight_{j}    [K, in, out]   (transposed for bmm)
+        fc_bias_{j}      [K, 1, out]
+
+    Args:
+        models: GCCBC_LSTM members (same architecture and input spec)
+        path: 'stacked' (grouped-matmul cell), 'member' (one native LSTM call
+            per member) or 'auto' (time both once per device / dtype / batch
+            size bucket and use the faster)
+    """
+
+    def __init__(self, models: Sequence[GCCBC_LSTM], path: str = 'auto'):
+        super(GCCBC_Ensemble, self).__init__()
+        models = list(models)
+        check_members(models)
+
+        self.config = models[0].config
+        self.num_members = len(models)
+        self.hidden_size = models[0].hidden_size
+        self.num_layers = models[0].num_layers
+        self.input_dim = models[0].input_dim
+        if path not in PATHS:
+            raise ValueError(f"Unknown path {path!r}, expected one of {PATHS}")
+        self.path = path
+        self.selected_paths = {}  # (device, dtype, autocast, batch bucket) -> path chosen by 'auto'
+
+        with torch.no_grad():
+            for name, _ in models[0].lstm.named_parameters():
+                param = torch.stack([getattr(m.lstm, name) for m in models])
+                if name.startswith('bias'):
+                    param = param.unsqueeze(1)
+                self.register_buffer(name, param.contiguous())
+
+            linears = [[module for module in m.fc if isinstance(module, nn.Linear)] for m in models]
+            self.num_fc = len(linears[0])
+            for j in range(self.num_fc):
+                weight = torch.stack([layers[j].weight for layers in linears]).transpose(1, 2)
+                bias = torch.stack([layers[j].bias for layers in linears]).unsqueeze(1)
+                self.register_buffer(f'fc_weight_{j}', weight.contiguous())
+                self.register_buffer(f'fc_bias_{j}', bias.contiguous())
+
+    @classmethod
+    def from_paths(cls, paths: Sequence, device='cpu', **kwargs) -> 'GCCBC_Ensemble':
+        """Stack inference artifacts and/or training checkpoints (see inference.load_model)"""
+        from inference import load_model
+
+        models = [load_model(path, device='cpu')[0] for path in paths]
+        return cls(models, **kwargs).to(device).eval()
+
+    def _input_gates(self, layer: int, inputs: torch.Tensor) -> torch.Tensor:
+        """Input projection of a whole sequence -> [seq, K, batch, 4H]"""
+        weight = getattr(self, f'weight_ih_l{layer}')
+        bias = getattr(self, f'bias_ih_l{layer}') + getattr(self, f'bias_hh_l{layer}')
+        if layer == 0:
+            # inputs: [batch, seq, in], shared by all members: one matmul against [in, K*4H]
+            batch, seq, _ = inputs.shape
+            gates = inputs.transpose(0, 1).reshape(seq * batch, -1) @ weight.view(-1, self.input_dim).t()
+            return gates.view(seq, batch, self.num_members, -1).transpose(1, 2) + bias
+        # inputs: [seq, K, batch, H]
+        seq, k, batch, _ = inputs.shape
+        gates = torch.baddbmm(bias, inputs.transpose(0, 1).reshape(k, seq * batch, -1), weight.transpose(1, 2))
+        return gates.view(k, seq, batch, -1).transpose(0, 1)
+
+    def _stacked_lstm(self, x: torch.Tensor) -> torch.Tensor:
+        """Last hidden state of every member, all members per kernel -> [K, batch, H]"""
+        batch, seq = x.shape[0], x.shape[1]
+        hidden = self.hidden_size
+        inputs = x
+        for layer in range(self.num_layers):
+            gates_x = self._input_gates(layer, inputs)
+            w_hh = getattr(self, f'weight_hh_l{layer}').transpose(1, 2)
+            h = x.new_zeros(self.num_members, batch, hidden, dtype=gates_x.dtype)
+            c = torch.zeros_like(h)
+            last_layer = layer == self.num_layers - 1
+            outputs = []
+            for t in range(seq):
+                gates = torch.baddbmm(gates_x[t], h, w_hh)
+                # nn.LSTM gate order: input, forget, cell, output
+                i, f = torch.sigmoid(gates[..., :2 * hidden]).chunk(2, dim=-1)
+                c = torch.addcmul(f * c, i, torch.tanh(gates[..., 2 * hidden:3 * hidden]))
+                h = torch.sigmoid(gates[..., 3 * hidden:]) * torch.tanh(c)
+                if not last_layer:
+                    outputs.append(h)
+            if not last_layer:
+                inputs = torch.stack(outputs)  # [seq, K, batch, H]
+        return h
+
+    def _member_lstm(self, x: torch.Tensor) -> torch.Tensor:
+        """Same as _stacked_lstm, one native LSTM call per member"""
+        h0 = x.new_zeros(self.num_layers, x.shape[0], self.hidden_size)
+        last = []
+        for k in range(self.num_members):
+            params = []
+            for layer in range(self.num_layers):
+                params += [getattr(self, f'weight_ih_l{layer}')[k], getattr(self, f'weight_hh_l{layer}')[k],
+                           getattr(self, f'bias_ih_l{layer}')[k, 0], getattr(self, f'bias_hh_l{layer}')[k, 0]]
+            output, _, _ = torch.lstm(x, (h0, h0), params, True, self.num_layers, 0.0, False, False, True)
+            last.append(output[:, -1])
+        return torch.stack(last)
+
+    def _lstm(self, path: str, x: torch.Tensor) -> torch.Tensor:
+        return self._stacked_lstm(x) if path == 'stacked' else self._member_lstm(x)
+
+    def select_path(self, x: torch.Tensor) -> str:
+        """LSTM path for an input like x ('auto' measures once per configuration)"""
+        if self.path != 'auto':
+            return self.path
+        batch_bucket = 1 << max(x.shape[0] - 1, 0).bit_length()
+        key = (str(x.device), x.dtype, torch.is_autocast_enabled(x.device.type), batch_bucket)
+        if key not in self.selected_paths:
+            sync = torch.cuda.synchronize if x.device.type == 'cuda' else (lambda: None)
+            times = {}
+            with torch.no_grad():
+                for path in PATHS[1:]:
+                    self._lstm(path, x)  # Warm-up
+                    times[path] = float('inf')
+                    for _ in range(AUTOTUNE_REPEATS):  # Fastest call: robust to scheduling noise
+                        sync()
+                        start = time.perf_counter()
+                        self._lstm(path, x)
+                        sync()
+                        times[path] = min(times[path], time.perf_counter() - start)
+            self.selected_paths[key] = min(times, key=times.get)
+        return self.selected_paths[key]
+
+    def members(self, x: torch.Tensor, path: Optional[str] = None) -> torch.Tensor:
+        """
+        Every member's prediction
+
+        Args:
+            x: [batch, seq_len, feature_dim] (normalized, as for GCCBC_LSTM)
+            path: 'stacked' / 'member' to force an LSTM path (default: select_path)
+
+        Returns:
+            [K, batch, 1] normalized bandwidth predictions
+        """
+        out = self._lstm(path or self.select_path(x), x)
+
+        # FC head on the last time step (Dropout is the identity in eval mode)
+        for j in range(self.num_fc):
+            out = torch.relu(torch.baddbmm(getattr(self, f'fc_bias_{j}'), out, getattr(self, f'fc_weight_{j}')))
+        return out
+
+    def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            x: [batch, seq_len, feature_dim]
+
+        Returns:
+            mean: [batch, 1] mean of the members' normalized predictions
+            spread: [batch, 1] their standard deviation (0 for a single member)
+        """
+        outputs = self.members(x)
+        return outputs.mean(dim=0), outputs.std(dim=0, unbiased=False)
+
+    def predict(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Prediction mode (no gradient), bf16 autocast as in GCCBC_LSTM.predict
+
+        Args:
+            x: [batch, seq_len, feature_dim] or [seq_len, feature_dim]
+
+        Returns:
+            mean, spread (squeezed)
+        """
+        self.eval()
+        use_bf16 = getattr(self.config, 'USE_BF16_CPU', False) and x.device.type == 'cpu'
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=use_bf16):
+            if x.dim() == 2:
+                x = x.unsqueeze(0)
+            mean, spread = self.forward(x)
+            return mean.float().squeeze(), spread.float().squeeze()
+
+    def predict_bps(self, features: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Raw (unnormalized) features -> mean and spread of the bandwidth in bps
+
+        Args:
+            features: [batch, seq_len, feature_dim] or [seq_len, feature_dim]
+        """
+        from dataset import normalize_features
+
+        stats = self.config.NORM_STATS['bandwidth_prediction']
+        scale = stats['max'] - stats['min']
+        mean, spread = self.predict(normalize_features(features, self.config))
+        return mean * scale + stats['min'], spread * scale
+
+    def count_parameters(self):
+        return sum(b.numel() for b in self.buffers())
+
+
+def ensemble_policy(ensemble: GCCBC_Ensemble):
+    """closed_loop policy (obs [n, window, feature_dim] -> bps [n]) driven by the ensemble mean"""
+    import numpy as np
+
+    device = next(ensemble.buffers()).device
+
+    def policy(obs: np.ndarray) -> np.ndarray:
+        mean, _ = ensemble.predict_bps(torch.from_numpy(obs).to(device))
+        return mean.reshape(-1).cpu().numpy()
+
+    return policy
+
+
+def _time_ms(fn, repeats: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time a stacked GCCBC_LSTM ensemble')
+    parser.add_argument('models', nargs='+', help='Inference artifact directories or checkpoints')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--repeats', type=int, default=100)
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--path', choices=PATHS, default='auto', help='LSTM evaluation path')
+    args = parser.parse_args()
+
+    from inference import load_model
+
+    models: List[GCCBC_LSTM] = [load_model(path, device=args.device)[0] for path in args.models]
+    ensemble = GCCBC_Ensemble(models, path=args.path).to(args.device).eval()
+    config = ensemble.config
+    x = torch.rand(args.batch_size, config.WINDOW_SIZE, config.TOTAL_FEATURE_DIM, device=args.device)
+
+    with torch.no_grad():
+        sequential = torch.stack([model(x)[0] for model in models])
+        deviation = max((ensemble.members(x, path) - sequential).abs().max().item() for path in PATHS[1:])
+        path = ensemble.select_path(x)
+        ensemble_ms = _time_ms(lambda: ensemble(x), args.repeats)
+        sequential_ms = _time_ms(lambda: [model(x) for model in models], args.repeats)
+
+    print(f"Ensemble of {ensemble.num_members} models "
+          f"({config.LSTM_NUM_LAYERS} layers x {config.LSTM_HIDDEN_SIZE} hidden)")
+    print(f"  Max deviation from per-model forward: {deviation:.2e}")
+    print(f"  Batch {args.batch_size}: ensemble ({path}) {ensemble_ms:.3f} ms, sequential {sequential_ms:.3f} ms "
+          f"({sequential_ms / ensemble_ms:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
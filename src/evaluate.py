@@ -0,0 +1,233 @@
+"""
+Whole-trace open-loop evaluation
+
+Trainer.test pools loss/MAE/R² over shuffled (and oversampled) windows.
+This scores the model on every window of every trace of a split exactly
+once and breaks the errors down by trace, dataset, loss bucket and delay
+bucket.
+
+The split is held as per-trace step columns (a `prepare_data.py
+--per-trace` file, or the same payload built in memory from the pickles).
+Windows of many traces go through the model together: a chunk of
+BATCH_WINDOWS target rows gathers its [n, WINDOW_SIZE] column slices, runs
+the feature kernels once (TraceWindowDataset.window_batch) and one forward.
+Each window keeps the zero initial LSTM state the model was trained with,
+so no padding or masking is needed and the predictions match the dataset's
+windows exactly. Per-group metrics are bincount sums over the trace /
+bucket ids of all predictions (two passes for SS_tot, as Trainer.validate).
+
+Metrics (bps):
+    mae     mean |prediction - target|
+    mape    mean |prediction - target| / (target + 1), as in Trainer.validate
+    r2      1 - SS_res / SS_tot within the group
+
+Usage:
+    python evaluate.py models/bcgcc_lstm --split test --out reports/eval_test.json
+    python evaluate.py checkpoints/best.pt --traces data/processed/test_traces.pt --out reports/eval.csv
+"""
+import argparse
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import torch
+
+from config import config_from_dict, data_overrides
+
+BATCH_WINDOWS = 8192
+# Bucket lower edges of the loss ratio / delay (ms) at the target step
+LOSS_BUCKETS = [0.0, 0.01, 0.05, 0.1]
+DELAY_BUCKETS = [0.0, 150.0, 300.0, 500.0]
+
+
+def bucket_labels(edges: Sequence[float], fmt: str = '{:g}') -> List[str]:
+    """'[a, b)' labels for consecutive edges, the last one open-ended"""
+    labels = [f"[{fmt.format(lo)}, {fmt.format(hi)})" for lo, hi in zip(edges[:-1], edges[1:])]
+    return labels + [f">= {fmt.format(edges[-1])}"]
+
+
+def trace_label(path) -> str:
+    """'data/NY/rates_delay_loss_gcc_Ferry_Ferry4.pickle' -> 'NY/Ferry_Ferry4'"""
+    path = Path(path)
+    return f"{path.parent.name}/{re.sub(r'^rates_delay_loss_gcc_(report_)?', '', path.stem)}"
+
+
+def group_metrics(groups: np.ndarray, num_groups: int, predictions: np.ndarray,
+                  targets: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    MAE / MAPE / R² per group from bincount sums (SS_tot around the group mean, two passes)
+
+    Args:
+        groups: [n] group id of every prediction (0 <= id < num_groups)
+
+    Returns:
+        {'samples', 'mae', 'mape', 'r2'} arrays of length num_groups (NaN for empty groups)
+    """
+    errors = predictions - targets
+
+    def total(values=None):
+        return np.bincount(groups, weights=values, minlength=num_groups)
+
+    count = total()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mae = total(np.abs(errors)) / count
+        mape = total(np.abs(errors) / (targets + 1.0)) / count
+        mean = total(targets) / count
+        ss_tot = total((targets - mean[groups]) ** 2)
+        ss_res = total(errors ** 2)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, 0.0)
+    r2[count == 0] = np.nan
+    return {'samples': count.astype(np.int64), 'mae': mae, 'mape': mape, 'r2': r2}
+
+
+def metric_rows(names: Sequence[str], metrics: Dict[str, np.ndarray], key: str) -> List[Dict]:
+    """One row per non-empty group"""
+    rows = []
+    for i, name in enumerate(names):
+        if metrics['samples'][i] == 0:
+            continue
+        rows.append({key: name, 'samples': int(metrics['samples'][i]), 'mae': float(metrics['mae'][i]),
+                     'mape': float(metrics['mape'][i]), 'r2': float(metrics['r2'][i])})
+    return rows
+
+
+def predict_windows(model, config, dataset, batch_windows: int = BATCH_WINDOWS,
+                    device='cpu', verbose: bool = True) -> np.ndarray:
+    """
+    Model prediction (bps) for every sample of a TraceWindowDataset
+
+    model may be anything whose forward returns (prediction, ...), e.g.
+    GCCBC_LSTM or ensemble.GCCBC_Ensemble (mean prediction).
+    """
+    from dataset import denormalize_target, normalize_features
+
+    device = torch.device(device)
+    predictions = np.empty(len(dataset), dtype=np.float64)
+    start = time.perf_counter()
+    model.eval()
+    with torch.no_grad():
+        for lo in range(0, len(dataset), batch_windows):
+            hi = min(lo + batch_windows, len(dataset))
+            features, _, _ = dataset.window_batch(np.arange(lo, hi))
+            output = model(normalize_features(features.to(device), config))[0]
+            predictions[lo:hi] = denormalize_target(output.float(), config).reshape(-1).cpu().numpy()
+            if verbose and (lo // batch_windows) % 50 == 49:
+                print(f"  {hi:,}/{len(dataset):,} windows, {hi / (time.perf_counter() - start):,.0f} windows/s")
+    return predictions
+
+
+def evaluate_split(model, config, source, batch_windows: int = BATCH_WINDOWS, device='cpu',
+                   verbose: bool = True) -> Dict[str, List[Dict]]:
+    """
+    Per-trace, per-dataset and per-bucket metrics of the model on one split
+
+    Args:
+        source: Per-trace split file (*_traces.pt) or payload (prepare_data.build_trace_split)
+
+    Returns:
+        {'traces', 'datasets', 'loss_buckets', 'delay_buckets'} lists of metric rows
+        (the dataset table ends with an 'all' row pooling every window)
+    """
+    from dataset import TraceWindowDataset
+
+    dataset = TraceWindowDataset(source, config, mode='eval', oversample=False)
+    predictions = predict_windows(model, config, dataset, batch_windows, device, verbose)
+    targets = dataset.targets.astype(np.float64)
+    losses = dataset.columns['loss_ratio'][dataset.target_rows]
+    delays = dataset.columns['delay'][dataset.target_rows]
+
+    files = dataset.files
+    trace_metrics = group_metrics(dataset.sample_file_ids, len(files), predictions, targets)
+    traces = metric_rows(files, trace_metrics, 'file')
+    for row in traces:
+        row['dataset'] = Path(row['file']).parent.name
+
+    dataset_names = sorted({Path(path).parent.name for path in files})
+    file_datasets = np.array([dataset_names.index(Path(path).parent.name) for path in files], dtype=np.int64)
+    sample_datasets = file_datasets[dataset.sample_file_ids] if len(files) else dataset.sample_file_ids
+    datasets = metric_rows(dataset_names, group_metrics(sample_datasets, len(dataset_names),
+                                                        predictions, targets), 'dataset')
+    pooled = group_metrics(np.zeros(len(targets), dtype=np.int64), 1, predictions, targets)
+    datasets += metric_rows(['all'], pooled, 'dataset')
+
+    loss_ids = np.searchsorted(LOSS_BUCKETS, losses, side='right') - 1
+    delay_ids = np.searchsorted(DELAY_BUCKETS, delays, side='right') - 1
+    loss_buckets = metric_rows(bucket_labels([v * 100 for v in LOSS_BUCKETS]),
+                               group_metrics(np.maximum(loss_ids, 0), len(LOSS_BUCKETS), predictions, targets),
+                               'loss_pct')
+    delay_buckets = metric_rows(bucket_labels(DELAY_BUCKETS),
+                                group_metrics(np.maximum(delay_ids, 0), len(DELAY_BUCKETS), predictions, targets),
+                                'delay_ms')
+    return {'traces': traces, 'datasets': datasets, 'loss_buckets': loss_buckets, 'delay_buckets': delay_buckets}
+
+
+def print_table(rows: List[Dict], key: str, title: str):
+    width = max([28] + [len(str(row[key])) for row in rows])
+    print(f"\n{title:<{width}} {'Samples':>10} {'MAE (Mbps)':>11} {'MAPE':>8} {'R²':>8}")
+    print("-" * (width + 41))
+    for row in rows:
+        print(f"{str(row[key]):<{width}} {row['samples']:>10,} {row['mae'] / 1e6:>11.3f} "
+              f"{row['mape']:>8.2%} {row['r2']:>8.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-trace / per-dataset evaluation on whole traces')
+    parser.add_argument('model', help='Inference artifact directory or training checkpoint')
+    parser.add_argument('--split', choices=['train', 'val', 'test', 'all'], default='test')
+    parser.add_argument('--traces', default=None,
+                        help='Per-trace split file (default: <data_dir>/processed/<split>_traces.pt if present, '
+                             'else the pickles of the split)')
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--datasets', default=None, help='Comma-separated datasets (default: Config.DATASETS)')
+    parser.add_argument('--batch-windows', type=int, default=BATCH_WINDOWS, help='Windows per forward')
+    parser.add_argument('--worst', type=int, default=10, help='Print the N traces with the highest MAE')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--out', default=None, help='Write the tables (.json) or per-trace rows (.csv)')
+    args = parser.parse_args()
+
+    from inference import load_model
+    model, config = load_model(args.model, device=args.device)
+
+    data_config = config_from_dict(data_overrides(args.data_dir, args.datasets), base=config)
+
+    start = time.perf_counter()
+    source = Path(args.traces) if args.traces else Path(data_config.DATA_DIR) / 'processed' / f'{args.split}_traces.pt'
+    if not source.exists():
+        if args.traces:
+            parser.error(f"{source} not found")
+        from dataset import split_files
+        from features import feature_layout, required_columns
+        from prepare_data import build_trace_split
+        train_files, val_files, test_files = split_files(data_config)
+        files = {'train': train_files, 'val': val_files, 'test': test_files,
+                 'all': train_files + val_files + test_files}[args.split]
+        columns = set(required_columns(feature_layout(config))) | {'delay', 'loss_ratio', 'bandwidth_prediction'}
+        source = build_trace_split(files, args.split, sorted(columns))
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tables = evaluate_split(model, config, source, args.batch_windows, args.device)
+    elapsed = time.perf_counter() - start
+    windows = tables['datasets'][-1]['samples'] if tables['datasets'] else 0
+    print(f"\nEvaluated {len(tables['traces'])} traces, {windows:,} windows in {elapsed:.1f}s "
+          f"(+{load_s:.1f}s loading, {windows / max(elapsed, 1e-9):,.0f} windows/s)")
+
+    print_table(tables['datasets'], 'dataset', 'Dataset')
+    print_table(tables['loss_buckets'], 'loss_pct', 'Loss (%)')
+    print_table(tables['delay_buckets'], 'delay_ms', 'Delay (ms)')
+    if args.worst:
+        worst = sorted(tables['traces'], key=lambda row: row['mae'], reverse=True)[:args.worst]
+        worst = [dict(row, trace=trace_label(row['file'])) for row in worst]
+        print_table(worst, 'trace', f'Worst {len(worst)} traces')
+
+    if args.out:
+        from closed_loop import write_results
+        summary = {name: rows for name, rows in tables.items() if name != 'traces'}
+        write_results(tables['traces'], summary, args.out)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
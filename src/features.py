@@ -0,0 +1,396 @@
+"""
+Feature registry with vectorized window kernels
+
+Every model input feature is a named kernel that computes its value for all
+sliding windows of a trace at once. Kernels operate on [num_windows,
+window_size] arrays (strided views of the raw trace columns, window k ending
+just before target step t = k + window_size) and declare what they need:
+
+    columns   raw trace columns ('delay', 'loss_ratio', ...)
+    requires  other registered features or intermediates
+
+Intermediates (e.g. delay gradients, expanding mean/std) are registered the
+same way but never placed in the model input; each is computed at most once
+per call however many features share it. Only the requested features and
+their dependencies run, so disabled features cost nothing.
+
+The input layout is CORE_FEATURES followed by RESERVED_FEATURES. Reserved
+slots stay zero unless a registered feature is enabled for them through
+Config.EXTENSION_FEATURES: a feature named like a reserved slot (e.g.
+'timestep') fills that slot, any other takes the next free 'custom_*' slot.
+
+Adding a feature (delay_ratio below is defined this way):
+
+    @register_feature('delay_ratio', requires=('delay', 'delay_min'), bounds=(1, 10))
+    def delay_ratio(ctx):
+        return ctx['delay'] / np.maximum(ctx['delay_min'], 1.0)
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import Config
+
+
+class FeatureDef:
+    """A registered kernel: fn(ctx) -> [num_windows, window_size] (or any value for intermediates)"""
+
+    def __init__(self, name: str, fn: Callable, columns: Tuple[str, ...] = (),
+                 requires: Tuple[str, ...] = (), bounds: Optional[Tuple[float, float]] = None,
+                 intermediate: bool = False):
+        self.name = name
+        self.fn = fn
+        self.columns = tuple(columns)
+        self.requires = tuple(requires)
+        self.bounds = bounds
+        self.intermediate = intermediate
+
+    def __repr__(self):
+        kind = 'intermediate' if self.intermediate else 'feature'
+        return f"FeatureDef({self.name!r}, {kind}, columns={self.columns}, requires={self.requires})"
+
+
+# Name -> FeatureDef (features and intermediates share one namespace)
+REGISTRY: Dict[str, FeatureDef] = {}
+
+
+def register_feature(name: str, columns: Sequence[str] = (), requires: Sequence[str] = (),
+                     bounds: Optional[Tuple[float, float]] = None, intermediate: bool = False):
+    """
+    Register a kernel under `name`
+
+    Args:
+        columns: Raw trace columns read through ctx.column()
+        requires: Registered names read through ctx[name]
+        bounds: Default (min, max) normalization bounds, used when
+                Config.NORM_STATS has no entry for the feature
+        intermediate: Shared helper value, not usable as a model input
+    """
+    def decorator(fn):
+        if name in REGISTRY:
+            raise ValueError(f"Feature {name!r} is already registered")
+        REGISTRY[name] = FeatureDef(name, fn, columns, requires, bounds, intermediate)
+        return fn
+    return decorator
+
+
+def register_intermediate(name: str, columns: Sequence[str] = (), requires: Sequence[str] = ()):
+    return register_feature(name, columns, requires, intermediate=True)
+
+
+def resolve(names: Sequence[str]) -> List[str]:
+    """
+    Requested names plus their dependencies, in dependency order
+
+    Raises:
+        KeyError: unknown feature or dependency
+        ValueError: dependency cycle
+    """
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Feature dependency cycle: {' -> '.join(path + [name])}")
+        if name not in REGISTRY:
+            raise KeyError(f"Unknown feature {name!r}" + (f" (required by {path[-1]!r})" if path else ""))
+        state[name] = 'visiting'
+        for dep in REGISTRY[name].requires:
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in names:
+        visit(name, [])
+    return order
+
+
+def required_columns(names: Sequence[Optional[str]]) -> List[str]:
+    """Raw trace columns needed to compute the given features"""
+    columns = []
+    for name in resolve([n for n in names if n is not None]):
+        for column in REGISTRY[name].columns:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+class FeatureContext:
+    """Memoizing view of one batch of windows handed to the kernels"""
+
+    def __init__(self, windows: Dict[str, np.ndarray], steps: Optional[np.ndarray] = None):
+        self.windows = windows
+        self.steps = steps
+        self.cache: Dict[str, object] = {}
+        self.shape = steps.shape if steps is not None else next(iter(windows.values())).shape
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw [num_windows, window_size] column"""
+        if name not in self.windows:
+            raise KeyError(f"Trace column {name!r} was not loaded")
+        return self.windows[name]
+
+    def __getitem__(self, name: str):
+        if name not in self.cache:
+            self.cache[name] = REGISTRY[name].fn(self)
+        return self.cache[name]
+
+
+def window_views(column: np.ndarray, window_size: int) -> np.ndarray:
+    """
+    Windows ending before each target step t in [window_size, len(column))
+
+    Returns:
+        Read-only view [num_windows, window_size] (row k covers steps k..k+window_size-1)
+    """
+    column = np.asarray(column, dtype=np.float64)
+    if len(column) <= window_size:
+        return np.empty((0, window_size), dtype=np.float64)
+    return sliding_window_view(column[:-1], window_size)
+
+
+def features_from_windows(windows: Dict[str, np.ndarray], names: Sequence[Optional[str]],
+                          steps: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Stack the requested features of already-windowed columns
+
+    Args:
+        windows: Raw column name -> [num_windows, window_size]
+        names: Output slot names; None gives an all-zero slot
+        steps: [num_windows, window_size] absolute trace step of every entry
+               (only needed by step-dependent features such as 'timestep')
+
+    Returns:
+        [num_windows, window_size, len(names)] float64
+    """
+    ctx = FeatureContext(windows, steps)
+    requested = [n for n in names if n is not None]
+    for name in requested:
+        if REGISTRY.get(name) is not None and REGISTRY[name].intermediate:
+            raise ValueError(f"{name!r} is an intermediate, not a feature")
+    for name in resolve(requested):
+        ctx[name]  # Dependencies first, each computed once
+
+    out = np.zeros(ctx.shape + (len(names),), dtype=np.float64)
+    for i, name in enumerate(names):
+        if name is not None:
+            out[:, :, i] = ctx[name]
+    return out
+
+
+def compute_features(columns: Dict[str, np.ndarray], names: Sequence[Optional[str]],
+                     window_size: int = Config.WINDOW_SIZE) -> np.ndarray:
+    """
+    Features of every sliding window of one trace
+
+    Args:
+        columns: Raw per-step trace columns (at least required_columns(names))
+        names: Output slot names (None = zero slot), e.g. feature_layout(config)
+
+    Returns:
+        [num_windows, window_size, len(names)] float64, where window k is the
+        input for target step t = k + window_size
+    """
+    needed = required_columns(names) or ['delay']  # Length reference when no column is read
+    windows = {name: window_views(columns[name], window_size) for name in needed}
+    num_windows = windows[needed[0]].shape[0]
+    steps = np.arange(num_windows)[:, None] + np.arange(window_size)[None, :]
+    return features_from_windows(windows, names, steps)
+
+
+# --- Model input layout ---
+
+def feature_layout(config) -> List[Optional[str]]:
+    """
+    Feature computed for each of the TOTAL_FEATURE_DIM input slots (None = zero)
+
+    CORE_FEATURES come first; EXTENSION_FEATURES fill reserved slots of the
+    same name, or else the next free 'custom_*' slot.
+    """
+    layout = list(config.CORE_FEATURES)
+    reserved = list(config.RESERVED_FEATURES)
+    slots: List[Optional[str]] = [None] * len(reserved)
+    custom = [i for i, name in enumerate(reserved) if name.startswith('custom_')]
+    for name in getattr(config, 'EXTENSION_FEATURES', []):
+        if name in layout or name in slots:
+            raise ValueError(f"Feature {name!r} is enabled twice")
+        if name in reserved:
+            slots[reserved.index(name)] = name
+        elif custom:
+            slots[custom.pop(0)] = name
+        else:
+            raise ValueError(f"No free custom_* slot left for extension feature {name!r}")
+    resolve([n for n in layout + slots if n is not None])  # Fail early on unknown names
+    return layout + slots
+
+
+def normalization_bounds(config) -> List[Tuple[int, float, float]]:
+    """(slot, min, max) for every computed slot with known bounds"""
+    bounds = []
+    for i, name in enumerate(feature_layout(config)):
+        if name is None:
+            continue
+        if name in config.NORM_STATS:
+            bounds.append((i, config.NORM_STATS[name]['min'], config.NORM_STATS[name]['max']))
+        elif REGISTRY[name].bounds is not None:
+            bounds.append((i,) + tuple(REGISTRY[name].bounds))
+    return bounds
+
+
+# --- Intermediates ---
+
+def _expanding_mean_std(x: np.ndarray):
+    """Mean and population std of x[:, :i+1] for every i (Welford running mean / M2, O(N * W))"""
+    mean = np.empty(x.shape, dtype=np.float64)
+    std = np.empty(x.shape, dtype=np.float64)
+    if x.shape[1] == 0:
+        return mean, std
+    running = x[:, 0].astype(np.float64)
+    m2 = np.zeros_like(running)
+    mean[:, 0] = running
+    std[:, 0] = 0.0
+    for i in range(1, x.shape[1]):
+        delta = x[:, i] - running
+        running = running + delta / (i + 1)
+        m2 += delta * (x[:, i] - running)
+        mean[:, i] = running
+        std[:, i] = np.sqrt(m2 / (i + 1))
+    return mean, std
+
+
+def _first_difference(x: np.ndarray) -> np.ndarray:
+    """x[i] - x[i-1] within each window, 0 at i = 0"""
+    return np.concatenate([np.zeros_like(x[:, :1]), np.diff(x, axis=1)], axis=1)
+
+
+@register_intermediate('delay_stats', columns=('delay',))
+def _delay_stats(ctx):
+    return _expanding_mean_std(ctx.column('delay'))
+
+
+@register_intermediate('recv_rate_stats', columns=('receiving_rate',))
+def _recv_rate_stats(ctx):
+    return _expanding_mean_std(ctx.column('receiving_rate'))
+
+
+# --- Core features (GCCDataset semantics, expanding statistics within each window) ---
+
+@register_feature('delay', columns=('delay',))
+def _delay(ctx):
+    return ctx.column('delay')
+
+
+@register_feature('loss_ratio', columns=('loss_ratio',))
+def _loss_ratio(ctx):
+    return ctx.column('loss_ratio')
+
+
+@register_feature('receiving_rate', columns=('receiving_rate',))
+def _receiving_rate(ctx):
+    return ctx.column('receiving_rate')
+
+
+@register_feature('prev_bandwidth', columns=('bandwidth_prediction',))
+def _prev_bandwidth(ctx):
+    bw = ctx.column('bandwidth_prediction')
+    return np.concatenate([bw[:, :1], bw[:, :-1]], axis=1)
+
+
+@register_feature('delay_gradient', requires=('delay',))
+def _delay_gradient(ctx):
+    return _first_difference(ctx['delay'])
+
+
+@register_feature('throughput_effective', requires=('receiving_rate', 'loss_ratio'))
+def _throughput_effective(ctx):
+    return ctx['receiving_rate'] * (1.0 - ctx['loss_ratio'])
+
+
+@register_feature('delay_mean', requires=('delay_stats',))
+def _delay_mean(ctx):
+    return ctx['delay_stats'][0]
+
+
+@register_feature('delay_std', requires=('delay_stats',))
+def _delay_std(ctx):
+    return ctx['delay_stats'][1]
+
+
+@register_feature('delay_min', requires=('delay',))
+def _delay_min(ctx):
+    return np.minimum.accumulate(ctx['delay'], axis=1)
+
+
+@register_feature('queue_delay', requires=('delay', 'delay_min'))
+def _queue_delay(ctx):
+    return ctx['delay'] - ctx['delay_min']
+
+
+@register_feature('delay_accel', requires=('delay_gradient',))
+def _delay_accel(ctx):
+    return _first_difference(ctx['delay_gradient'])
+
+
+@register_feature('delay_trend', requires=('delay',))
+def _delay_trend(ctx):
+    """Late-half minus early-half mean of the gradients seen up to each step"""
+    delays = ctx['delay']
+    num_windows, window_size = delays.shape
+    trend = np.zeros((num_windows, window_size))
+    if window_size < 3:
+        return trend
+    csum = np.concatenate([np.zeros((num_windows, 1)), np.cumsum(np.diff(delays, axis=1), axis=1)], axis=1)
+    for i in range(2, window_size):
+        mid = i // 2
+        trend[:, i] = (csum[:, i] - csum[:, mid]) / (i - mid) - csum[:, mid] / mid
+    return trend
+
+
+@register_feature('loss_change', requires=('loss_ratio',))
+def _loss_change(ctx):
+    return _first_difference(ctx['loss_ratio'])
+
+
+@register_feature('bw_utilization', requires=('receiving_rate', 'prev_bandwidth'))
+def _bw_utilization(ctx):
+    return ctx['receiving_rate'] / (ctx['prev_bandwidth'] + 1e-6)
+
+
+@register_feature('recv_rate_mean', requires=('recv_rate_stats',))
+def _recv_rate_mean(ctx):
+    return ctx['recv_rate_stats'][0]
+
+
+@register_feature('recv_rate_std', requires=('recv_rate_stats',))
+def _recv_rate_std(ctx):
+    return ctx['recv_rate_stats'][1]
+
+
+# --- Extension features (enable through Config.EXTENSION_FEATURES) ---
+
+@register_feature('timestep', bounds=(0, 3000))
+def _timestep(ctx):
+    """Absolute step within the trace (200 ms units)"""
+    if ctx.steps is None:
+        raise KeyError("'timestep' needs the absolute step of every window entry")
+    return ctx.steps.astype(np.float64)
+
+
+@register_feature('delay_ratio', requires=('delay', 'delay_min'), bounds=(1, 10))
+def _delay_ratio(ctx):
+    """Delay relative to the window's baseline (1 = empty queue)"""
+    return ctx['delay'] / np.maximum(ctx['delay_min'], 1.0)
+
+
+@register_feature('loss_mean', requires=('loss_ratio',), bounds=(0, 1))
+def _loss_mean(ctx):
+    """Expanding mean loss ratio within the window"""
+    loss = ctx['loss_ratio']
+    return np.cumsum(loss, axis=1) / np.arange(1, loss.shape[1] + 1)
+
+
+@register_feature('recv_rate_gradient', requires=('receiving_rate',), bounds=(-5e6, 5e6))
+def _recv_rate_gradient(ctx):
+    return _first_difference(ctx['receiving_rate'])
@@ -0,0 +1,273 @@
+"""
+Fit NORM_STATS from the training data
+
+One streaming pass over the traces computes, per input feature (core plus
+enabled EXTENSION_FEATURES) and for the target, a mergeable QuantileSketch plus exact min/max and clip counts under
+the current bounds. Every file yields an independent partial result, so the
+files are processed in a process pool and the partials merged as they
+arrive; memory stays bounded by the sketch size, not the corpus size.
+
+The fitted bounds are the lower/upper quantiles (default p0.5 / p99.5) of
+the values the normaliser actually sees, i.e. the per-step features of every
+sliding window. They are written to a versioned JSON file that Config picks
+up through NORM_STATS_FILE (or config_from_dict({'NORM_STATS_FILE': ...})).
+
+Usage:
+    python fit_norm_stats.py                          # training split of Config.DATASETS
+    python fit_norm_stats.py --all-files --workers 8 --out ../data/norm_stats.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import Config, NORM_STATS_FORMAT_VERSION, config_from_dict, data_overrides
+from features import compute_features, feature_layout, required_columns
+from quantile_sketch import QuantileSketch
+from trace_store import load_trace
+
+LOWER_QUANTILE = 0.005
+UPPER_QUANTILE = 0.995
+RELATIVE_ACCURACY = 0.005
+
+
+def fit_partial(file_path: str, window_size: int = Config.WINDOW_SIZE,
+                reference_stats: Optional[Dict] = None,
+                relative_accuracy: float = RELATIVE_ACCURACY,
+                feature_names: Optional[List[str]] = None,
+                last_step: bool = False) -> Dict:
+    """
+    Partial statistics of one trace
+
+    Args:
+        feature_names: Registered features to fit (default: Config.CORE_FEATURES)
+        last_step: Only the newest step of every window instead of all steps
+
+    Returns:
+        {'path', 'windows', 'features': {name: {'sketch', 'clip_low', 'clip_high'}}}
+        where the clip counts are relative to reference_stats (default Config.NORM_STATS)
+    """
+    reference_stats = Config.NORM_STATS if reference_stats is None else reference_stats
+    feature_names = list(Config.CORE_FEATURES if feature_names is None else feature_names)
+    columns = set(required_columns(feature_names)) | {Config.TARGET}
+    data = load_trace(file_path, columns=sorted(columns))
+    bw_preds = np.asarray(data[Config.TARGET], dtype=np.float64)
+    features = compute_features(data, feature_names, window_size)
+    if last_step:
+        features = features[:, -1:, :]
+
+    values = {name: features[:, :, i] for i, name in enumerate(feature_names)}
+    values[Config.TARGET] = bw_preds[window_size:]
+
+    partial = {'path': os.path.abspath(file_path), 'windows': int(features.shape[0]), 'features': {}}
+    for name, column in values.items():
+        column = column.ravel()
+        bounds = reference_stats.get(name)
+        partial['features'][name] = {
+            'sketch': QuantileSketch(relative_accuracy).add(column).to_dict(),
+            'clip_low': int(np.count_nonzero(column < bounds['min'])) if bounds else 0,
+            'clip_high': int(np.count_nonzero(column > bounds['max'])) if bounds else 0,
+        }
+    return partial
+
+
+class NormStatsAccumulator:
+    """Merges per-file partials into corpus-wide sketches and clip counts"""
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[str, QuantileSketch] = {}
+        self.clip_low: Dict[str, int] = {}
+        self.clip_high: Dict[str, int] = {}
+        self.num_files = 0
+        self.num_windows = 0
+
+    def add(self, partial: Dict):
+        self.num_files += 1
+        self.num_windows += partial['windows']
+        for name, entry in partial['features'].items():
+            sketch = QuantileSketch.from_dict(entry['sketch'])
+            if name in self.sketches:
+                self.sketches[name].merge(sketch)
+            else:
+                self.sketches[name] = sketch
+            self.clip_low[name] = self.clip_low.get(name, 0) + entry['clip_low']
+            self.clip_high[name] = self.clip_high.get(name, 0) + entry['clip_high']
+        return self
+
+    def merge(self, other: 'NormStatsAccumulator'):
+        """Combine with an accumulator built over other files"""
+        self.num_files += other.num_files
+        self.num_windows += other.num_windows
+        for name, sketch in other.sketches.items():
+            if name in self.sketches:
+                self.sketches[name].merge(sketch)
+            else:
+                self.sketches[name] = QuantileSketch.merged([sketch])
+            self.clip_low[name] = self.clip_low.get(name, 0) + other.clip_low[name]
+            self.clip_high[name] = self.clip_high.get(name, 0) + other.clip_high[name]
+        return self
+
+    def fit(self, reference_stats: Optional[Dict] = None, lower: float = LOWER_QUANTILE,
+            upper: float = UPPER_QUANTILE, keep: Iterable[str] = ()) -> Dict[str, Dict]:
+        """
+        Fitted bounds and diagnostics per feature
+
+        The bounds are the [lower, upper] quantiles. When they collapse to a
+        single value (e.g. loss features that are almost always 0) the observed
+        min/max are used instead; features in `keep` retain their reference bounds.
+        """
+        reference_stats = Config.NORM_STATS if reference_stats is None else reference_stats
+        keep = set(keep)
+        results = {}
+        for name, sketch in self.sketches.items():
+            lo, hi = sketch.quantiles([lower, upper])
+            method = 'quantile'
+            reference = reference_stats.get(name)
+            if name in keep and reference:
+                lo, hi, method = reference['min'], reference['max'], 'kept'
+            elif hi <= lo:
+                lo, hi, method = sketch.min, sketch.max, 'observed'
+                if hi <= lo and reference:
+                    lo, hi, method = reference['min'], reference['max'], 'kept'
+
+            count = sketch.count
+            entry = {
+                'min': float(lo),
+                'max': float(hi),
+                'method': method,
+                'count': count,
+                'mean': sketch.mean,
+                'observed_min': sketch.min,
+                'observed_max': sketch.max,
+                # Estimated from the sketch (relative error <= relative_accuracy)
+                'clip_low': sketch.fraction_below(lo),
+                'clip_high': 1.0 - sketch.fraction_below(np.nextafter(hi, np.inf)),
+            }
+            if reference:
+                entry['previous'] = {
+                    'min': reference['min'],
+                    'max': reference['max'],
+                    'clip_low': self.clip_low[name] / count if count else 0.0,
+                    'clip_high': self.clip_high[name] / count if count else 0.0,
+                }
+            results[name] = entry
+        return results
+
+
+def accumulate(files: List[str], window_size: int = Config.WINDOW_SIZE,
+               reference_stats: Optional[Dict] = None, workers: Optional[int] = None,
+               relative_accuracy: float = RELATIVE_ACCURACY, verbose: bool = True,
+               feature_names: Optional[List[str]] = None, last_step: bool = False) -> NormStatsAccumulator:
+    """Stream all files through fit_partial (in parallel when workers > 1) and merge"""
+    reference_stats = Config.NORM_STATS if reference_stats is None else reference_stats
+    workers = workers or os.cpu_count() or 1
+    acc = NormStatsAccumulator(relative_accuracy)
+    args = (window_size, reference_stats, relative_accuracy, feature_names, last_step)
+
+    def report(done):
+        if verbose and (done % 100 == 0 or done == len(files)):
+            print(f"  {done}/{len(files)} files, {acc.num_windows:,} windows")
+
+    if workers <= 1 or len(files) <= 1:
+        for path in files:
+            acc.add(fit_partial(path, *args))
+            report(acc.num_files)
+        return acc
+
+    chunksize = max(1, len(files) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(fit_partial, files, *([a] * len(files) for a in args), chunksize=chunksize)
+        for partial in partials:
+            acc.add(partial)
+            report(acc.num_files)
+    return acc
+
+
+def write_norm_stats(path, features: Dict[str, Dict], source: Dict, window_size: int,
+                     lower: float = LOWER_QUANTILE, upper: float = UPPER_QUANTILE,
+                     relative_accuracy: float = RELATIVE_ACCURACY):
+    """Write the versioned stats file read by config.load_norm_stats"""
+    payload = {
+        'version': NORM_STATS_FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'window_size': window_size,
+        'quantiles': [lower, upper],
+        'relative_accuracy': relative_accuracy,
+        'source': source,
+        'features': features,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+def print_fit(features: Dict[str, Dict]):
+    print(f"\n{'Feature':<22} {'min':>12} {'max':>12}  {'clip now':>9}  {'clip fitted':>11}  method")
+    print("-" * 82)
+    for name, entry in features.items():
+        prev = entry.get('previous')
+        now = f"{(prev['clip_low'] + prev['clip_high']) * 100:8.3f}%" if prev else f"{'-':>9}"
+        fitted = (entry['clip_low'] + entry['clip_high']) * 100
+        print(f"{name:<22} {entry['min']:>12.4g} {entry['max']:>12.4g}  {now}  {fitted:10.3f}%  {entry['method']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit NORM_STATS from training traces')
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--datasets', default=None, help='Comma-separated datasets (default: Config.DATASETS)')
+    parser.add_argument('--all-files', action='store_true',
+                        help='Use every file instead of only the training split')
+    parser.add_argument('--out', default=None, help='Output file (default: <data_dir>/norm_stats.json)')
+    parser.add_argument('--lower', type=float, default=LOWER_QUANTILE * 100, help='Lower percentile')
+    parser.add_argument('--upper', type=float, default=UPPER_QUANTILE * 100, help='Upper percentile')
+    parser.add_argument('--keep', default='', help='Comma-separated features that keep the current bounds')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all CPUs)')
+    args = parser.parse_args()
+
+    config = config_from_dict(data_overrides(args.data_dir, args.datasets))
+
+    from dataset import split_files
+    train_files, val_files, test_files = split_files(config)
+    files = train_files + val_files + test_files if args.all_files else train_files
+    if not files:
+        print(f"No pickle files found in {config.DATA_DIR}")
+        return 1
+
+    lower, upper = args.lower / 100, args.upper / 100
+    print(f"Fitting p{args.lower:g}/p{args.upper:g} bounds over {len(files)} files "
+          f"(window={config.WINDOW_SIZE})")
+    start = time.perf_counter()
+    feature_names = [name for name in feature_layout(config) if name is not None]
+    acc = accumulate(files, config.WINDOW_SIZE, config.NORM_STATS, workers=args.workers,
+                     feature_names=feature_names)
+    keep = [k for k in args.keep.split(',') if k]
+    features = acc.fit(config.NORM_STATS, lower, upper, keep)
+    elapsed = time.perf_counter() - start
+
+    print_fit(features)
+    out = Path(args.out) if args.out else Path(config.DATA_DIR) / 'norm_stats.json'
+    source = {
+        'data_dir': str(config.DATA_DIR),
+        'datasets': list(config.DATASETS),
+        'split': 'all' if args.all_files else 'train',
+        'seed': config.SEED,
+        'num_files': acc.num_files,
+        'num_windows': acc.num_windows,
+    }
+    write_norm_stats(out, features, source, config.WINDOW_SIZE, lower, upper)
+    print(f"\nFitted {len(features)} features from {acc.num_windows:,} windows in {elapsed:.1f}s")
+    print(f"Written to {out}  (set Config.NORM_STATS_FILE to use it)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""
+Lightweight inference artifact for BC-GCC
+
+An artifact is a directory with two files:
+    model.safetensors  - model tensors only (safetensors layout, mmap-able)
+    model_spec.json    - model architecture + feature/normalization spec
+
+Unlike training checkpoints it carries no optimizer moments and no pickled
+Config class, so it loads without unpickling and without the training code's
+state. The tensor file follows the safetensors layout (8-byte little-endian
+header length, JSON header, raw little-endian data) and can be read by the
+`safetensors` package as well.
+
+Usage:
+    python3 inference.py export [checkpoints/best.pt] [models/bcgcc_lstm]
+    python3 inference.py info [models/bcgcc_lstm]
+"""
+import json
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+
+from config import Config, config_to_dict, config_from_dict
+from model import GCCBC_LSTM
+
+
+ARTIFACT_FORMAT_VERSION = 1
+WEIGHTS_FILE = 'model.safetensors'
+SPEC_FILE = 'model_spec.json'
+
+# Settings needed to rebuild the model and its input/output transforms
+SPEC_KEYS = [
+    'CORE_FEATURES', 'RESERVED_FEATURES', 'TOTAL_FEATURE_DIM', 'WINDOW_SIZE',
+    'TARGET', 'NORM_STATS', 'USE_CLIPPING',
+    'LSTM_HIDDEN_SIZE', 'LSTM_NUM_LAYERS', 'DROPOUT', 'FC_HIDDEN_SIZES',
+]
+
+_DTYPE_TO_ST = {
+    torch.float32: 'F32',
+    torch.float16: 'F16',
+    torch.float64: 'F64',
+    torch.int64: 'I64',
+    torch.int32: 'I32',
+}
+_ST_TO_NUMPY = {
+    'F32': np.float32,
+    'F16': np.float16,
+    'F64': np.float64,
+    'I64': np.int64,
+    'I32': np.int32,
+}
+
+
+def save_safetensors(tensors: Dict[str, torch.Tensor], path, metadata: Dict[str, str] = None):
+    """Write tensors in safetensors layout (data offsets aligned to 8 bytes)"""
+    header = {}
+    chunks = []
+    offset = 0
+    for name, tensor in tensors.items():
+        tensor = tensor.detach().cpu().contiguous()
+        if tensor.dtype not in _DTYPE_TO_ST:
+            raise ValueError(f"Unsupported dtype for {name}: {tensor.dtype}")
+        data = tensor.numpy().astype(tensor.numpy().dtype.newbyteorder('<'), copy=False).tobytes()
+        header[name] = {
+            'dtype': _DTYPE_TO_ST[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + len(data)],
+        }
+        chunks.append(data)
+        offset += len(data)
+    if metadata:
+        header['__metadata__'] = {k: str(v) for k, v in metadata.items()}
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-len(header_bytes) % 8)  # Align tensor data
+
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for data in chunks:
+            f.write(data)
+
+
+def load_safetensors(path, mmap: bool = True) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    Read a safetensors file
+
+    With mmap=True tensors are views on a copy-on-write memory map, so pages
+    are only read from disk when touched and are shared between processes.
+    """
+    with open(path, 'rb') as f:
+        header_len = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    data_start = 8 + header_len
+
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='c')
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+
+    metadata = header.pop('__metadata__', {})
+    tensors = {}
+    for name, info in header.items():
+        start, end = info['data_offsets']
+        array = buffer[data_start + start:data_start + end].view(_ST_TO_NUMPY[info['dtype']])
+        tensors[name] = torch.from_numpy(array.reshape(info['shape']))
+    return tensors, metadata
+
+
+def export_inference_artifact(model_state_dict: Dict[str, torch.Tensor], config, out_dir) -> Path:
+    """
+    Export model weights + spec as an inference artifact
+
+    Args:
+        model_state_dict: GCCBC_LSTM state dict
+        config: Config class/instance or plain dict the model was trained with
+        out_dir: Output directory
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    values = config if isinstance(config, dict) else config_to_dict(config)
+    spec = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model': 'GCCBC_LSTM',
+        'config': {key: values[key] for key in SPEC_KEYS if key in values},
+    }
+
+    save_safetensors(model_state_dict, out_dir / WEIGHTS_FILE,
+                     metadata={'format_version': ARTIFACT_FORMAT_VERSION})
+    with open(out_dir / SPEC_FILE, 'w') as f:
+        json.dump(spec, f, indent=2)
+
+    return out_dir
+
+
+def export_from_checkpoint(checkpoint_path, out_dir) -> Path:
+    """Convert a training checkpoint (best.pt / latest.pt) into an inference artifact"""
+    from checkpoint import load_checkpoint_file
+
+    checkpoint = load_checkpoint_file(checkpoint_path, map_location='cpu')
+    config = checkpoint.get('config', Config)
+    return export_inference_artifact(checkpoint['model_state_dict'], config, out_dir)
+
+
+def load_inference_config(artifact_dir):
+    """Build a Config class from an artifact's model_spec.json"""
+    with open(Path(artifact_dir) / SPEC_FILE) as f:
+        spec = json.load(f)
+    if spec.get('format_version', 0) > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {spec['format_version']}")
+    return config_from_dict(spec['config'])
+
+
+def load_inference_model(artifact_dir, device='cpu', mmap: bool = True):
+    """
+    Build GCCBC_LSTM from an inference artifact
+
+    Returns:
+        model (in eval mode), config class
+    """
+    artifact_dir = Path(artifact_dir)
+    config = load_inference_config(artifact_dir)
+    state_dict, _ = load_safetensors(artifact_dir / WEIGHTS_FILE, mmap=mmap)
+
+    device = torch.device(device)
+    if device.type == 'cpu':
+        # Skip random weight init: build on the meta device and adopt the
+        # (memory-mapped) tensors directly
+        try:
+            with torch.device('meta'):
+                model = GCCBC_LSTM(config)
+            model.load_state_dict(state_dict, assign=True)
+        except (TypeError, RuntimeError):  # torch < 2.1 has no assign=
+            model = GCCBC_LSTM(config)
+            model.load_state_dict(state_dict)
+    else:
+        model = GCCBC_LSTM(config)
+        model.load_state_dict(state_dict)
+        model = model.to(device)
+
+    model.eval()
+    return model, config
+
+
+def load_model(path, device='cpu'):
+    """
+    Load GCCBC_LSTM from an inference artifact directory or a training checkpoint
+
+    Returns:
+        model (in eval mode), config class
+    """
+    path = Path(path)
+    if path.is_dir():
+        return load_inference_model(path, device=device)
+
+    from checkpoint import load_checkpoint_file
+
+    checkpoint = load_checkpoint_file(path, map_location='cpu')
+    config = checkpoint.get('config', Config)
+    if isinstance(config, dict):
+        config = config_from_dict(config)
+    model = GCCBC_LSTM(config)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model = model.to(device)
+    model.eval()
+    return model, config
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'export'
+
+    if command == 'export':
+        checkpoint_path = Path(sys.argv[2] if len(sys.argv) > 2 else Path(Config.CHECKPOINT_DIR) / 'best.pt')
+        out_dir = Path(sys.argv[3] if len(sys.argv) > 3 else Config.PROJECT_ROOT / 'models' / 'bcgcc_lstm')
+
+        export_from_checkpoint(checkpoint_path, out_dir)
+        artifact_size = sum(p.stat().st_size for p in out_dir.iterdir() if p.is_file())
+        checkpoint_size = checkpoint_path.stat().st_size
+        print(f"Exported {checkpoint_path} -> {out_dir}")
+        print(f"  Checkpoint size: {checkpoint_size / 1024**2:.2f} MB")
+        print(f"  Artifact size:   {artifact_size / 1024**2:.2f} MB "
+              f"({checkpoint_size / max(artifact_size, 1):.1f}x smaller)")
+
+    elif command == 'info':
+        artifact_dir = Path(sys.argv[2] if len(sys.argv) > 2 else Config.PROJECT_ROOT / 'models' / 'bcgcc_lstm')
+        start = time.perf_counter()
+        model, config = load_inference_model(artifact_dir)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Artifact: {artifact_dir}")
+        print(f"  Parameters: {model.count_parameters():,}")
+        print(f"  LSTM: {config.LSTM_NUM_LAYERS} layers x {config.LSTM_HIDDEN_SIZE} hidden")
+        print(f"  Input: [{config.WINDOW_SIZE}, {config.TOTAL_FEATURE_DIM}]")
+        print(f"  Load time: {elapsed_ms:.1f} ms")
+
+    else:
+        print(f"Unknown command: {command}")
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
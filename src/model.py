@@ -108,7 +108,9 @@ class GCCBC_LSTM(nn.Module):
             bandwidth prediction in bps
         """
         self.eval()
-        with torch.no_grad():
+        # bf16 autocast on CPU when enabled in the config (outputs are returned as fp32)
+        use_bf16 = getattr(self.config, 'USE_BF16_CPU', False) and x.device.type == 'cpu'
+        with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=use_bf16):
             # Handle single sample
             if x.dim() == 2:
                 x = x.unsqueeze(0)  # [1, seq_len, feature_dim]
@@ -118,6 +120,10 @@ class GCCBC_LSTM(nn.Module):
             # Denormalize if needed
             # (Assuming output is already in bps scale)
             
+            if use_bf16:
+                output = output.float()
+                hidden = tuple(h.float() for h in hidden)
+            
             return output.squeeze(), hidden
     
     def get_core_feature_mask(self):
@@ -142,16 +148,17 @@ class WeightedMSELoss(nn.Module):
     def __init__(self):
         super(WeightedMSELoss, self).__init__()
     
-    def forward(self, pred, target, weight):
+    def forward(self, pred, target, weight, reduce=True):
         """
         Args:
             pred: [batch, 1]
             target: [batch, 1]
             weight: [batch, 1]
+            reduce: False returns the per-sample losses [batch, 1]
         """
         mse = (pred - target) ** 2
         weighted_mse = mse * weight
-        return weighted_mse.mean()
+        return weighted_mse.mean() if reduce else weighted_mse
 
 
 class WeightedMAPELoss(nn.Module):
@@ -161,17 +168,18 @@ class WeightedMAPELoss(nn.Module):
         super(WeightedMAPELoss, self).__init__()
         self.epsilon = epsilon
     
-    def forward(self, pred, target, weight):
+    def forward(self, pred, target, weight, reduce=True):
         """
         Args:
             pred: [batch, 1]
             target: [batch, 1]
             weight: [batch, 1]
+            reduce: False returns the per-sample losses [batch, 1]
         """
         # Avoid division by zero
         mape = torch.abs((target - pred) / (target + self.epsilon))
         weighted_mape = mape * weight
-        return weighted_mape.mean()
+        return weighted_mape.mean() if reduce else weighted_mape
 
 
 class CombinedLoss(nn.Module):
@@ -184,9 +192,9 @@ class CombinedLoss(nn.Module):
         self.mse_loss = WeightedMSELoss()
         self.mape_loss = WeightedMAPELoss()
     
-    def forward(self, pred, target, weight):
-        mse = self.mse_loss(pred, target, weight)
-        mape = self.mape_loss(pred, target, weight)
+    def forward(self, pred, target, weight, reduce=True):
+        mse = self.mse_loss(pred, target, weight, reduce)
+        mape = self.mape_loss(pred, target, weight, reduce)
         return self.mse_weight * mse + self.mape_weight * mape
 
 
@@ -4,20 +4,32 @@ Data Preprocessing Script for BC-GCC
 This script preprocesses all pickle files into PyTorch tensor files for faster training.
 Run this once before training to achieve 10-15x speedup.
 
+With --per-trace the splits are stored window-independent instead: the raw
+step columns of every trace (*_traces.pt), from which TraceWindowDataset
+serves windows of any WINDOW_SIZE. One run then covers a whole window-size
+sweep, and the files are ~WINDOW_SIZE * feature_dim / num_columns times smaller.
+
 Usage:
     python3 prepare_data.py
+    python3 prepare_data.py --per-trace
 """
+import argparse
+import os
 import torch
 from torch.utils.data import TensorDataset
 from pathlib import Path
 import time
+from typing import Dict, List, Optional
+import numpy as np
 from tqdm import tqdm
 
 from config import Config
-from dataset import create_dataloaders
+from dataset import TRACE_SPLIT_FORMAT, create_dataloaders, split_files
+from features import REGISTRY, feature_layout, required_columns
+from trace_store import load_trace
 
 
-def prepare_split(dataloader, split_name: str, save_path: Path):
+def prepare_split(dataloader, split_name: str, save_path: Path, config):
     """
     Prepare data for one split (train/val/test)
     
@@ -25,6 +37,7 @@ def prepare_split(dataloader, split_name: str, save_path: Path):
         dataloader: PyTorch DataLoader
         split_name: 'train', 'val', or 'test'
         save_path: Path to save the processed tensors
+        config: Config the windows were built with (its feature layout is stored)
     """
     print(f"\n{'='*80}")
     print(f"Processing {split_name} split...")
@@ -57,6 +70,8 @@ def prepare_split(dataloader, split_name: str, save_path: Path):
         'targets': targets_tensor,
         'weights': weights_tensor,
         'num_samples': total_samples,
+        'window_size': features_tensor.shape[1] if total_samples else None,
+        'feature_layout': feature_layout(config),
     }
     
     # Print statistics
@@ -85,8 +100,100 @@ def prepare_split(dataloader, split_name: str, save_path: Path):
     return data_dict
 
 
+def trace_split_columns() -> List[str]:
+    """Columns stored per trace: everything any registered feature reads, plus targets/weights"""
+    features = [name for name, feature in REGISTRY.items() if not feature.intermediate]
+    columns = required_columns(features)
+    for name in ['delay', 'loss_ratio', 'bandwidth_prediction']:
+        if name not in columns:
+            columns.append(name)
+    return columns
+
+
+def build_trace_split(files: List[str], split_name: str, columns: Optional[List[str]] = None) -> Dict:
+    """
+    Load the raw step columns of traces into the per-trace split payload
+    
+    Args:
+        files: Trace pickle paths
+        split_name: Progress bar label
+        columns: Columns to keep (default: trace_split_columns())
+    """
+    columns = trace_split_columns() if columns is None else list(columns)
+    values = {name: [] for name in columns}
+    kept, lengths = [], []
+    for path in tqdm(files, desc=f'{split_name} traces'):
+        try:
+            data = load_trace(path, columns=columns)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            continue
+        kept.append(os.path.abspath(path))
+        lengths.append(len(data['delay']))
+        for name in columns:
+            values[name].append(np.asarray(data[name], dtype=np.float64))
+    
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    return {
+        'format': TRACE_SPLIT_FORMAT,
+        'files': kept,
+        'offsets': torch.from_numpy(offsets),
+        'lengths': torch.from_numpy(lengths),
+        'columns': {name: torch.from_numpy(np.concatenate(arrays) if arrays else np.zeros(0))
+                    for name, arrays in values.items()},
+    }
+
+
+def prepare_trace_split(files: List[str], split_name: str, save_path: Path):
+    """
+    Store the raw step columns of one split's traces (window-size independent)
+    
+    Args:
+        files: Trace pickle paths of the split
+        split_name: 'train', 'val', or 'test'
+        save_path: Output *_traces.pt path
+    """
+    data_dict = build_trace_split(files, split_name)
+    kept, lengths, columns = data_dict['files'], data_dict['lengths'].numpy(), data_dict['columns']
+    torch.save(data_dict, save_path)
+    
+    file_size_mb = save_path.stat().st_size / (1024**2)
+    print(f"{split_name}: {len(kept)} traces, {int(lengths.sum()):,} steps, "
+          f"{len(columns)} columns -> {save_path} ({file_size_mb:.2f} MB)")
+    return data_dict
+
+
+def main_per_trace(config):
+    """Window-independent preprocessing (prepare_data.py --per-trace)"""
+    processed_dir = Path(config.DATA_DIR) / 'processed'
+    processed_dir.mkdir(exist_ok=True, parents=True)
+    print(f"Output directory: {processed_dir}")
+    
+    start_time = time.time()
+    train_files, val_files, test_files = split_files(config)
+    for split_name, files in [('train', train_files), ('val', val_files), ('test', test_files)]:
+        prepare_trace_split(files, split_name, processed_dir / f'{split_name}_traces.pt')
+    
+    elapsed_time = time.time() - start_time
+    print(f"\nTotal time: {elapsed_time:.2f} seconds")
+    print("Training serves windows of any WINDOW_SIZE from these files (TraceWindowDataset).")
+
+
 def main():
     """Main preprocessing function"""
+    parser = argparse.ArgumentParser(description='Preprocess BC-GCC training data')
+    parser.add_argument('--per-trace', action='store_true',
+                        help='Store window-independent per-trace columns instead of fixed windows')
+    args = parser.parse_args()
+    
+    if args.per_trace:
+        print("="*80)
+        print("BC-GCC Data Preprocessing (per-trace, any window size)")
+        print("="*80)
+        main_per_trace(Config())
+        return
+    
     print("="*80)
     print("BC-GCC Data Preprocessing")
     print("="*80)
@@ -119,9 +226,9 @@ def main():
     val_path = processed_dir / 'val_tensors.pt'
     test_path = processed_dir / 'test_tensors.pt'
     
-    train_data = prepare_split(train_loader, 'train', train_path)
-    val_data = prepare_split(val_loader, 'val', val_path)
-    test_data = prepare_split(test_loader, 'test', test_path)
+    train_data = prepare_split(train_loader, 'train', train_path, config)
+    val_data = prepare_split(val_loader, 'val', val_path, config)
+    test_data = prepare_split(test_loader, 'test', test_path, config)
     
     # Calculate total time
     elapsed_time = time.time() - start_time
@@ -0,0 +1,163 @@
+"""
+Opt-in training instrumentation for BC-GCC
+
+StageTimer measures wall-clock time spent in each stage of a training step
+(data loading, host-to-device copy, normalisation, forward, backward,
+optimizer) plus sample throughput. When disabled every hook is a no-op.
+"""
+import contextlib
+import time
+from pathlib import Path
+from typing import Dict, Iterable
+
+import torch
+
+
+class _StageContext:
+    """Times one stage, synchronizing CUDA so async kernels are attributed correctly"""
+
+    __slots__ = ('timer', 'name', 'record', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.record = torch.profiler.record_function(name) if timer.label_stages else None
+
+    def __enter__(self):
+        self.timer._synchronize()
+        if self.record is not None:
+            self.record.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer._synchronize()
+        self.timer.totals[self.name] = self.timer.totals.get(self.name, 0.0) + time.perf_counter() - self.start
+        if self.record is not None:
+            self.record.__exit__(*exc)
+        return False
+
+
+class StageTimer:
+    """Per-stage wall-clock timers and samples/s for one training epoch"""
+
+    STAGES = ['data', 'h2d', 'normalize', 'forward', 'backward', 'optimizer']
+
+    def __init__(self, enabled: bool, device: torch.device, label_stages: bool = False):
+        """
+        Args:
+            enabled: Collect timings (otherwise all hooks are no-ops)
+            device: Training device (CUDA is synchronized at stage boundaries)
+            label_stages: Emit torch.profiler record_function ranges per stage
+        """
+        self.enabled = enabled
+        self.label_stages = label_stages
+        self.cuda = device.type == 'cuda'
+        self._null = contextlib.nullcontext()
+        self.start_epoch()
+
+    def start_epoch(self):
+        self.totals: Dict[str, float] = {}
+        self.num_batches = 0
+        self.num_samples = 0
+        self.epoch_start = time.perf_counter()
+        self.epoch_time = 0.0
+
+    def end_epoch(self):
+        self.epoch_time = time.perf_counter() - self.epoch_start
+
+    def stage(self, name: str):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return self._null
+        return _StageContext(self, name)
+
+    def iterate(self, loader: Iterable):
+        """Wrap a DataLoader so time spent waiting for batches is recorded as 'data'"""
+        if not self.enabled:
+            yield from loader
+            return
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.totals['data'] = self.totals.get('data', 0.0) + time.perf_counter() - start
+            yield batch
+
+    def count(self, batch_size: int):
+        self.num_batches += 1
+        self.num_samples += batch_size
+
+    def summary(self) -> Dict[str, float]:
+        """Return per-stage totals (s), per-batch times (ms), fractions and samples/s"""
+        epoch_time = self.epoch_time or (time.perf_counter() - self.epoch_start)
+        batches = max(self.num_batches, 1)
+        stats = {
+            'epoch_time_s': epoch_time,
+            'samples_per_sec': self.num_samples / epoch_time if epoch_time > 0 else 0.0,
+        }
+        stage_names = self.STAGES + [s for s in self.totals if s not in self.STAGES]
+        for name in stage_names:
+            total = self.totals.get(name, 0.0)
+            stats[f'{name}_s'] = total
+            stats[f'{name}_ms_per_batch'] = total / batches * 1000
+            stats[f'{name}_fraction'] = total / epoch_time if epoch_time > 0 else 0.0
+        other = epoch_time - sum(self.totals.values())
+        stats['other_s'] = max(other, 0.0)
+        stats['other_fraction'] = max(other, 0.0) / epoch_time if epoch_time > 0 else 0.0
+        return stats
+
+    def log_to_tensorboard(self, writer, epoch: int):
+        if not self.enabled:
+            return
+        stats = self.summary()
+        writer.add_scalar('profile/samples_per_sec', stats['samples_per_sec'], epoch)
+        writer.add_scalar('profile/epoch_time_s', stats['epoch_time_s'], epoch)
+        for name in self.STAGES + ['other']:
+            writer.add_scalar(f'profile/{name}_fraction', stats[f'{name}_fraction'], epoch)
+            if f'{name}_ms_per_batch' in stats:
+                writer.add_scalar(f'profile/{name}_ms_per_batch', stats[f'{name}_ms_per_batch'], epoch)
+
+    def print_summary(self):
+        if not self.enabled:
+            return
+        stats = self.summary()
+        print(f"\n  Stage breakdown ({self.num_batches} batches, "
+              f"{stats['samples_per_sec']:,.0f} samples/s):")
+        for name in self.STAGES + ['other']:
+            per_batch = stats.get(f'{name}_ms_per_batch')
+            per_batch_str = f"{per_batch:8.2f} ms/batch" if per_batch is not None else " " * 17
+            print(f"    {name:<10} {stats[f'{name}_s']:8.2f} s  {per_batch_str}  "
+                  f"{stats[f'{name}_fraction']*100:5.1f}%")
+
+    def _synchronize(self):
+        if self.cuda:
+            torch.cuda.synchronize()
+
+
+def build_torch_profiler(config, device: torch.device):
+    """
+    Create a torch.profiler session that exports traces to LOG_DIR/profiler
+
+    Returns None when PROFILE_TORCH is disabled. Call .step() once per batch.
+    """
+    if not getattr(config, 'PROFILE_TORCH', False):
+        return None
+
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device.type == 'cuda':
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    trace_dir = Path(config.LOG_DIR) / 'profiler'
+    trace_dir.mkdir(parents=True, exist_ok=True)
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(**config.PROFILE_SCHEDULE),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(str(trace_dir)),
+        record_shapes=True,
+        with_stack=False,
+    )
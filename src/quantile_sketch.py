@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming quantile / histogram sketch
+
+QuantileSketch maps every value to a logarithmic bucket
+(index = ceil(log_gamma |x|), gamma = (1 + a) / (1 - a)), in the style of
+DDSketch. Any quantile is returned with relative error <= a, memory is
+bounded by max_bins per sign, and two sketches built with the same accuracy
+merge exactly by adding bucket counts, so per-file sketches combine into
+dataset and corpus views without touching the raw values again.
+
+Values are added in bulk with NumPy (one log + unique per call).
+"""
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch with bounded memory"""
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        """
+        Args:
+            relative_accuracy: Relative error bound `a` of returned quantiles
+            max_bins: Max buckets per sign; beyond that the smallest magnitudes are collapsed
+            min_value: Magnitudes below this are counted as zero
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        self.positive = {}   # bucket index -> count
+        self.negative = {}   # bucket index of |x| -> count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # --- Building ---
+
+    def add(self, values):
+        """Add a scalar or array of values (NaNs are ignored)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        magnitude = np.abs(values)
+        is_zero = magnitude < self.min_value
+        self.zero_count += int(is_zero.sum())
+
+        self._add_to_store(self.positive, values[(values > 0) & ~is_zero])
+        self._add_to_store(self.negative, -values[(values < 0) & ~is_zero])
+        return self
+
+    def _add_to_store(self, store, magnitudes):
+        if magnitudes.size == 0:
+            return
+        indices = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+        unique, counts = np.unique(indices, return_counts=True)
+        for idx, cnt in zip(unique.tolist(), counts.tolist()):
+            store[idx] = store.get(idx, 0) + cnt
+        self._collapse(store)
+
+    def _collapse(self, store):
+        """Fold the smallest-magnitude buckets together to respect max_bins"""
+        if len(store) <= self.max_bins:
+            return
+        keys = sorted(store)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        target = excess[-1]
+        store[target] = sum(store.pop(k) for k in excess[:-1]) + store[target]
+
+    def merge(self, other):
+        """Merge another sketch (same relative accuracy) into this one"""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.count == 0:
+            return self
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for idx, cnt in theirs.items():
+                mine[idx] = mine.get(idx, 0) + cnt
+            self._collapse(mine)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, sketches):
+        """Return a new sketch combining all given sketches"""
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        first = sketches[0]
+        result = cls(first.relative_accuracy, first.max_bins, first.min_value)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    # --- Queries ---
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+    def _bucket_value(self, idx):
+        # Midpoint (in relative terms) of bucket (gamma^(idx-1), gamma^idx]
+        return 2 * self.gamma ** idx / (self.gamma + 1)
+
+    def _sorted_buckets(self):
+        """(representative value, count) pairs in ascending value order"""
+        buckets = [(-self._bucket_value(i), self.negative[i]) for i in sorted(self.negative, reverse=True)]
+        if self.zero_count:
+            buckets.append((0.0, self.zero_count))
+        buckets.extend((self._bucket_value(i), self.positive[i]) for i in sorted(self.positive))
+        return buckets
+
+    def quantiles(self, qs):
+        """Quantiles for q in [0, 1] (relative error <= relative_accuracy)"""
+        if self.count == 0:
+            return [math.nan for _ in qs]
+        buckets = self._sorted_buckets()
+        values = np.array([v for v, _ in buckets])
+        cumulative = np.cumsum([c for _, c in buckets])
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.min)
+                continue
+            if q >= 1:
+                results.append(self.max)
+                continue
+            rank = q * (self.count - 1)
+            i = int(np.searchsorted(cumulative, rank, side='right'))
+            value = values[min(i, len(values) - 1)]
+            results.append(float(min(max(value, self.min), self.max)))
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def percentile(self, p):
+        """Same convention as np.percentile (p in [0, 100])"""
+        return self.quantile(p / 100)
+
+    def fraction_below(self, x):
+        """Approximate fraction of values < x"""
+        if self.count == 0:
+            return math.nan
+        below = sum(c for v, c in self._sorted_buckets() if v < x)
+        return below / self.count
+
+    def bucket_boundary(self, x):
+        """
+        Upper boundary of the bucket holding x: every value of that bucket and
+        below is < it, every value of higher buckets >= it, so fraction_below
+        is exact there
+        """
+        magnitude = abs(x)
+        if magnitude < self.min_value:
+            return self.min_value
+        idx = math.ceil(math.log(magnitude) / self.log_gamma)
+        if x > 0:
+            return float(np.nextafter(self.gamma ** idx, np.inf))
+        return -self.gamma ** (idx - 1)
+
+    def histogram(self, edges):
+        """Approximate counts per [edges[i], edges[i+1]) bin"""
+        edges = np.asarray(edges, dtype=np.float64)
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for value, cnt in self._sorted_buckets():
+            i = np.searchsorted(edges, value, side='right') - 1
+            if 0 <= i < len(counts):
+                counts[i] += cnt
+            elif value == edges[-1]:
+                counts[-1] += cnt
+        return counts
+
+    def num_bins(self):
+        return len(self.positive) + len(self.negative) + (1 if self.zero_count else 0)
+
+    # --- Serialization ---
+
+    def to_dict(self):
+        """Compact JSON-serializable representation"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'max_bins': self.max_bins,
+            'min_value': self.min_value,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'zero': self.zero_count,
+            'pos': [list(self.positive.keys()), list(self.positive.values())],
+            'neg': [list(self.negative.keys()), list(self.negative.values())],
+        }
+
+    @classmethod
+    def from_dict(cls, payload):
+        sketch = cls(payload['relative_accuracy'], payload['max_bins'], payload['min_value'])
+        sketch.count = payload['count']
+        sketch.sum = payload['sum']
+        sketch.min = payload['min'] if payload['min'] is not None else math.inf
+        sketch.max = payload['max'] if payload['max'] is not None else -math.inf
+        sketch.zero_count = payload['zero']
+        sketch.positive = dict(zip(*payload['pos']))
+        sketch.negative = dict(zip(*payload['neg']))
+        return sketch
+
+    def __repr__(self):
+        return (f"QuantileSketch(count={self.count}, bins={self.num_bins()}, "
+                f"relative_accuracy={self.relative_accuracy})")
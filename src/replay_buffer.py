@@ -0,0 +1,300 @@
+"""
+Preallocated replay buffer with prioritized sampling for RL fine-tuning
+
+Transitions are stored in fixed-size NumPy arrays (a ring over `capacity`
+slots), optionally backed by memory-mapped files so buffers larger than RAM
+persist across runs:
+
+    states / next_states  [capacity, WINDOW_SIZE, TOTAL_FEATURE_DIM] float32
+    actions               [capacity, action_dim] float32
+    rewards, dones        [capacity] float32 / bool
+
+Inserts and samples are batched; nothing loops over transitions in Python.
+Prioritized sampling (Schaul et al., proportional variant) uses array-backed
+sum / min segment trees: a batch of priority updates refreshes the touched
+leaves and then one vectorized pass per tree level, and a batch of samples
+descends all prefix sums through the levels together, so both are
+O(batch * log capacity).
+
+Usage:
+    buffer = ReplayBuffer(1_000_000)                         # in RAM
+    buffer = ReplayBuffer(1_000_000, path='data/replay')     # memory-mapped
+    buffer.add(states, actions, rewards, next_states, dones)
+    batch = buffer.sample(256)                               # batch['weights'], batch['indices']
+    buffer.update_priorities(batch['indices'], td_errors)
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from config import Config
+
+
+REPLAY_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+
+class SegmentTree:
+    """Complete binary tree over a power-of-two number of leaves, reduced with `op`"""
+
+    def __init__(self, capacity: int, op=np.add, neutral: float = 0.0):
+        self.size = 1 << max(int(capacity) - 1, 0).bit_length()
+        self.op = op
+        self.neutral = neutral
+        self.tree = np.full(2 * self.size, neutral, dtype=np.float64)  # tree[1] is the root
+
+    def update(self, indices, values):
+        """Set leaves `indices` to `values` and refresh their ancestors"""
+        nodes = np.asarray(indices, dtype=np.int64).reshape(-1) + self.size
+        if nodes.size == 0:
+            return
+        self.tree[nodes] = values
+        nodes = np.sort(nodes)
+        while nodes[0] > 1:
+            # Parents of sorted nodes stay sorted: drop adjacent duplicates
+            nodes >>= 1
+            nodes = nodes[np.concatenate(([True], nodes[1:] != nodes[:-1]))]
+            self.tree[nodes] = self.op(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+
+    def __getitem__(self, indices):
+        return self.tree[np.asarray(indices, dtype=np.int64) + self.size]
+
+    def reduce(self) -> float:
+        return float(self.tree[1])
+
+
+class SumTree(SegmentTree):
+    """Sum tree with batched prefix-sum search"""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity, np.add, 0.0)
+
+    def find(self, prefix_sums) -> np.ndarray:
+        """Leaf index i per value s with sum(leaves[:i]) <= s < sum(leaves[:i+1])"""
+        s = np.array(prefix_sums, dtype=np.float64)
+        nodes = np.ones(len(s), dtype=np.int64)
+        while nodes[0] < self.size:  # All nodes descend one level per iteration
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = s >= left_sum
+            s -= np.where(go_right, left_sum, 0.0)
+            nodes = left + go_right
+        return nodes - self.size
+
+
+class ReplayBuffer:
+    """Ring buffer of (state, action, reward, next_state, done) with prioritized sampling"""
+
+    def __init__(self, capacity: int = Config.REPLAY_CAPACITY,
+                 window_size: int = Config.WINDOW_SIZE,
+                 feature_dim: int = Config.TOTAL_FEATURE_DIM,
+                 action_dim: int = 1,
+                 alpha: float = Config.PER_ALPHA,
+                 eps: float = Config.PER_EPSILON,
+                 path=None, seed: Optional[int] = None):
+        """
+        Args:
+            capacity: Max transitions (oldest are overwritten)
+            window_size, feature_dim: State shape
+            action_dim: Action width (1 = bandwidth prediction)
+            alpha: Priority exponent (0 = uniform sampling)
+            eps: Added to |td_error| so no transition gets zero priority
+            path: Directory for memory-mapped arrays (None = in RAM). An existing
+                  buffer in `path` with the same shapes is reopened.
+            seed: RNG seed for sampling
+        """
+        self.capacity = int(capacity)
+        self.window_size = window_size
+        self.feature_dim = feature_dim
+        self.action_dim = action_dim
+        self.alpha = alpha
+        self.eps = eps
+        self.path = Path(path) if path is not None else None
+        self.rng = np.random.default_rng(seed)
+
+        self.pos = 0
+        self.size = 0
+        self.max_priority = 1.0
+
+        state_shape = (self.capacity, window_size, feature_dim)
+        specs = {
+            'states': (state_shape, np.float32),
+            'next_states': (state_shape, np.float32),
+            'actions': ((self.capacity, action_dim), np.float32),
+            'rewards': ((self.capacity,), np.float32),
+            'dones': ((self.capacity,), np.bool_),
+            'priorities': ((self.capacity,), np.float64),
+        }
+
+        meta = self._read_meta() if self.path is not None else None
+        self.arrays = {}
+        for name, (shape, dtype) in specs.items():
+            if self.path is None:
+                self.arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self.path.mkdir(parents=True, exist_ok=True)
+                mode = 'r+' if meta is not None else 'w+'
+                self.arrays[name] = np.memmap(self.path / f'{name}.bin', dtype=dtype, mode=mode, shape=shape)
+
+        self.sum_tree = SumTree(self.capacity)
+        self.min_tree = SegmentTree(self.capacity, np.minimum, np.inf)
+        if meta is not None:
+            self.pos, self.size, self.max_priority = meta['pos'], meta['size'], meta['max_priority']
+            if self.size:
+                self._set_tree(np.arange(self.size), self.arrays['priorities'][:self.size])
+
+    # --- Persistence ---
+
+    def _read_meta(self) -> Optional[Dict]:
+        meta_path = self.path / META_FILE
+        if not meta_path.exists():
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        expected = {
+            'version': REPLAY_FORMAT_VERSION,
+            'capacity': self.capacity,
+            'window_size': self.window_size,
+            'feature_dim': self.feature_dim,
+            'action_dim': self.action_dim,
+        }
+        mismatched = {k: (meta.get(k), v) for k, v in expected.items() if meta.get(k) != v}
+        if mismatched:
+            raise ValueError(f"Replay buffer in {self.path} does not match (found, expected): {mismatched}")
+        return meta
+
+    def flush(self):
+        """Write memory-mapped arrays and the ring position to disk"""
+        if self.path is None:
+            return
+        for array in self.arrays.values():
+            array.flush()
+        meta = {
+            'version': REPLAY_FORMAT_VERSION,
+            'capacity': self.capacity,
+            'window_size': self.window_size,
+            'feature_dim': self.feature_dim,
+            'action_dim': self.action_dim,
+            'pos': self.pos,
+            'size': self.size,
+            'max_priority': self.max_priority,
+        }
+        tmp = self.path / (META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self.path / META_FILE)
+
+    # --- Insert ---
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, actions, rewards, next_states, dones, priorities=None) -> np.ndarray:
+        """
+        Insert a batch of transitions (a single one is accepted without the batch axis)
+
+        Args:
+            priorities: Initial priorities (default: the max priority seen so far,
+                        so new transitions are sampled at least once soon)
+
+        Returns:
+            Slot indices the transitions were written to
+        """
+        states = np.asarray(states, dtype=np.float32)
+        if states.ndim == 2:
+            states = states[None]
+        n = len(states)
+        if n > self.capacity:  # Only the newest `capacity` survive anyway
+            keep = slice(n - self.capacity, None)
+            return self.add(states[keep], np.asarray(actions)[keep], np.asarray(rewards)[keep],
+                            np.asarray(next_states)[keep], np.asarray(dones)[keep],
+                            None if priorities is None else np.asarray(priorities)[keep])
+
+        values = {
+            'states': states,
+            'next_states': np.asarray(next_states, dtype=np.float32).reshape(states.shape),
+            'actions': np.asarray(actions, dtype=np.float32).reshape(n, self.action_dim),
+            'rewards': np.asarray(rewards, dtype=np.float32).reshape(n),
+            'dones': np.asarray(dones, dtype=np.bool_).reshape(n),
+        }
+        indices = (self.pos + np.arange(n)) % self.capacity
+        first = min(n, self.capacity - self.pos)
+        # Contiguous slice writes (two when wrapping) instead of fancy indexing
+        for dst, src in ((slice(self.pos, self.pos + first), slice(0, first)),
+                         (slice(0, n - first), slice(first, n))):
+            if src.stop > src.start:
+                for name, value in values.items():
+                    self.arrays[name][dst] = value[src]
+
+        if priorities is None:
+            self._set_tree(indices, np.full(n, self.max_priority))
+        else:
+            self.update_priorities(indices, priorities)
+
+        self.pos = int((self.pos + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+        return indices
+
+    # --- Priorities ---
+
+    def _set_tree(self, indices, priorities):
+        """Store raw priorities and their alpha-scaled values in both trees"""
+        self.arrays['priorities'][indices] = priorities
+        scaled = np.power(priorities, self.alpha)
+        self.sum_tree.update(indices, scaled)
+        self.min_tree.update(indices, scaled)
+
+    def update_priorities(self, indices, td_errors):
+        """Set priorities to |td_error| + eps for the sampled indices"""
+        indices = np.asarray(indices, dtype=np.int64)
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)).reshape(-1) + self.eps
+        # Duplicate indices in one batch: the last value wins in every array
+        indices, last = np.unique(indices[::-1], return_index=True)
+        priorities = priorities[::-1][last]
+        self.max_priority = max(self.max_priority, float(priorities.max(initial=0.0)))
+        self._set_tree(indices, priorities)
+
+    # --- Sampling ---
+
+    def sample_indices(self, batch_size: int, prioritized: bool = True) -> np.ndarray:
+        """Slot indices, stratified over the priority mass (or uniform)"""
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+        if not prioritized or self.alpha == 0:
+            return self.rng.integers(0, self.size, batch_size)
+        total = self.sum_tree.reduce()
+        segment = total / batch_size
+        prefix = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = self.sum_tree.find(np.minimum(prefix, np.nextafter(total, 0)))
+        return np.minimum(indices, self.size - 1)
+
+    def importance_weights(self, indices, beta: float = Config.PER_BETA) -> np.ndarray:
+        """(N * P(i))^-beta, normalized by the largest possible weight"""
+        total = self.sum_tree.reduce()
+        probs = self.sum_tree[indices] / total
+        min_prob = self.min_tree.reduce() / total
+        return np.power(probs / min_prob, -beta).astype(np.float32)
+
+    def sample(self, batch_size: int, beta: float = Config.PER_BETA,
+               prioritized: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Sample a batch of transitions
+
+        Returns:
+            Dict with states, actions, rewards, next_states, dones, indices and
+            importance-sampling weights (all ones for uniform sampling)
+        """
+        indices = self.sample_indices(batch_size, prioritized)
+        # Sorted gathers are markedly faster on large (memory-mapped) arrays
+        indices.sort()
+        batch = {name: self.arrays[name][indices]
+                 for name in ('states', 'actions', 'rewards', 'next_states', 'dones')}
+        batch['indices'] = indices
+        if prioritized and self.alpha != 0:
+            batch['weights'] = self.importance_weights(indices, beta)
+        else:
+            batch['weights'] = np.ones(batch_size, dtype=np.float32)
+        return batch
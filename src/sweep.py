@@ -0,0 +1,378 @@
+"""
+Parallel hyperparameter sweep with asynchronous successive halving (ASHA)
+
+Every trial is a separate training process (Trainer with a config built by
+config_from_dict) pinned to its own slice of the CPU cores and limited to a
+fixed thread budget, so trials do not oversubscribe the machine. All trials
+read the same preprocessed split files (prepare_data.py, or --per-trace for
+WINDOW_SIZE sweeps) memory-mapped, so the dataset is held once in the page
+cache however many trials run.
+
+Trials report their validation metrics after every epoch. At the rung
+epochs min_epochs * eta^k a trial whose validation loss (--metric) is worse
+than the best 1/eta of the values previously recorded at that rung is stopped (ASHA,
+Li et al. 2020), and the freed slot starts the next trial. Trials never wait
+for each other. The loss itself depends on the loss weights, so when the
+space varies them trials are ranked by validation MAE instead (--metric).
+
+Search space (JSON file via --space, default SEARCH_SPACE): setting name ->
+    [a, b, ...]                 choice
+    {"uniform": [lo, hi]}       float
+    {"log_uniform": [lo, hi]}   float, sampled in log space
+    {"int_uniform": [lo, hi]}   integer, inclusive
+
+All trials go into one table, <out>/results.csv, sorted by the best value
+of the metric; each trial's log, checkpoints and per-epoch metrics are kept under
+<out>/trial_NNN/.
+
+Usage:
+    python sweep.py --trials 32 --threads 4 --max-epochs 27
+    python sweep.py --space space.json --set BATCH_SIZE=512 --set DEVICE=\\"cuda\\"
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config, config_from_dict, data_overrides, parse_assignment
+
+
+SEARCH_SPACE = {
+    'LSTM_HIDDEN_SIZE': [64, 128, 256],
+    'FC_HIDDEN_SIZES': [[64, 32], [128, 64], [256, 128]],
+    'LEARNING_RATE': {'log_uniform': [5e-5, 2e-3]},
+    'LOSS_WEIGHT_HAS_LOSS': [5.0, 10.0, 20.0],
+    'LOSS_WEIGHT_HIGH_DELAY': [2.0, 5.0, 10.0],
+    'MSE_WEIGHT': {'uniform': [0.5, 0.9]},
+}
+
+ETA = 3               # Keep the best 1/ETA at every rung
+MIN_EPOCHS = 1        # First rung
+POLL_INTERVAL_S = 0.5
+PROGRESS_FILE = 'progress.jsonl'
+
+# Settings that change what the validation loss measures
+LOSS_SETTINGS = {'MSE_WEIGHT', 'MAPE_WEIGHT', 'LOSS_WEIGHT_NO_LOSS', 'LOSS_WEIGHT_HAS_LOSS',
+                 'LOSS_WEIGHT_HIGH_DELAY', 'LOSS_THRESHOLD', 'HIGH_DELAY_THRESHOLD'}
+METRICS = ['val_loss', 'val_mae', 'val_mape']
+
+
+def sample_params(space: Dict, rng: np.random.Generator) -> Dict:
+    """Draw one configuration from a search space"""
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, list):
+            params[name] = spec[int(rng.integers(len(spec)))]
+        elif 'uniform' in spec:
+            lo, hi = spec['uniform']
+            params[name] = float(rng.uniform(lo, hi))
+        elif 'log_uniform' in spec:
+            lo, hi = spec['log_uniform']
+            params[name] = float(np.exp(rng.uniform(np.log(lo), np.log(hi))))
+        elif 'int_uniform' in spec:
+            lo, hi = spec['int_uniform']
+            params[name] = int(rng.integers(lo, hi + 1))
+        else:
+            raise ValueError(f"Unknown search space entry for {name}: {spec}")
+    return params
+
+
+class ASHA:
+    """Asynchronous successive halving on a loss (lower is better)"""
+
+    def __init__(self, min_epochs: int = MIN_EPOCHS, max_epochs: int = Config.NUM_EPOCHS, eta: int = ETA):
+        self.eta = eta
+        self.rungs = []
+        epoch = max(1, min_epochs)
+        while epoch < max_epochs:
+            self.rungs.append(epoch)
+            epoch *= eta
+        self.recorded = {epoch: [] for epoch in self.rungs}
+
+    def keep(self, epoch: int, loss: float) -> bool:
+        """Record a result; False if the trial should be stopped"""
+        if not np.isfinite(loss):
+            return False
+        if epoch not in self.recorded:
+            return True
+        previous = self.recorded[epoch]
+        previous.append(loss)
+        if len(previous) == 1:
+            return True
+        cutoff = np.percentile(previous[:-1], 100.0 / self.eta)
+        return loss <= cutoff
+
+
+class Trial:
+    """One training subprocess and what it has reported so far"""
+
+    def __init__(self, trial_id: int, params: Dict, directory: Path):
+        self.trial_id = trial_id
+        self.params = params
+        self.directory = directory
+        self.process: Optional[subprocess.Popen] = None
+        self.status = 'pending'
+        self.reports: List[Dict] = []
+        self.start_time = None
+        self.elapsed = 0.0
+        self._offset = 0
+
+    def poll_reports(self) -> List[Dict]:
+        """Per-epoch results written by the trial since the last call"""
+        path = self.directory / PROGRESS_FILE
+        if not path.exists():
+            return []
+        with open(path) as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        # Only consume complete lines; a partial one is picked up next time
+        complete = chunk[:chunk.rfind('\n') + 1]
+        self._offset += len(complete)
+        reports = [json.loads(line) for line in complete.splitlines() if line]
+        self.reports.extend(reports)
+        return reports
+
+    def best(self, metric: str = 'val_loss') -> Optional[Dict]:
+        finite = [r for r in self.reports if np.isfinite(r[metric])]
+        return min(finite, key=lambda r: r[metric]) if finite else None
+
+    def row(self, metric: str = 'val_loss') -> Dict:
+        best = self.best(metric)
+        row = {
+            'trial': self.trial_id,
+            'status': self.status,
+            'epochs': len(self.reports),
+            'best_epoch': best['epoch'] if best else '',
+            'val_loss': best['val_loss'] if best else '',
+            'val_mae_mbps': best['val_mae'] / 1e6 if best else '',
+            'val_mape': best['val_mape'] if best else '',
+            'val_r2': best['val_r2'] if best else '',
+            'time_s': round(self.elapsed, 1),
+        }
+        row.update({name: json.dumps(value) if isinstance(value, list) else value
+                    for name, value in self.params.items()})
+        return row
+
+
+def write_table(trials: List[Trial], path: Path, metric: str = 'val_loss'):
+    key = 'val_mae_mbps' if metric == 'val_mae' else metric
+    rows = sorted((t.row(metric) for t in trials if t.status != 'pending'),
+                  key=lambda r: (r[key] == '', r[key] if r[key] != '' else 0))
+    if not rows:
+        return rows
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+    return rows
+
+
+def cpu_slices(parallel: int, threads: int) -> List[Optional[List[int]]]:
+    """Disjoint core sets per concurrent trial (None where affinity is unavailable)"""
+    if not hasattr(os, 'sched_getaffinity'):
+        return [None] * parallel
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < parallel * threads:
+        return [None] * parallel
+    return [cores[i * threads:(i + 1) * threads] for i in range(parallel)]
+
+
+def shared_data_status(config) -> str:
+    """Which preprocessed files the trials will map, for the startup message"""
+    processed = Path(config.DATA_DIR) / 'processed'
+    if all((processed / f'{s}_tensors.pt').exists() for s in ('train', 'val', 'test')):
+        return f"fixed-window tensors in {processed} (used while WINDOW_SIZE and the feature layout match)"
+    if all((processed / f'{s}_traces.pt').exists() for s in ('train', 'val', 'test')):
+        return f"per-trace splits in {processed}"
+    return ''
+
+
+def launch(trial: Trial, overrides: Dict, threads: int, cpus: Optional[List[int]]):
+    trial.directory.mkdir(parents=True, exist_ok=True)
+    values = dict(overrides)
+    values.update(trial.params)
+    values['CHECKPOINT_DIR'] = str(trial.directory / 'checkpoints')
+    values['LOG_DIR'] = str(trial.directory / 'logs')
+    spec = {'trial': trial.trial_id, 'config': values, 'threads': threads, 'cpus': cpus}
+    with open(trial.directory / 'trial.json', 'w') as f:
+        json.dump(spec, f, indent=2)
+
+    env = dict(os.environ)
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        env[var] = str(threads)
+    log = open(trial.directory / 'train.log', 'w')
+    trial.process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--trial', str(trial.directory / 'trial.json')],
+        stdout=log, stderr=subprocess.STDOUT, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    log.close()
+    trial.status = 'running'
+    trial.start_time = time.perf_counter()
+
+
+def run_sweep(space: Dict, num_trials: int, out_dir: Path, overrides: Dict,
+              parallel: int, threads: int, max_epochs: int, min_epochs: int = MIN_EPOCHS,
+              eta: int = ETA, seed: int = Config.SEED, metric: str = 'val_loss') -> List[Dict]:
+    """Run num_trials sampled configurations, at most `parallel` at a time, pruning on `metric`"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    asha = ASHA(min_epochs, max_epochs, eta)
+    overrides = dict(overrides, NUM_EPOCHS=max_epochs, VAL_INTERVAL=1)
+    trials = [Trial(i, sample_params(space, rng), out_dir / f'trial_{i:03d}') for i in range(num_trials)]
+    slots = cpu_slices(parallel, threads)
+    free = list(range(parallel))
+    running: Dict[int, Trial] = {}  # slot -> trial
+    pending = list(trials)
+    table = out_dir / 'results.csv'
+    print(f"Sweep: {num_trials} trials, {parallel} in parallel x {threads} threads, "
+          f"rungs at epochs {asha.rungs} (eta={eta}, {metric}), max {max_epochs} epochs")
+
+    start = time.perf_counter()
+    while pending or running:
+        while pending and free:
+            slot = free.pop(0)
+            trial = pending.pop(0)
+            launch(trial, overrides, threads, slots[slot])
+            running[slot] = trial
+            print(f"[{time.perf_counter() - start:7.1f}s] trial {trial.trial_id} started: {trial.params}")
+
+        time.sleep(POLL_INTERVAL_S)
+        for slot, trial in list(running.items()):
+            for report in trial.poll_reports():
+                if trial.status == 'running' and not asha.keep(report['epoch'], report[metric]):
+                    trial.process.terminate()
+                    trial.status = 'pruned'
+            returncode = trial.process.poll()
+            if returncode is None and trial.status == 'running':
+                continue
+            if returncode is None:
+                trial.process.wait()
+            trial.poll_reports()
+            if trial.status == 'running':
+                trial.status = 'completed' if returncode == 0 else 'failed'
+            trial.elapsed = time.perf_counter() - trial.start_time
+            best = trial.best(metric)
+            value = f"{best[metric]:.4g}" if best else 'n/a'
+            print(f"[{time.perf_counter() - start:7.1f}s] trial {trial.trial_id} {trial.status} "
+                  f"after {len(trial.reports)} epochs (best {metric} {value})")
+            del running[slot]
+            free.append(slot)
+            write_table(trials, table, metric)
+
+    rows = write_table(trials, table, metric)
+    print(f"\nSweep finished in {time.perf_counter() - start:.1f}s; results in {table}")
+    return rows
+
+
+def print_table(rows: List[Dict], space: Dict, top: int = 10):
+    params = list(space)
+    header = f"{'Trial':>5} {'Status':<9} {'Ep':>3} {'Val loss':>9} {'MAE Mbps':>9} {'R²':>7}  "
+    print("\n" + header + "  ".join(params))
+    print("-" * (len(header) + sum(len(p) + 2 for p in params)))
+    for row in rows[:top]:
+        if row['val_loss'] == '':
+            metrics = f"{'':>9} {'':>9} {'':>7}"
+        else:
+            metrics = f"{row['val_loss']:>9.4f} {row['val_mae_mbps']:>9.3f} {row['val_r2']:>7.3f}"
+        values = "  ".join(f"{row[p]:<{len(p)}.4g}" if isinstance(row[p], float) else f"{row[p]:<{len(p)}}"
+                           for p in params)
+        print(f"{row['trial']:>5} {row['status']:<9} {row['epochs']:>3} {metrics}  {values}")
+
+
+def run_trial(spec_path):
+    """Worker entry point: train one configuration and append per-epoch results"""
+    with open(spec_path) as f:
+        spec = json.load(f)
+    if spec.get('cpus') and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, spec['cpus'])
+
+    import torch
+    from train import Trainer
+    torch.set_num_threads(spec['threads'])
+
+    progress = Path(spec_path).parent / PROGRESS_FILE
+    start = time.perf_counter()
+
+    class ReportingTrainer(Trainer):
+        def validate(self):
+            val_loss, val_mae, val_mape, val_r2 = super().validate()
+            record = {
+                'epoch': self.current_epoch + 1,
+                'val_loss': float(val_loss),
+                'val_mae': float(val_mae),
+                'val_mape': float(val_mape),
+                'val_r2': float(val_r2),
+                'time_s': time.perf_counter() - start,
+            }
+            with open(progress, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            return val_loss, val_mae, val_mape, val_r2
+
+    config = config_from_dict(spec['config'])
+    trainer = ReportingTrainer(config)
+    trainer.train()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep with ASHA pruning')
+    parser.add_argument('--trial', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--space', default=None, help='Search space JSON (default: SEARCH_SPACE)')
+    parser.add_argument('--trials', type=int, default=27, help='Configurations to sample')
+    parser.add_argument('--threads', type=int, default=4, help='CPU threads per trial')
+    parser.add_argument('--parallel', type=int, default=None,
+                        help='Concurrent trials (default: CPUs // threads)')
+    parser.add_argument('--max-epochs', type=int, default=27, help='Epochs of a trial that is never stopped')
+    parser.add_argument('--min-epochs', type=int, default=MIN_EPOCHS, help='First rung (epochs)')
+    parser.add_argument('--eta', type=int, default=ETA, help='Reduction factor per rung')
+    parser.add_argument('--metric', choices=METRICS, default=None,
+                        help='Pruning/ranking metric (default: val_loss, or val_mae if the space varies the loss)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Fixed setting for every trial (VALUE as JSON), e.g. BATCH_SIZE=512')
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--device', default='cpu', help='Training device of every trial')
+    parser.add_argument('--out', default=None, help='Output directory (default: sweeps/<timestamp>)')
+    parser.add_argument('--seed', type=int, default=Config.SEED, help='Sampling seed')
+    args = parser.parse_args()
+
+    if args.trial:
+        run_trial(args.trial)
+        return
+
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    overrides = dict(parse_assignment(a) for a in args.set)
+    overrides['DEVICE'] = args.device
+    overrides.update(data_overrides(args.data_dir))
+    config = config_from_dict(overrides)
+
+    shared = shared_data_status(config)
+    if shared:
+        print(f"Trials share {shared}, memory-mapped")
+    else:
+        print(f"No preprocessed data in {Path(config.DATA_DIR) / 'processed'}: every trial parses "
+              f"the pickles itself. Run prepare_data.py (--per-trace for WINDOW_SIZE sweeps) first.")
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    threads = max(1, min(args.threads, cpus))
+    parallel = args.parallel or max(1, cpus // threads)
+    out_dir = Path(args.out) if args.out else Config.PROJECT_ROOT / 'sweeps' / time.strftime('%Y%m%d-%H%M%S')
+
+    metric = args.metric or ('val_mae' if LOSS_SETTINGS & set(space) else 'val_loss')
+    rows = run_sweep(space, args.trials, out_dir, overrides, parallel, threads,
+                     args.max_epochs, args.min_epochs, args.eta, args.seed, metric)
+    print_table(rows, space)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""
+Indexed condition queries over the trace corpus
+
+Finds the steps where network conditions hold, e.g.
+
+    python3 trace_query.py "loss > 5% and delay > 300"
+
+without scanning every trace. The index stores per-chunk min/max zone maps
+(CHUNK_SIZE rows per chunk) for every numeric column of every trace; a query
+first prunes chunks whose [min, max] cannot satisfy all conditions, then
+evaluates the surviving chunks exactly (served zero-copy from the trace
+store when present) and merges matching steps into (trace, start, stop)
+ranges. The ranges plug into GCCDataset via dataset.RangeSampler.
+
+Condition syntax: `<column> <op> <value>` joined by `and` or `,`, with
+op in > >= < <= == !=. Values may end in `%` (divided by 100). Column
+aliases: loss, recv, send, bw.
+
+Usage:
+    python3 trace_query.py "loss > 5% and delay > 300" [--data-dir DIR]
+                           [--datasets ghent,NY] [--min-length 10] [--limit 20]
+                           [--out matches.json] [--rebuild]
+"""
+import argparse
+import json
+import operator
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from trace_store import load_trace
+
+
+INDEX_VERSION = 1
+CHUNK_SIZE = 64
+
+COLUMN_ALIASES = {
+    'loss': 'loss_ratio',
+    'recv': 'receiving_rate',
+    'send': 'sending_rate',
+    'bw': 'bandwidth_prediction',
+}
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+_CONDITION_RE = re.compile(r'^\s*([A-Za-z_]\w*)\s*(>=|<=|==|!=|>|<)\s*([-+0-9.eE]+)\s*(%?)\s*$')
+
+
+class Condition(NamedTuple):
+    column: str
+    op: str
+    value: float
+
+    def __str__(self):
+        return f"{self.column} {self.op} {self.value:g}"
+
+
+class MatchRange(NamedTuple):
+    """Steps [start, stop) of one trace where all conditions hold"""
+    path: str
+    start: int
+    stop: int
+
+    @property
+    def length(self):
+        return self.stop - self.start
+
+
+def parse_query(query: str) -> List[Condition]:
+    """Parse 'loss > 5% and delay > 300' into conditions"""
+    conditions = []
+    for part in re.split(r'\s+and\s+|,', query.strip(), flags=re.IGNORECASE):
+        if not part.strip():
+            continue
+        match = _CONDITION_RE.match(part)
+        if match is None:
+            raise ValueError(f"Cannot parse condition: {part!r}")
+        column, op, value, percent = match.groups()
+        value = float(value) / (100.0 if percent else 1.0)
+        conditions.append(Condition(COLUMN_ALIASES.get(column, column), op, value))
+    if not conditions:
+        raise ValueError("Empty query")
+    return conditions
+
+
+def _chunk_may_match(cond: Condition, chunk_min: np.ndarray, chunk_max: np.ndarray) -> np.ndarray:
+    """Chunks whose [min, max] can contain a value satisfying cond (never a NaN = missing-column chunk)"""
+    v = cond.value
+    if cond.op == '>':
+        return chunk_max > v
+    if cond.op == '>=':
+        return chunk_max >= v
+    if cond.op == '<':
+        return chunk_min < v
+    if cond.op == '<=':
+        return chunk_min <= v
+    if cond.op == '==':
+        return (chunk_min <= v) & (chunk_max >= v)
+    return ~((chunk_min == v) & (chunk_max == v)) & ~np.isnan(chunk_min)
+
+
+def _mask_to_ranges(mask: np.ndarray, offset: int = 0):
+    """(start, stop) pairs of the True runs in a boolean mask"""
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    return starts + offset, stops + offset
+
+
+class QueryIndex:
+    """Zone-map index over a list of trace files"""
+
+    def __init__(self, paths, lengths, columns, chunk_trace, chunk_start, chunk_min, chunk_max,
+                 sources, chunk_size=CHUNK_SIZE):
+        self.paths = list(paths)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.columns = list(columns)
+        self.chunk_trace = chunk_trace      # [n_chunks] trace id
+        self.chunk_start = chunk_start      # [n_chunks] first step of the chunk
+        self.chunk_min = chunk_min          # [n_chunks, n_columns] (NaN if column missing)
+        self.chunk_max = chunk_max
+        self.sources = sources              # [n_traces, 2] size, mtime_ns
+        self.chunk_size = chunk_size
+
+    # --- Building / persistence ---
+
+    @classmethod
+    def build(cls, files: Sequence, chunk_size: int = CHUNK_SIZE, verbose: bool = False):
+        files = [os.path.abspath(f) for f in files]
+        paths, lengths, sources = [], [], []
+        per_trace = []
+        columns = []
+        start = time.time()
+
+        for path in files:
+            try:
+                data = load_trace(path)
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+                continue
+            arrays = {k: v for k, v in data.items() if isinstance(v, np.ndarray) and v.size > 0}
+            if not arrays:
+                continue
+            for name in arrays:
+                if name not in columns:
+                    columns.append(name)
+            length = max(v.size for v in arrays.values())
+            st = os.stat(path)
+            paths.append(path)
+            lengths.append(length)
+            sources.append((st.st_size, st.st_mtime_ns))
+            per_trace.append(arrays)
+
+        n_chunks = [-(-length // chunk_size) for length in lengths]
+        total = sum(n_chunks)
+        chunk_trace = np.repeat(np.arange(len(paths), dtype=np.int32), n_chunks)
+        chunk_start = np.concatenate([np.arange(n, dtype=np.int64) * chunk_size for n in n_chunks]) \
+            if total else np.zeros(0, dtype=np.int64)
+        chunk_min = np.full((total, len(columns)), np.nan)
+        chunk_max = np.full((total, len(columns)), np.nan)
+
+        offset = 0
+        for arrays, n in zip(per_trace, n_chunks):
+            for j, name in enumerate(columns):
+                values = arrays.get(name)
+                if values is None:
+                    continue
+                starts = np.arange(0, values.size, chunk_size)
+                rows = slice(offset, offset + starts.size)
+                chunk_min[rows, j] = np.minimum.reduceat(values, starts)
+                chunk_max[rows, j] = np.maximum.reduceat(values, starts)
+            offset += n
+
+        if verbose:
+            print(f"Indexed {len(paths)} traces ({total:,} chunks of {chunk_size}) in {time.time() - start:.2f}s")
+        return cls(paths, lengths, columns, chunk_trace, chunk_start, chunk_min, chunk_max,
+                   np.asarray(sources, dtype=np.int64).reshape(-1, 2), chunk_size)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.tmp.npz')
+        np.savez(
+            tmp_path,
+            version=np.array(INDEX_VERSION),
+            chunk_size=np.array(self.chunk_size),
+            paths=np.array(self.paths, dtype=str),
+            lengths=self.lengths,
+            columns=np.array(self.columns, dtype=str),
+            chunk_trace=self.chunk_trace,
+            chunk_start=self.chunk_start,
+            chunk_min=self.chunk_min,
+            chunk_max=self.chunk_max,
+            sources=self.sources,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            if int(f['version']) != INDEX_VERSION:
+                raise ValueError(f"Unsupported query index version: {int(f['version'])}")
+            return cls(f['paths'].tolist(), f['lengths'], f['columns'].tolist(), f['chunk_trace'],
+                       f['chunk_start'], f['chunk_min'], f['chunk_max'], f['sources'],
+                       int(f['chunk_size']))
+
+    def is_current(self, files: Sequence) -> bool:
+        """True if the index covers exactly these files, unchanged on disk"""
+        files = sorted(os.path.abspath(f) for f in files)
+        if files != sorted(self.paths):
+            return False
+        for path, (size, mtime_ns) in zip(self.paths, self.sources.tolist()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return False
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                return False
+        return True
+
+    @classmethod
+    def load_or_build(cls, files: Sequence, index_path, rebuild: bool = False, verbose: bool = True):
+        """Load the index at index_path, rebuilding it if the corpus changed"""
+        index_path = Path(index_path)
+        if index_path.exists() and not rebuild:
+            try:
+                index = cls.load(index_path)
+                if index.is_current(files):
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+        index = cls.build(files, verbose=verbose)
+        index.save(index_path)
+        return index
+
+    # --- Querying ---
+
+    def query(self, conditions, min_length: int = 1, paths: Optional[Sequence] = None) -> List[MatchRange]:
+        """
+        Ranges of steps where all conditions hold
+
+        Args:
+            conditions: Query string or list of Condition
+            min_length: Drop ranges shorter than this many steps
+            paths: Restrict to these trace files
+        """
+        if isinstance(conditions, str):
+            conditions = parse_query(conditions)
+        for cond in conditions:
+            if cond.column not in self.columns:
+                raise ValueError(f"Unknown column {cond.column!r}. Available: {self.columns}")
+
+        # Zone-map pruning (NaN min/max = column missing from the trace -> chunk skipped)
+        candidate = np.ones(len(self.chunk_trace), dtype=bool)
+        for cond in conditions:
+            j = self.columns.index(cond.column)
+            candidate &= _chunk_may_match(cond, self.chunk_min[:, j], self.chunk_max[:, j])
+        if paths is not None:
+            wanted = {os.path.abspath(p) for p in paths}
+            trace_ok = np.array([p in wanted for p in self.paths], dtype=bool)
+            candidate &= trace_ok[self.chunk_trace]
+
+        chunks = np.flatnonzero(candidate)
+        needed = sorted({cond.column for cond in conditions})
+        results = []
+        # chunk_trace is sorted, so the surviving chunks of a trace are one contiguous run
+        trace_ids, first = np.unique(self.chunk_trace[chunks], return_index=True)
+        for trace_id, trace_chunks in zip(trace_ids, np.split(chunks, first[1:])):
+            path = self.paths[trace_id]
+            data = load_trace(path, columns=needed)
+            length = int(self.lengths[trace_id])
+
+            # Exact evaluation on the surviving chunks only, merged into one row mask
+            chunk_mask = np.zeros(-(-length // self.chunk_size), dtype=bool)
+            chunk_mask[self.chunk_start[trace_chunks] // self.chunk_size] = True
+            mask = np.zeros(length, dtype=bool)
+            for c0, c1 in zip(*_mask_to_ranges(chunk_mask)):
+                lo, hi = c0 * self.chunk_size, min(c1 * self.chunk_size, length)
+                rows = np.ones(hi - lo, dtype=bool)
+                for cond in conditions:
+                    values = np.asarray(data[cond.column])[lo:hi]
+                    rows[:values.size] &= OPERATORS[cond.op](values, cond.value)
+                    rows[values.size:] = False
+                mask[lo:hi] = rows
+
+            for start, stop in zip(*_mask_to_ranges(mask)):
+                if stop - start >= min_length:
+                    results.append(MatchRange(path, int(start), int(stop)))
+        return results
+
+    def stats(self):
+        return {
+            'traces': len(self.paths),
+            'rows': int(self.lengths.sum()),
+            'chunks': int(len(self.chunk_trace)),
+            'chunk_size': self.chunk_size,
+            'columns': self.columns,
+        }
+
+
+def collect_files(data_dir, datasets: Optional[Sequence[str]] = None) -> List[str]:
+    """*.pickle files of the given datasets (default: every sub-directory)"""
+    data_dir = Path(data_dir)
+    if datasets is None:
+        datasets = sorted(p.name for p in data_dir.iterdir() if p.is_dir() and not p.name.startswith('.'))
+    files = []
+    for name in datasets:
+        files.extend(str(f) for f in sorted((data_dir / name).glob('*.pickle')))
+    return files
+
+
+def default_index_path(data_dir) -> Path:
+    return Path(data_dir) / '.cache' / 'query_index.npz'
+
+
+def summarize_matches(matches: List[MatchRange]) -> Dict[str, Dict]:
+    """Ranges/steps/traces matched per dataset"""
+    summary = {}
+    for m in matches:
+        entry = summary.setdefault(Path(m.path).parent.name, {'ranges': 0, 'steps': 0, 'traces': set()})
+        entry['ranges'] += 1
+        entry['steps'] += m.length
+        entry['traces'].add(m.path)
+    return {k: {**v, 'traces': len(v['traces'])} for k, v in sorted(summary.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query trace steps matching network conditions')
+    parser.add_argument('query', help='e.g. "loss > 5%% and delay > 300"')
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: Config.DATA_DIR)')
+    parser.add_argument('--datasets', default=None, help='Comma-separated datasets (default: all)')
+    parser.add_argument('--min-length', type=int, default=1, help='Minimum range length in steps')
+    parser.add_argument('--limit', type=int, default=20, help='Ranges to print (0 = none)')
+    parser.add_argument('--out', default=None, help='Write all ranges to this JSON file')
+    parser.add_argument('--index', default=None, help='Index file (default: <data_dir>/.cache/query_index.npz)')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        from config import Config
+        data_dir = Config.DATA_DIR
+    datasets = args.datasets.split(',') if args.datasets else None
+
+    # The index always covers the whole corpus; --datasets only filters the query
+    all_files = collect_files(data_dir)
+    files = collect_files(data_dir, datasets) if datasets else all_files
+    if not files:
+        print(f"No pickle files found in {data_dir}")
+        return 1
+
+    index_path = args.index or default_index_path(data_dir)
+    start = time.perf_counter()
+    index = QueryIndex.load_or_build(all_files, index_path, rebuild=args.rebuild)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    conditions = parse_query(args.query)
+    start = time.perf_counter()
+    matches = index.query(conditions, min_length=args.min_length, paths=files)
+    query_ms = (time.perf_counter() - start) * 1000
+
+    stats = index.stats()
+    print(f"\nQuery: {' and '.join(str(c) for c in conditions)}")
+    print(f"Index: {stats['traces']} traces, {stats['rows']:,} steps, {stats['chunks']:,} chunks "
+          f"(loaded in {load_ms:.1f} ms)")
+    print(f"Matched {len(matches)} ranges, {sum(m.length for m in matches):,} steps in {query_ms:.1f} ms\n")
+
+    for dataset, entry in summarize_matches(matches).items():
+        print(f"  {dataset:<15} {entry['traces']:>5} traces  {entry['ranges']:>6} ranges  {entry['steps']:>8,} steps")
+
+    if args.limit:
+        print()
+        for m in sorted(matches, key=lambda m: -m.length)[:args.limit]:
+            print(f"  {Path(m.path).parent.name}/{Path(m.path).name}  [{m.start}, {m.stop})  {m.length} steps")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'query': args.query, 'ranges': [m._asdict() for m in matches]}, f, indent=2)
+        print(f"\nRanges written to {args.out}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""
+Columnar trace store for BC-GCC
+
+Converts the per-trace dict-of-lists pickles into a memory-mappable layout:
+
+    trace_store/
+        index.json          metadata index: one entry per trace with
+                            trace_name, dataset, length, per-column offsets,
+                            summary stats and the source pickle's size/mtime
+        <column>.f64        all traces' values of one column, concatenated
+                            (little-endian float64, contiguous per trace)
+
+load_trace() is the shared reader used by the dataset and the tools: it
+serves a trace from the store as zero-copy read-only NumPy views when the
+store has an up-to-date entry for the pickle, and falls back to unpickling
+otherwise. Only NumPy is required, so the tools can import this module
+without torch.
+
+Usage:
+    python3 trace_store.py build [data_dir] [--out data_dir/trace_store]
+    python3 trace_store.py info [store_dir]
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+STORE_FORMAT_VERSION = 1
+STORE_DIRNAME = 'trace_store'
+INDEX_FILE = 'index.json'
+COLUMN_DTYPE = np.dtype('<f8')
+
+# Environment override for stores that don't live next to the pickles
+STORE_ENV_VAR = 'BCGCC_TRACE_STORE'
+
+
+class TraceStore:
+    """Read-only view of a columnar trace store"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        with open(self.root / INDEX_FILE) as f:
+            index = json.load(f)
+        if index.get('format_version', 0) > STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported trace store version: {index['format_version']}")
+
+        self.source_root = Path(index['source_root'])
+        self.columns = index['columns']
+        self.traces: List[Dict] = index['traces']
+        self._by_key = {entry['key']: entry for entry in self.traces}
+        self._memmaps: Dict[str, np.memmap] = {}
+
+    def __len__(self):
+        return len(self.traces)
+
+    def keys(self):
+        return list(self._by_key)
+
+    def entry(self, key: str) -> Dict:
+        return self._by_key[key]
+
+    def datasets(self):
+        return sorted({entry['dataset'] for entry in self.traces})
+
+    def _column(self, name: str) -> np.memmap:
+        if name not in self._memmaps:
+            path = self.root / f'{name}.f64'
+            if path.stat().st_size == 0:
+                self._memmaps[name] = np.empty(0, dtype=COLUMN_DTYPE)
+            else:
+                self._memmaps[name] = np.memmap(path, dtype=COLUMN_DTYPE, mode='r')
+        return self._memmaps[name]
+
+    def read_column(self, key: str, column: str) -> np.ndarray:
+        """Zero-copy read-only view of one column of one trace"""
+        offset, length = self._by_key[key]['columns'][column]
+        return self._column(column)[offset:offset + length]
+
+    def read(self, key: str, columns: Optional[List[str]] = None) -> Dict:
+        """
+        Read a trace as a dict shaped like the original pickle
+
+        Numeric columns are zero-copy views; scalar attributes (trace_name, ...)
+        are included as-is.
+        """
+        entry = self._by_key[key]
+        names = entry['columns'] if columns is None else [c for c in columns if c in entry['columns']]
+        data = dict(entry.get('attrs', {}))
+        for name in names:
+            data[name] = self.read_column(key, name)
+        return data
+
+    def key_for_path(self, path) -> Optional[str]:
+        """Store key for a pickle path, or None if it is outside the source root / not stored"""
+        try:
+            key = Path(os.path.abspath(path)).relative_to(self.source_root).as_posix()
+        except ValueError:
+            return None
+        return key if key in self._by_key else None
+
+    def is_fresh(self, key: str, path) -> bool:
+        """True if the stored entry matches the pickle on disk (or the pickle is gone)"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return True
+        source = self._by_key[key]['source']
+        return source['size'] == st.st_size and source['mtime_ns'] == st.st_mtime_ns
+
+
+# ---------------------------------------------------------------------------
+# Shared reader API
+# ---------------------------------------------------------------------------
+
+_OPEN_STORES: Dict[str, Optional[TraceStore]] = {}
+
+
+def open_store(root) -> Optional[TraceStore]:
+    """Open (and cache) the store at root, or None if there is none"""
+    root = os.path.abspath(root)
+    if root not in _OPEN_STORES:
+        _OPEN_STORES[root] = TraceStore(root) if os.path.exists(os.path.join(root, INDEX_FILE)) else None
+    return _OPEN_STORES[root]
+
+
+def find_store(path) -> Optional[TraceStore]:
+    """
+    Locate the store covering a pickle path
+
+    Checks $BCGCC_TRACE_STORE first, then `<ancestor>/trace_store` for every
+    ancestor directory of the path.
+    """
+    env_root = os.environ.get(STORE_ENV_VAR)
+    if env_root:
+        store = open_store(env_root)
+        if store is not None and store.key_for_path(path) is not None:
+            return store
+
+    for ancestor in Path(os.path.abspath(path)).parents:
+        store = open_store(ancestor / STORE_DIRNAME)
+        if store is not None and store.key_for_path(path) is not None:
+            return store
+    return None
+
+
+def load_trace(path, columns: Optional[List[str]] = None, use_store: bool = True):
+    """
+    Load a trace as a dict of NumPy arrays (plus scalar attributes)
+
+    Served from the trace store (zero-copy, no unpickling) when an up-to-date
+    entry exists, otherwise read from the pickle. Non-dict pickles are
+    returned unchanged.
+    """
+    if use_store:
+        store = find_store(path)
+        if store is not None:
+            key = store.key_for_path(path)
+            if store.is_fresh(key, path):
+                return store.read(key, columns)
+
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if not isinstance(data, dict):
+        return data
+    return _to_arrays(data, columns)
+
+
+def describe_trace(path) -> Dict:
+    """
+    Keys, types, lengths and min/max/mean of a trace
+
+    Answered from the store index alone (no column reads) when the store has an
+    up-to-date entry, otherwise computed from the loaded trace. Returns
+    {key: {'type', 'dtype'?, 'length'?, 'min'?, 'max'?, 'mean'?, 'value'?}}.
+    """
+    store = find_store(path)
+    if store is not None:
+        key = store.key_for_path(path)
+        if store.is_fresh(key, path):
+            entry = store.entry(key)
+            desc = {name: {'type': type(value).__name__, 'value': value}
+                    for name, value in entry.get('attrs', {}).items()}
+            for name, (_, length) in entry['columns'].items():
+                desc[name] = {'type': 'column', 'dtype': COLUMN_DTYPE.name, 'length': length,
+                              **entry['stats'].get(name, {})}
+            return desc
+
+    data = load_trace(path, use_store=False)
+    if not isinstance(data, dict):
+        desc = {'type': type(data).__name__}
+        if hasattr(data, '__len__'):
+            desc['length'] = len(data)
+        return {'<data>': desc}
+
+    desc = {}
+    for name, value in data.items():
+        if isinstance(value, np.ndarray):
+            item = {'type': 'column', 'dtype': value.dtype.name, 'length': int(value.size)}
+            if value.size > 0:
+                item.update(min=float(value.min()), max=float(value.max()), mean=float(value.mean()))
+        elif isinstance(value, (list, tuple, dict, set)):
+            item = {'type': type(value).__name__, 'length': len(value)}
+        elif _json_scalar(value):
+            item = {'type': type(value).__name__, 'value': value}
+        else:
+            item = {'type': type(value).__name__, 'value': repr(value)[:80]}
+        desc[name] = item
+    return desc
+
+
+def _is_numeric_sequence(value) -> bool:
+    if isinstance(value, np.ndarray):
+        return value.dtype.kind in 'biuf'
+    if isinstance(value, (list, tuple)):
+        return all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in value)
+    return False
+
+
+def _to_arrays(data: Dict, columns: Optional[List[str]] = None) -> Dict:
+    result = {}
+    for key, value in data.items():
+        if _is_numeric_sequence(value):
+            if columns is None or key in columns:
+                result[key] = np.asarray(value, dtype=np.float64)
+        else:
+            result[key] = value
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Converter
+# ---------------------------------------------------------------------------
+
+def _json_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def build_trace_store(data_dir, out_dir=None, pattern: str = '*.pickle', verbose: bool = True) -> Path:
+    """
+    Convert every pickle under data_dir into a columnar store
+
+    The store is built in a temporary directory and swapped in atomically.
+
+    Args:
+        data_dir: Root with one sub-directory per dataset
+        out_dir: Store directory (default: data_dir/trace_store)
+        pattern: Glob pattern for trace files
+    """
+    data_dir = Path(os.path.abspath(data_dir))
+    out_dir = Path(os.path.abspath(out_dir)) if out_dir else data_dir / STORE_DIRNAME
+    tmp_dir = out_dir.with_name(f'.{out_dir.name}.tmp')
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    files = sorted(p for p in data_dir.rglob(pattern) if out_dir not in p.parents and tmp_dir not in p.parents)
+    column_files = {}
+    column_sizes = {}
+    traces = []
+    start = time.time()
+
+    try:
+        for i, path in enumerate(files):
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+                continue
+            if not isinstance(data, dict):
+                print(f"Skipping {path}: not a dict-of-lists trace")
+                continue
+
+            st = path.stat()
+            key = path.relative_to(data_dir).as_posix()
+            entry = {
+                'key': key,
+                'trace_name': data.get('trace_name', path.stem),
+                'dataset': path.parent.name,
+                'length': 0,
+                'source': {'size': st.st_size, 'mtime_ns': st.st_mtime_ns},
+                'columns': {},
+                'stats': {},
+                'attrs': {},
+            }
+
+            for name, value in data.items():
+                if _is_numeric_sequence(value):
+                    array = np.asarray(value, dtype=COLUMN_DTYPE)
+                    if name not in column_files:
+                        column_files[name] = open(tmp_dir / f'{name}.f64', 'wb')
+                        column_sizes[name] = 0
+                    column_files[name].write(array.tobytes())
+                    entry['columns'][name] = [column_sizes[name], int(array.size)]
+                    column_sizes[name] += int(array.size)
+                    entry['length'] = max(entry['length'], int(array.size))
+                    if array.size > 0:
+                        entry['stats'][name] = {
+                            'min': float(array.min()),
+                            'max': float(array.max()),
+                            'mean': float(array.mean()),
+                        }
+                elif _json_scalar(value):
+                    entry['attrs'][name] = value
+
+            traces.append(entry)
+            if verbose and (i + 1) % 100 == 0:
+                print(f"  converted {i + 1}/{len(files)} files...")
+    finally:
+        for f in column_files.values():
+            f.close()
+
+    index = {
+        'format_version': STORE_FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source_root': str(data_dir),
+        'columns': {name: COLUMN_DTYPE.str for name in column_files},
+        'traces': traces,
+    }
+    with open(tmp_dir / INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+
+    # Swap the new store in
+    old_dir = out_dir.with_name(f'.{out_dir.name}.old')
+    if out_dir.exists():
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    _OPEN_STORES.pop(str(out_dir), None)
+
+    if verbose:
+        total_rows = sum(t['length'] for t in traces)
+        size_mb = sum(p.stat().st_size for p in out_dir.iterdir()) / 1024**2
+        print(f"Converted {len(traces)} traces ({total_rows:,} rows, {size_mb:.1f} MB) "
+              f"to {out_dir} in {time.time() - start:.1f}s")
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar trace store for BC-GCC')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Convert pickles into a trace store')
+    build.add_argument('data_dir', nargs='?', default=None, help='Data directory (default: Config.DATA_DIR)')
+    build.add_argument('--out', default=None, help='Store directory (default: <data_dir>/trace_store)')
+
+    info = sub.add_parser('info', help='Summarize a trace store')
+    info.add_argument('store_dir', nargs='?', default=None)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        data_dir = args.data_dir
+        if data_dir is None:
+            from config import Config
+            data_dir = Config.DATA_DIR
+        build_trace_store(data_dir, args.out)
+
+    elif args.command == 'info':
+        store_dir = args.store_dir
+        if store_dir is None:
+            from config import Config
+            store_dir = Path(Config.DATA_DIR) / STORE_DIRNAME
+        store = TraceStore(store_dir)
+        print(f"Store: {store.root} (source: {store.source_root})")
+        print(f"Traces: {len(store)}, columns: {list(store.columns)}")
+        for dataset in store.datasets():
+            entries = [t for t in store.traces if t['dataset'] == dataset]
+            print(f"  {dataset:<15} {len(entries):>5} traces  {sum(t['length'] for t in entries):>10,} rows")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
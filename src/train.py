@@ -5,7 +5,7 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.tensorboard import SummaryWriter
-from torch.cuda.amp import autocast, GradScaler
+from torch.cuda.amp import GradScaler
 import numpy as np
 from pathlib import Path
 import time
@@ -13,9 +13,13 @@ from tqdm import tqdm
 import os
 import sys
 
-from config import Config
+from config import Config, config_to_dict
+from features import feature_layout
 from model import GCCBC_LSTM, CombinedLoss
-from dataset import create_dataloaders, normalize_features, denormalize_target
+from checkpoint import CheckpointManager, capture_rng_state, restore_rng_state, load_checkpoint_file
+from profiler import StageTimer, build_torch_profiler
+from dataset import (create_dataloaders, normalize_features, denormalize_target,
+                     TraceWindowDataset, LossAwareSampler, load_processed)
 from torch.utils.data import TensorDataset
 
 
@@ -48,8 +52,13 @@ class Trainer:
         # Create dataloaders (use preprocessed data if available)
         self.train_loader, self.val_loader, self.test_loader = self._create_dataloaders(config)
         
+        # Loss-aware hard-example mining replaces the uniform shuffle of the train loader
+        self.hard_sampler = None
+        if config.HARD_MINING:
+            self.train_loader, self.hard_sampler = self._hard_mining_loader(self.train_loader)
+        
         # Loss function
-        self.criterion = CombinedLoss().to(self.device)
+        self.criterion = CombinedLoss(config.MSE_WEIGHT, config.MAPE_WEIGHT).to(self.device)
         
         # Optimizer
         if config.OPTIMIZER == 'adam':
@@ -87,17 +96,45 @@ class Trainer:
         # Tensorboard writer
         self.writer = SummaryWriter(log_dir=config.LOG_DIR)
         
-        # Mixed precision training (for RTX 3090)
-        self.use_amp = config.USE_AMP and torch.cuda.is_available()
+        # Opt-in per-stage instrumentation
+        self.stage_timer = StageTimer(
+            enabled=config.PROFILE or config.PROFILE_TORCH,
+            device=self.device,
+            label_stages=config.PROFILE_TORCH,
+        )
+        
+        # Mixed precision training: fp16 + loss scaling on CUDA (for RTX 3090),
+        # bf16 on CPU (same exponent range as fp32, so no loss scaling)
+        self.use_amp = config.USE_AMP and self.device.type == 'cuda'
+        self.use_cpu_bf16 = config.USE_BF16_CPU and self.device.type == 'cpu'
+        self.autocast_dtype = torch.float16 if self.use_amp else torch.bfloat16
         self.scaler = GradScaler() if self.use_amp else None
         if self.use_amp:
             print("Using mixed precision training (AMP) for faster training on RTX 3090")
+        if self.use_cpu_bf16:
+            print("Using bfloat16 autocast on CPU")
+        
+        # Checkpoint writer (background thread, atomic rename, rotating window)
+        self.checkpoint_manager = CheckpointManager(
+            config.CHECKPOINT_DIR,
+            keep_last=config.CHECKPOINT_KEEP_LAST,
+            async_write=config.ASYNC_CHECKPOINT,
+        )
         
         # Training state
         self.current_epoch = 0
+        self.start_epoch = 0
         self.best_val_loss = float('inf')
         self.patience_counter = 0
         self.global_step = 0
+        self.epoch_samples = 0  # Samples trained on in the last epoch
+        self.history = []       # Per-validation metrics of this run
+        
+        # Resume full training state if requested
+        if config.RESUME_CHECKPOINT is not None:
+            if not Path(config.RESUME_CHECKPOINT).exists():
+                raise FileNotFoundError(f"RESUME_CHECKPOINT not found: {config.RESUME_CHECKPOINT}")
+            self.load_checkpoint(config.RESUME_CHECKPOINT, resume=True)
     
     def _create_dataloaders(self, config):
         """
@@ -111,19 +148,31 @@ class Trainer:
         val_path = processed_dir / 'val_tensors.pt'
         test_path = processed_dir / 'test_tensors.pt'
         
-        # Check if preprocessed data exists
-        if train_path.exists() and val_path.exists() and test_path.exists():
+        # Check if preprocessed data exists (fixed-window tensors must match WINDOW_SIZE and the feature layout)
+        tensor_files = [train_path, val_path, test_path]
+        train_data = None
+        if all(path.exists() for path in tensor_files):
+            train_data = load_processed(train_path)
+            window_size = train_data['features'].shape[1] if train_data['features'].dim() == 3 else None
+            if window_size != config.WINDOW_SIZE:
+                print(f"\nPreprocessed tensors use WINDOW_SIZE={window_size}, "
+                      f"config has {config.WINDOW_SIZE}; not using them")
+                train_data = None
+            elif train_data.get('feature_layout') != feature_layout(config):
+                print("\nPreprocessed tensors were built with a different (or unrecorded) feature layout "
+                      "than the config; not using them (rerun prepare_data.py)")
+                train_data = None
+        
+        if train_data is not None:
             print("\n" + "="*80)
             print("Found preprocessed data! Loading for fast training...")
             print("="*80)
             
             # Load preprocessed tensors
-            print(f"Loading train data from {train_path}...")
-            train_data = torch.load(train_path)
             print(f"Loading val data from {val_path}...")
-            val_data = torch.load(val_path)
+            val_data = load_processed(val_path)
             print(f"Loading test data from {test_path}...")
-            test_data = torch.load(test_path)
+            test_data = load_processed(test_path)
             
             # Create TensorDatasets
             train_dataset = TensorDataset(
@@ -180,18 +229,82 @@ class Trainer:
             
             return train_loader, val_loader, test_loader
         
-        else:
-            # Preprocessed data not found, use original method
-            print("\n" + "="*80)
-            print("Preprocessed data not found. Using original data loading...")
-            print("="*80)
-            print("\nTo enable fast training:")
-            print("  1. Run: python3 prepare_data.py")
-            print("  2. Wait for preprocessing (5-10 minutes)")
-            print("  3. Run training again for 10-15x speedup")
-            print("="*80 + "\n")
-            
-            return create_dataloaders(config)
+        trace_files = [processed_dir / f'{split}_traces.pt' for split in ('train', 'val', 'test')]
+        if all(path.exists() for path in trace_files):
+            return self._trace_dataloaders(config, trace_files)
+        
+        # Preprocessed data not found, use original method
+        print("\n" + "="*80)
+        print("Preprocessed data not found. Using original data loading...")
+        print("="*80)
+        print("\nTo enable fast training:")
+        print("  1. Run: python3 prepare_data.py  (or --per-trace for any WINDOW_SIZE)")
+        print("  2. Wait for preprocessing (5-10 minutes)")
+        print("  3. Run training again for 10-15x speedup")
+        print("="*80 + "\n")
+        
+        return create_dataloaders(config)
+    
+    def _trace_dataloaders(self, config, trace_files):
+        """DataLoaders over per-trace splits (prepare_data.py --per-trace), any WINDOW_SIZE"""
+        from torch.utils.data import DataLoader
+        
+        print("\n" + "="*80)
+        print(f"Found per-trace preprocessed data! Building windows of {config.WINDOW_SIZE} on the fly...")
+        print("="*80)
+        
+        loaders = []
+        for split, path in zip(('train', 'val', 'test'), trace_files):
+            mode = 'train' if split == 'train' else 'eval'
+            dataset = TraceWindowDataset(path, config, mode=mode)
+            print(f"  {split.capitalize():<5}: {len(dataset):,} samples ({len(dataset.files)} traces)")
+            # Windows are gathered per batch in the main process (__getitems__)
+            loaders.append(DataLoader(
+                dataset,
+                batch_size=config.BATCH_SIZE,
+                shuffle=(split == 'train'),
+                num_workers=0,
+                pin_memory=True if config.DEVICE == 'cuda' else False,
+            ))
+        print("="*80)
+        return tuple(loaders)
+    
+    def _hard_mining_loader(self, loader):
+        """Train loader drawing batches from a LossAwareSampler (HARD_MINING)"""
+        from torch.utils.data import DataLoader
+        
+        sampler = LossAwareSampler(len(loader.dataset), self.config.BATCH_SIZE, self.config, self.device)
+        print(f"Hard-example mining: alpha={self.config.HARD_MINING_ALPHA}, "
+              f"uniform share={self.config.HARD_MINING_UNIFORM}, beta={self.config.HARD_MINING_BETA}")
+        loader = DataLoader(
+            loader.dataset,
+            batch_sampler=sampler,
+            num_workers=loader.num_workers,
+            pin_memory=loader.pin_memory,
+            collate_fn=loader.collate_fn,
+        )
+        return loader, sampler
+    
+    def _training_loss(self, predictions, targets_normalized, weights):
+        """Batch loss; with hard mining, importance-weighted and fed back to the sampler"""
+        if self.hard_sampler is None:
+            return self.criterion(predictions, targets_normalized, weights)
+        indices, importance = self.hard_sampler.next_batch()
+        sample_losses = self.criterion(predictions, targets_normalized, weights, reduce=False)
+        self.hard_sampler.update(indices, sample_losses)
+        return (sample_losses * importance).mean()
+    
+    def _autocast(self, training=True):
+        """
+        Autocast context for forward passes
+        
+        CUDA fp16 AMP is used for training only; CPU bf16 also covers evaluation.
+        """
+        return torch.autocast(
+            device_type=self.device.type,
+            dtype=self.autocast_dtype,
+            enabled=self.use_cpu_bf16 or (training and self.use_amp),
+        )
     
     def _normalize_targets(self, targets):
         """Normalize targets (bandwidth) to [0, 1] range"""
@@ -212,50 +325,71 @@ class Trainer:
         total_loss = 0
         total_samples = 0
         
+        timer = self.stage_timer
+        timer.start_epoch()
+        
+        # torch.profiler traces cover the first epoch of this run only
+        torch_profiler = build_torch_profiler(self.config, self.device) if self.current_epoch == self.start_epoch else None
+        if torch_profiler is not None:
+            torch_profiler.start()
+        
         pbar = tqdm(self.train_loader, desc=f'Epoch {self.current_epoch+1}/{self.config.NUM_EPOCHS}')
         
-        for batch_idx, (features, targets, weights) in enumerate(pbar):
+        for batch_idx, (features, targets, weights) in enumerate(timer.iterate(pbar)):
             # Move to device
-            features = features.to(self.device)
-            targets = targets.to(self.device)
-            weights = weights.to(self.device)
+            with timer.stage('h2d'):
+                features = features.to(self.device)
+                targets = targets.to(self.device)
+                weights = weights.to(self.device)
             
             # Normalize features and targets to [0, 1] range
-            features = normalize_features(features, self.config)
-            targets_normalized = self._normalize_targets(targets)
+            with timer.stage('normalize'):
+                features = normalize_features(features, self.config)
+                targets_normalized = self._normalize_targets(targets)
             
             # Forward pass with mixed precision
             if self.use_amp:
-                with autocast():
-                    predictions, _ = self.model(features)
-                    loss = self.criterion(predictions, targets_normalized, weights)
+                with timer.stage('forward'):
+                    with self._autocast():
+                        predictions, _ = self.model(features)
+                        loss = self._training_loss(predictions, targets_normalized, weights)
                 
                 # Backward pass with gradient scaling
-                self.optimizer.zero_grad()
-                self.scaler.scale(loss).backward()
-                
-                # Gradient clipping (unscale first)
-                self.scaler.unscale_(self.optimizer)
-                torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                with timer.stage('backward'):
+                    self.optimizer.zero_grad()
+                    self.scaler.scale(loss).backward()
                 
-                # Update weights
-                self.scaler.step(self.optimizer)
-                self.scaler.update()
+                with timer.stage('optimizer'):
+                    # Gradient clipping (unscale first)
+                    self.scaler.unscale_(self.optimizer)
+                    torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                    
+                    # Update weights
+                    self.scaler.step(self.optimizer)
+                    self.scaler.update()
             else:
-                # Standard training (no AMP)
-                predictions, _ = self.model(features)
-                loss = self.criterion(predictions, targets_normalized, weights)
+                # Standard training (fp32, or bf16 autocast on CPU - no loss scaling)
+                with timer.stage('forward'):
+                    with self._autocast():
+                        predictions, _ = self.model(features)
+                    loss = self._training_loss(predictions.float(), targets_normalized, weights)
                 
-                self.optimizer.zero_grad()
-                loss.backward()
-                torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
-                self.optimizer.step()
+                with timer.stage('backward'):
+                    self.optimizer.zero_grad()
+                    loss.backward()
+                
+                with timer.stage('optimizer'):
+                    torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                    self.optimizer.step()
             
             # Update stats
             batch_size = features.size(0)
             total_loss += loss.item() * batch_size
             total_samples += batch_size
             self.global_step += 1
+            timer.count(batch_size)
+            if torch_profiler is not None:
+                torch_profiler.step()
             
             # Update progress bar
             pbar.set_postfix({
@@ -269,6 +403,14 @@ class Trainer:
                 self.writer.add_scalar('train/batch_loss', loss.item(), self.global_step)
                 self.writer.add_scalar('train/lr', self.optimizer.param_groups[0]['lr'], self.global_step)
         
+        if torch_profiler is not None:
+            torch_profiler.stop()
+        
+        timer.end_epoch()
+        timer.log_to_tensorboard(self.writer, self.current_epoch)
+        timer.print_summary()
+        
+        self.epoch_samples = total_samples
         avg_loss = total_loss / total_samples
         return avg_loss
     
@@ -296,7 +438,9 @@ class Trainer:
                 targets_normalized = self._normalize_targets(targets)
                 
                 # Forward pass
-                predictions, _ = self.model(features)
+                with self._autocast(training=False):
+                    predictions, _ = self.model(features)
+                predictions = predictions.float()
                 
                 # Compute loss (on normalized scale)
                 loss = self.criterion(predictions, targets_normalized, weights)
@@ -334,45 +478,80 @@ class Trainer:
         return avg_loss, avg_mae, avg_mape, r2
     
     def save_checkpoint(self, is_best=False):
-        """Save model checkpoint"""
+        """Save model checkpoint (written asynchronously by the checkpoint manager)"""
         checkpoint = {
             'epoch': self.current_epoch,
             'model_state_dict': self.model.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
+            'scheduler_state_dict': self.scheduler.state_dict() if self.scheduler is not None else None,
+            'scaler_state_dict': self.scaler.state_dict() if self.scaler is not None else None,
+            'rng_state': capture_rng_state(),
             'best_val_loss': self.best_val_loss,
-            'config': self.config,
+            'patience_counter': self.patience_counter,
+            'global_step': self.global_step,
+            'config': config_to_dict(self.config),
         }
+        if self.hard_sampler is not None:
+            checkpoint['hard_sampler_state_dict'] = self.hard_sampler.state_dict()
         
-        # Save latest checkpoint
-        checkpoint_path = Path(self.config.CHECKPOINT_DIR) / 'latest.pt'
-        torch.save(checkpoint, checkpoint_path)
-        
-        # Save best checkpoint
+        self.checkpoint_manager.save(checkpoint, epoch=self.current_epoch, is_best=is_best)
         if is_best:
-            best_path = Path(self.config.CHECKPOINT_DIR) / 'best.pt'
-            torch.save(checkpoint, best_path)
-            print(f"Saved best model (val_loss={self.best_val_loss:.4f})")
+            print(f"Queued best model for saving (val_loss={self.best_val_loss:.4f})")
     
-    def load_checkpoint(self, checkpoint_path):
-        """Load model checkpoint"""
-        checkpoint = torch.load(checkpoint_path, map_location=self.device)
+    def load_checkpoint(self, checkpoint_path, resume=False):
+        """
+        Load model checkpoint
+        
+        Args:
+            checkpoint_path: Path to checkpoint file
+            resume: Also restore scheduler, GradScaler, RNG states, counters and the
+                    hard-mining sampler so training continues exactly where it stopped
+        """
+        checkpoint = load_checkpoint_file(checkpoint_path, map_location=self.device)
         self.model.load_state_dict(checkpoint['model_state_dict'])
         self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
         self.current_epoch = checkpoint['epoch']
         self.best_val_loss = checkpoint['best_val_loss']
+        
+        if resume:
+            if self.scheduler is not None and checkpoint.get('scheduler_state_dict') is not None:
+                self.scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+            if self.scaler is not None and checkpoint.get('scaler_state_dict') is not None:
+                self.scaler.load_state_dict(checkpoint['scaler_state_dict'])
+            if checkpoint.get('rng_state') is not None:
+                restore_rng_state(checkpoint['rng_state'])
+            if self.hard_sampler is not None and checkpoint.get('hard_sampler_state_dict') is not None:
+                self.hard_sampler.load_state_dict(checkpoint['hard_sampler_state_dict'])
+            self.patience_counter = checkpoint.get('patience_counter', 0)
+            self.global_step = checkpoint.get('global_step', 0)
+            self.start_epoch = self.current_epoch + 1
+            print(f"Resuming training from epoch {self.start_epoch + 1}")
+        
         print(f"Loaded checkpoint from epoch {self.current_epoch}")
     
+    def target_reached(self, val_mae, val_r2):
+        """True when every configured target (TARGET_VAL_R2 / TARGET_VAL_MAE) is met"""
+        checks = []
+        if self.config.TARGET_VAL_R2 is not None:
+            checks.append(val_r2 >= self.config.TARGET_VAL_R2)
+        if self.config.TARGET_VAL_MAE is not None:
+            checks.append(val_mae <= self.config.TARGET_VAL_MAE)
+        return bool(checks) and all(checks)
+    
     def train(self):
         """Main training loop"""
         print("\n" + "="*80)
         print("Starting training...")
         print("="*80)
         
-        for epoch in range(self.config.NUM_EPOCHS):
+        start_time = time.perf_counter()
+        for epoch in range(self.start_epoch, self.config.NUM_EPOCHS):
             self.current_epoch = epoch
             
             # Train one epoch
+            epoch_start = time.perf_counter()
             train_loss = self.train_epoch()
+            epoch_time = time.perf_counter() - epoch_start
             
             # Validate
             if (epoch + 1) % self.config.VAL_INTERVAL == 0:
@@ -393,6 +572,18 @@ class Trainer:
                 print(f"  Val MAPE: {val_mape*100:.2f}%")
                 print(f"  Val R²: {val_r2:.4f}")
                 
+                self.history.append({
+                    'epoch': epoch + 1,
+                    'train_loss': float(train_loss),
+                    'val_loss': float(val_loss),
+                    'val_mae': float(val_mae),
+                    'val_mape': float(val_mape),
+                    'val_r2': float(val_r2),
+                    'train_samples': self.epoch_samples,
+                    'epoch_s': epoch_time,
+                    'elapsed_s': time.perf_counter() - start_time,
+                })
+                
                 # Learning rate scheduler
                 if self.scheduler is not None:
                     if self.config.SCHEDULER == 'plateau':
@@ -401,32 +592,39 @@ class Trainer:
                         self.scheduler.step()
                 
                 # Check if best model
-                if val_loss < self.best_val_loss:
+                is_best = val_loss < self.best_val_loss
+                if is_best:
                     self.best_val_loss = val_loss
                     self.patience_counter = 0
-                    self.save_checkpoint(is_best=True)
                 else:
                     self.patience_counter += 1
                 
-                # Save latest checkpoint
-                self.save_checkpoint(is_best=False)
+                # Save latest checkpoint (also written as best.pt on a new best)
+                self.save_checkpoint(is_best=is_best)
                 
                 # Early stopping
                 if self.patience_counter >= self.config.EARLY_STOPPING_PATIENCE:
                     print(f"\nEarly stopping triggered after {epoch+1} epochs")
                     break
+                
+                # Stop once the validation target is reached
+                if self.target_reached(val_mae, val_r2):
+                    print(f"\nValidation target reached after {epoch+1} epochs")
+                    break
         
         print("\n" + "="*80)
         print("Training completed!")
         print(f"Best validation loss: {self.best_val_loss:.4f}")
         print("="*80)
         
-        # Close writer
+        # Flush pending checkpoints and close writers
+        self.checkpoint_manager.close()
         self.writer.close()
     
     def test(self):
         """Test on test set"""
-        # Load best model
+        # Load best model (make sure background writes have landed first)
+        self.checkpoint_manager.wait()
         best_path = Path(self.config.CHECKPOINT_DIR) / 'best.pt'
         if best_path.exists():
             self.load_checkpoint(best_path)
@@ -455,7 +653,9 @@ class Trainer:
                 targets_normalized = self._normalize_targets(targets)
                 
                 # Forward pass
-                predictions, _ = self.model(features)
+                with self._autocast(training=False):
+                    predictions, _ = self.model(features)
+                predictions = predictions.float()
                 
                 # Compute loss (on normalized scale)
                 loss = self.criterion(predictions, targets_normalized, weights)
@@ -3,10 +3,22 @@
 Analyze scenario coverage for all datasets
 Focus on delay and loss ratio distribution
 """
-import pickle
+import argparse
 import numpy as np
 from pathlib import Path
 import sys
+import time
+
+from summary_cache import SummaryCache, map_cached
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from quantile_sketch import QuantileSketch  # noqa: E402
+from trace_store import load_trace  # noqa: E402
+
+DATASETS = ['ghent', 'norway', 'NY', 'opennetlab']
+
+# Default summary cache location, shared with plot_coverage.py
+CACHE_RELPATH = Path('.cache') / 'coverage_summaries.json'
 
 def analyze_dataset(directory):
     """Analyze a single dataset directory"""
@@ -23,8 +35,7 @@ def analyze_dataset(directory):
     
     for f in files:
         try:
-            with open(f, 'rb') as fp:
-                data = pickle.load(fp)
+            data = load_trace(f)
             
             if 'delay' not in data or len(data['delay']) == 0:
                 continue
@@ -106,6 +117,172 @@ def analyze_dataset(directory):
     
     return stats
 
+# ---------------------------------------------------------------------------
+# Cached / parallel mode: mergeable per-file summaries
+# ---------------------------------------------------------------------------
+
+SUMMARY_VERSION = 2
+
+# Relative error bound of merged percentiles (sketch memory stays bounded
+# no matter how many traces are added)
+SKETCH_ACCURACY = 0.005
+
+
+def _sketch(values):
+    return QuantileSketch(relative_accuracy=SKETCH_ACCURACY).add(values).to_dict()
+
+
+def _merged_sketch(summaries, group):
+    return QuantileSketch.merged(QuantileSketch.from_dict(s[group]['sketch']) for s in summaries)
+
+
+def summarize_file(path):
+    """Mergeable per-file coverage summary (runs in worker processes)"""
+    try:
+        data = load_trace(path, columns=['delay', 'loss_ratio', 'bandwidth_prediction'])
+    except Exception as e:
+        print(f"Error processing {path}: {e}")
+        return None
+
+    if 'delay' not in data or len(data['delay']) == 0:
+        return None
+
+    delays = np.asarray(data['delay'], dtype=np.float64)
+    losses = np.asarray(data['loss_ratio'], dtype=np.float64) if 'loss_ratio' in data else np.array([0.0])
+    bandwidths = np.asarray(data['bandwidth_prediction'], dtype=np.float64) if 'bandwidth_prediction' in data else np.array([0.0])
+
+    return {
+        'name': Path(path).name,
+        'samples': int(len(delays)),
+        'delay': {
+            'min': float(delays.min()),
+            'max': float(delays.max()),
+            'sum': float(delays.sum()),
+            'sumsq': float(np.dot(delays, delays)),
+            'low': int(np.sum(delays < 150)),
+            'mid': int(np.sum((delays >= 150) & (delays < 300))),
+            'high': int(np.sum(delays >= 300)),
+            'very_high': int(np.sum(delays >= 500)),
+            'sketch': _sketch(delays),
+        },
+        'loss': {
+            'count': int(len(losses)),
+            'min': float(losses.min()),
+            'max': float(losses.max()),
+            'sum': float(losses.sum()),
+            'zero': int(np.sum(losses == 0)),
+            'low': int(np.sum((losses > 0) & (losses <= 0.01))),
+            'mid': int(np.sum((losses > 0.01) & (losses <= 0.05))),
+            'high': int(np.sum(losses > 0.05)),
+            'very_high': int(np.sum(losses > 0.1)),
+            'nonzero': int(np.count_nonzero(losses)),
+            'sketch': _sketch(losses),
+        },
+        'bw': {
+            'count': int(len(bandwidths)),
+            'min': float(bandwidths.min()),
+            'max': float(bandwidths.max()),
+            'sum': float(bandwidths.sum()),
+            'sketch': _sketch(bandwidths),
+        },
+    }
+
+
+def merge_summaries(directory, summaries, num_files):
+    """Combine per-file summaries into the same stats dict analyze_dataset() returns"""
+    n = sum(s['samples'] for s in summaries)
+    n_loss = sum(s['loss']['count'] for s in summaries)
+    n_bw = sum(s['bw']['count'] for s in summaries)
+
+    def total(group, key):
+        return sum(s[group][key] for s in summaries)
+
+    delay_mean = total('delay', 'sum') / n
+    delay_var = max(total('delay', 'sumsq') / n - delay_mean ** 2, 0.0)
+    delay_sketch = _merged_sketch(summaries, 'delay')
+    loss_sketch = _merged_sketch(summaries, 'loss')
+    delay_median, delay_p95, delay_p99 = delay_sketch.quantiles([0.5, 0.95, 0.99])
+
+    file_stats = []
+    for s in summaries:
+        d = s['delay']
+        mean = d['sum'] / s['samples']
+        file_stats.append({
+            'name': s['name'],
+            'delay_min': d['min'],
+            'delay_max': d['max'],
+            'delay_mean': mean,
+            'delay_std': np.sqrt(max(d['sumsq'] / s['samples'] - mean ** 2, 0.0)),
+            'loss_max': s['loss']['max'],
+            'loss_mean': s['loss']['sum'] / s['loss']['count'],
+            'loss_nonzero_pct': s['loss']['nonzero'] / s['loss']['count'] * 100,
+            'samples': s['samples'],
+        })
+
+    return {
+        'dataset': directory,
+        'num_files': num_files,
+        'total_samples': n,
+
+        'delay_min': min(s['delay']['min'] for s in summaries),
+        'delay_max': max(s['delay']['max'] for s in summaries),
+        'delay_mean': delay_mean,
+        'delay_median': delay_median,
+        'delay_std': np.sqrt(delay_var),
+        'delay_p95': delay_p95,
+        'delay_p99': delay_p99,
+
+        'delay_low': total('delay', 'low') / n * 100,
+        'delay_mid': total('delay', 'mid') / n * 100,
+        'delay_high': total('delay', 'high') / n * 100,
+        'delay_very_high': total('delay', 'very_high') / n * 100,
+
+        'loss_min': min(s['loss']['min'] for s in summaries),
+        'loss_max': max(s['loss']['max'] for s in summaries),
+        'loss_mean': total('loss', 'sum') / n_loss,
+        'loss_median': loss_sketch.quantile(0.5),
+
+        'loss_zero': total('loss', 'zero') / n_loss * 100,
+        'loss_low': total('loss', 'low') / n_loss * 100,
+        'loss_mid': total('loss', 'mid') / n_loss * 100,
+        'loss_high': total('loss', 'high') / n_loss * 100,
+        'loss_very_high': total('loss', 'very_high') / n_loss * 100,
+
+        'bw_min': min(s['bw']['min'] for s in summaries) / 1e6,
+        'bw_max': max(s['bw']['max'] for s in summaries) / 1e6,
+        'bw_mean': total('bw', 'sum') / n_bw / 1e6,
+
+        'file_stats': file_stats,
+        'sketches': {
+            'delay': delay_sketch,
+            'loss': loss_sketch,
+            'bw': _merged_sketch(summaries, 'bw'),
+        },
+    }
+
+
+def analyze_dataset_cached(directory, cache=None, workers=None):
+    """
+    Cached, parallel variant of analyze_dataset()
+
+    Per-file summaries are computed in a process pool and cached; only new or
+    modified files are re-read. Median/p95/p99 come from merged quantile
+    sketches (relative error <= SKETCH_ACCURACY) instead of materializing
+    every value.
+    """
+    files = sorted(Path(directory).glob('*.pickle'))
+    if not files:
+        return None
+
+    summaries, computed = map_cached(files, summarize_file, cache=cache, workers=workers)
+    summaries = [s for s in summaries if s is not None]
+    print(f"  {len(files)} files ({computed} summarized, {len(files) - computed} from cache)")
+
+    if not summaries:
+        return None
+    return merge_summaries(directory, summaries, len(files))
+
+
 def print_dataset_summary(stats):
     """Print summary for a dataset"""
     print(f"\n{'='*80}")
@@ -191,6 +368,18 @@ def print_overall_coverage(all_stats):
     print(f"High delay samples (>300ms): {total_delay_high:.2f}%")
     print(f"Non-zero loss samples: {total_loss_nonzero:.2f}%")
     
+    # Corpus-level percentiles (cached mode: merged from per-dataset sketches)
+    if all('sketches' in s for s in all_stats):
+        delay = QuantileSketch.merged(s['sketches']['delay'] for s in all_stats)
+        loss = QuantileSketch.merged(s['sketches']['loss'] for s in all_stats)
+        bw = QuantileSketch.merged(s['sketches']['bw'] for s in all_stats)
+        d50, d95, d99 = delay.quantiles([0.5, 0.95, 0.99])
+        l50, l95, l99 = loss.quantiles([0.5, 0.95, 0.99])
+        b50, b95, b99 = bw.quantiles([0.5, 0.95, 0.99])
+        print(f"Delay  p50/p95/p99: {d50:.1f} / {d95:.1f} / {d99:.1f} ms")
+        print(f"Loss   p50/p95/p99: {l50*100:.4f}% / {l95*100:.4f}% / {l99*100:.4f}%")
+        print(f"BW     p50/p95/p99: {b50/1e6:.2f} / {b95/1e6:.2f} / {b99/1e6:.2f} Mbps")
+    
     # Coverage assessment
     print(f"\n--- COVERAGE ASSESSMENT ---")
     
@@ -219,8 +408,20 @@ def print_overall_coverage(all_stats):
             print(f"  • {rec}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Analyze delay/loss coverage of all datasets')
+    parser.add_argument('--data-dir', default=None, help='Data directory (default: data/ or ../data/)')
+    parser.add_argument('--exact', action='store_true',
+                        help='Serial mode: load every value and compute exact percentiles (no cache)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--cache', default=None, help='Summary cache file (default: <data-dir>/.cache/coverage_summaries.json)')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute all summaries')
+    parser.add_argument('--hash', action='store_true', help='Validate cache entries by content hash, not just mtime')
+    args = parser.parse_args()
+
     # Check if running from tools/ or root directory
-    if Path('data').exists():
+    if args.data_dir is not None:
+        data_dir = args.data_dir
+    elif Path('data').exists():
         data_dir = 'data'
     elif Path('../data').exists():
         data_dir = '../data'
@@ -228,9 +429,15 @@ def main():
         print("Error: Cannot find data directory")
         return
     
-    datasets = ['ghent', 'norway', 'NY', 'opennetlab']
+    datasets = DATASETS
+    
+    cache = None
+    if not args.exact and not args.no_cache:
+        cache_path = args.cache or Path(data_dir) / CACHE_RELPATH
+        cache = SummaryCache(cache_path, version=SUMMARY_VERSION, use_hash=args.hash)
     
     all_stats = []
+    start = time.perf_counter()
     
     for dataset in datasets:
         dataset_path = Path(data_dir) / dataset
@@ -239,7 +446,12 @@ def main():
             continue
         
         print(f"\nAnalyzing {dataset}...")
-        stats = analyze_dataset(str(dataset_path))
+        if args.exact:
+            stats = analyze_dataset(str(dataset_path))
+        else:
+            stats = analyze_dataset_cached(str(dataset_path), cache=cache, workers=args.workers)
+            if cache is not None:
+                cache.save()
         
         if stats:
             all_stats.append(stats)
@@ -249,6 +461,7 @@ def main():
     
     if all_stats:
         print_overall_coverage(all_stats)
+        print(f"\nAnalysis time: {time.perf_counter() - start:.2f}s")
     else:
         print("No data found!")
 
@@ -3,100 +3,161 @@
 WebRTC GCC数据分析工具
 提供统计分析、数据对比和可视化功能
 """
-import pickle
 import sys
 import os
 from pathlib import Path
 import numpy as np
 
+from cli_args import pop_flag, pop_option
+from summary_cache import SummaryCache, map_cached
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from quantile_sketch import QuantileSketch  # noqa: E402
+from trace_store import load_trace  # noqa: E402
+
 def load_pickle(file_path):
-    """加载pickle文件"""
+    """加载trace (有列式存储时直接从trace_store读取, 否则读pickle)"""
     try:
-        with open(file_path, 'rb') as f:
-            return pickle.load(f)
+        return load_trace(file_path)
     except Exception as e:
         print(f"错误: 无法读取文件 {file_path}: {e}")
         return None
 
-def analyze_file(file_path):
-    """分析单个文件的统计信息"""
+ANALYZE_METRICS = {
+    'bandwidth_prediction': '带宽预测 (bps)',
+    'sending_rate': '发送速率 (bps)',
+    'receiving_rate': '接收速率 (bps)',
+    'delay': '延迟 (ms)',
+    'loss_ratio': '丢包率'
+}
+
+def file_statistics(file_path):
+    """计算单个文件的全部统计量, 返回扁平字典 (一文件一行); 读取失败返回None"""
     data = load_pickle(file_path)
     if data is None:
-        return
-    
-    print(f"\n{'='*80}")
-    print(f"文件分析: {file_path}")
-    print(f"{'='*80}\n")
-    
-    if 'trace_name' in data:
-        print(f"跟踪名称: {data['trace_name']}")
-    
-    print(f"\n数据点数量: {len(data.get('bandwidth_prediction', []))}")
+        return None
     
-    # 分析每个指标
-    metrics = {
-        'bandwidth_prediction': '带宽预测 (bps)',
-        'sending_rate': '发送速率 (bps)',
-        'receiving_rate': '接收速率 (bps)',
-        'delay': '延迟 (ms)',
-        'loss_ratio': '丢包率'
+    path = Path(file_path)
+    stats = {
+        'file': str(file_path),
+        'dataset': path.parent.name,
+        'trace_name': data.get('trace_name', path.stem),
+        'num_points': len(data.get('bandwidth_prediction', [])),
     }
     
-    print(f"\n{'指标':<20} {'最小值':<15} {'最大值':<15} {'平均值':<15} {'中位数':<15}")
-    print('-' * 80)
-    
-    for key, label in metrics.items():
+    # 各指标的最小/最大/平均/中位数
+    for key in ANALYZE_METRICS:
         if key in data and len(data[key]) > 0:
-            values = np.array(data[key])
-            min_val = np.min(values)
-            max_val = np.max(values)
-            mean_val = np.mean(values)
-            median_val = np.median(values)
-            
-            print(f"{label:<20} {min_val:<15.2f} {max_val:<15.2f} {mean_val:<15.2f} {median_val:<15.2f}")
-    
-    # 带宽利用率分析
+            values = np.asarray(data[key], dtype=np.float64)
+            stats[f'{key}_min'] = float(np.min(values))
+            stats[f'{key}_max'] = float(np.max(values))
+            stats[f'{key}_mean'] = float(np.mean(values))
+            stats[f'{key}_median'] = float(np.median(values))
+    
+    # 带宽利用率 (%)
     if 'bandwidth_prediction' in data and 'sending_rate' in data:
-        bw_pred = np.array(data['bandwidth_prediction'])
-        send_rate = np.array(data['sending_rate'])
+        bw_pred = np.asarray(data['bandwidth_prediction'], dtype=np.float64)
+        send_rate = np.asarray(data['sending_rate'], dtype=np.float64)
         
         # 避免除零
         bw_pred_safe = np.where(bw_pred > 0, bw_pred, 1)
         utilization = (send_rate / bw_pred_safe) * 100
-        
+        if utilization.size > 0:
+            stats['utilization_mean'] = float(np.mean(utilization))
+            stats['utilization_median'] = float(np.median(utilization))
+            stats['utilization_max'] = float(np.max(utilization))
+            stats['utilization_min'] = float(np.min(utilization))
+    
+    # 延迟和丢包
+    if 'delay' in data and len(data['delay']) > 0:
+        delays = np.asarray(data['delay'], dtype=np.float64)
+        stats['delay_std'] = float(np.std(delays))
+        stats['delay_p99'] = float(np.percentile(delays, 99))
+    
+    if 'loss_ratio' in data and len(data['loss_ratio']) > 0:
+        losses = np.asarray(data['loss_ratio'], dtype=np.float64)
+        stats['loss_nonzero'] = int(np.count_nonzero(losses))
+        stats['loss_count'] = int(losses.size)
+    
+    return stats
+
+def print_file_statistics(stats):
+    """以表格形式打印 file_statistics 的结果"""
+    print(f"\n{'='*80}")
+    print(f"文件分析: {stats['file']}")
+    print(f"{'='*80}\n")
+    
+    if stats.get('trace_name'):
+        print(f"跟踪名称: {stats['trace_name']}")
+    
+    print(f"\n数据点数量: {stats['num_points']}")
+    
+    print(f"\n{'指标':<20} {'最小值':<15} {'最大值':<15} {'平均值':<15} {'中位数':<15}")
+    print('-' * 80)
+    
+    for key, label in ANALYZE_METRICS.items():
+        if f'{key}_min' in stats:
+            print(f"{label:<20} {stats[f'{key}_min']:<15.2f} {stats[f'{key}_max']:<15.2f} "
+                  f"{stats[f'{key}_mean']:<15.2f} {stats[f'{key}_median']:<15.2f}")
+    
+    if 'utilization_mean' in stats:
         print(f"\n带宽利用率统计:")
-        print(f"  平均利用率: {np.mean(utilization):.2f}%")
-        print(f"  中位数利用率: {np.median(utilization):.2f}%")
-        print(f"  最大利用率: {np.max(utilization):.2f}%")
-        print(f"  最小利用率: {np.min(utilization):.2f}%")
-    
-    # 延迟和丢包分析
-    if 'delay' in data:
-        delays = np.array(data['delay'])
+        print(f"  平均利用率: {stats['utilization_mean']:.2f}%")
+        print(f"  中位数利用率: {stats['utilization_median']:.2f}%")
+        print(f"  最大利用率: {stats['utilization_max']:.2f}%")
+        print(f"  最小利用率: {stats['utilization_min']:.2f}%")
+    
+    if 'delay_std' in stats:
         print(f"\n延迟分析:")
-        print(f"  标准差: {np.std(delays):.2f} ms")
-        print(f"  99th百分位: {np.percentile(delays, 99):.2f} ms")
-        
-    if 'loss_ratio' in data:
-        losses = np.array(data['loss_ratio'])
+        print(f"  标准差: {stats['delay_std']:.2f} ms")
+        print(f"  99th百分位: {stats['delay_p99']:.2f} ms")
+    
+    if 'loss_count' in stats:
         print(f"\n丢包分析:")
-        print(f"  平均丢包率: {np.mean(losses)*100:.4f}%")
-        print(f"  最大丢包率: {np.max(losses)*100:.4f}%")
-        print(f"  非零丢包点数: {np.count_nonzero(losses)}/{len(losses)}")
+        print(f"  平均丢包率: {stats['loss_ratio_mean']*100:.4f}%")
+        print(f"  最大丢包率: {stats['loss_ratio_max']*100:.4f}%")
+        print(f"  非零丢包点数: {stats['loss_nonzero']}/{stats['loss_count']}")
 
-def compare_files(file_paths):
+def analyze_file(file_path):
+    """分析单个文件的统计信息"""
+    stats = file_statistics(file_path)
+    if stats is not None:
+        print_file_statistics(stats)
+    return stats
+
+def analyze_files(file_paths, workers=None):
+    """并行计算多个文件的统计量 (workers<=1 时串行), 保持输入顺序, 跳过读取失败的文件"""
+    results, _ = map_cached(file_paths, file_statistics, cache=None, workers=workers)
+    return [r for r in results if r is not None]
+
+def write_results(rows, output_path):
+    """结果写入JSON或CSV (按扩展名), 每个文件一行"""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.suffix == '.csv':
+        import csv
+        fieldnames = []
+        for row in rows:
+            fieldnames.extend(k for k in row if k not in fieldnames)
+        with open(output_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        import json
+        with open(output_path, 'w') as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已写入: {output_path} ({len(rows)} 行)")
+
+def compare_files(file_paths, workers=None, output_path=None):
     """对比多个文件"""
     print(f"\n{'='*80}")
     print(f"对比 {len(file_paths)} 个文件")
     print(f"{'='*80}\n")
     
-    all_data = []
-    for fp in file_paths:
-        data = load_pickle(fp)
-        if data:
-            all_data.append((Path(fp).name, data))
+    all_stats = analyze_files(file_paths, workers=workers)
     
-    if not all_data:
+    if not all_stats:
         print("没有可用的数据进行对比")
         return
     
@@ -104,12 +165,17 @@ def compare_files(file_paths):
     print(f"{'文件名':<50} {'平均延迟(ms)':<15} {'平均丢包率(%)':<15} {'平均带宽(Mbps)':<15}")
     print('-' * 95)
     
-    for name, data in all_data:
-        avg_delay = np.mean(data.get('delay', [0])) if 'delay' in data else 0
-        avg_loss = np.mean(data.get('loss_ratio', [0])) * 100 if 'loss_ratio' in data else 0
-        avg_bw = np.mean(data.get('bandwidth_prediction', [0])) / 1e6 if 'bandwidth_prediction' in data else 0
+    for stats in all_stats:
+        name = Path(stats['file']).name
+        avg_delay = stats.get('delay_mean', 0)
+        avg_loss = stats.get('loss_ratio_mean', 0) * 100
+        avg_bw = stats.get('bandwidth_prediction_mean', 0) / 1e6
         
         print(f"{name:<50} {avg_delay:<15.2f} {avg_loss:<15.4f} {avg_bw:<15.2f}")
+    
+    if output_path:
+        write_results(all_stats, output_path)
+    return all_stats
 
 def export_to_csv(file_path, output_path=None):
     """导出pickle数据到CSV文件"""
@@ -150,19 +216,249 @@ def export_to_csv(file_path, output_path=None):
     except Exception as e:
         print(f"导出失败: {e}")
 
+# 批量导出: 按列向量化, 多进程并行, 每行附带 dataset / trace 列
+EXPORT_COLUMNS = ['bandwidth_prediction', 'sending_rate', 'receiving_rate', 'delay', 'loss_ratio']
+EXPORT_HEADER = ['dataset', 'trace', 'index'] + EXPORT_COLUMNS
+
+def _export_arrays(file_path):
+    """读取单个文件, 返回 (dataset, trace, 行数, {列: float64数组, 缺失补NaN})"""
+    data = load_pickle(file_path)
+    if data is None or not isinstance(data, dict):
+        return None
+    num_rows = max((len(data[k]) for k in EXPORT_COLUMNS if k in data), default=0)
+    columns = {}
+    for key in EXPORT_COLUMNS:
+        values = np.full(num_rows, np.nan)
+        if key in data:
+            src = np.asarray(data[key], dtype=np.float64)
+            values[:src.size] = src
+        columns[key] = values
+    path = Path(file_path)
+    return path.parent.name, str(data.get('trace_name', path.stem)), num_rows, columns
+
+def _quote_csv_field(value):
+    """按CSV规则给含逗号/引号/换行的字段加引号"""
+    if any(ch in value for ch in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def _export_block(file_path, fmt):
+    """工作进程: CSV返回文本块, Parquet返回列数组"""
+    result = _export_arrays(file_path)
+    if result is None or fmt != 'csv':
+        return result
+    dataset, trace, num_rows, columns = result
+    if num_rows == 0:
+        return dataset, trace, 0, ''
+    # 每列整体转成字符串 (float的repr, 与csv模块输出一致), 缺失值写空串
+    prefix = f"{_quote_csv_field(dataset)},{_quote_csv_field(trace)},"
+    text_columns = [[prefix + str(i) for i in range(num_rows)]]
+    for key in EXPORT_COLUMNS:
+        values = columns[key]
+        text = list(map(repr, values.tolist()))
+        for i in np.flatnonzero(np.isnan(values)).tolist():
+            text[i] = ''
+        text_columns.append(text)
+    block = '\n'.join(map(','.join, zip(*text_columns))) + '\n'
+    return dataset, trace, num_rows, block
+
+def bulk_export(paths, output, fmt=None, per_dataset=False, workers=None):
+    """
+    将整个数据集/语料库导出为CSV或Parquet
+
+    Args:
+        paths: 目录或文件列表 (目录递归查找 *.pickle)
+        output: 输出文件; per_dataset=True 时为输出目录 (每个数据集一个文件)
+        fmt: 'csv' / 'parquet' (默认按扩展名, 其次csv)
+        per_dataset: 每个数据集单独一个文件
+        workers: 进程数 (默认 CPU 核数)
+    """
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    files = collect_pickle_files(paths)
+    if not files:
+        print("没有找到pickle文件")
+        return None
+
+    if fmt is None:
+        fmt = 'parquet' if str(output).endswith('.parquet') else 'csv'
+    if fmt == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("错误: 导出Parquet需要pyarrow (pip install pyarrow), 或使用 --format csv")
+            return None
+
+    output = Path(output)
+    if per_dataset:
+        output.mkdir(parents=True, exist_ok=True)
+    else:
+        output.parent.mkdir(parents=True, exist_ok=True)
+
+    start = time.time()
+    workers = os.cpu_count() if workers is None else workers
+    worker_fn = partial(_export_block, fmt=fmt)
+    if workers > 1 and len(files) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(files)))
+        blocks = executor.map(worker_fn, [str(f) for f in files],
+                              chunksize=max(1, len(files) // (workers * 4)))
+    else:
+        executor = None
+        blocks = map(worker_fn, [str(f) for f in files])
+
+    writers = {}
+    written = {}
+    total_rows = 0
+
+    def get_writer(dataset):
+        key = dataset if per_dataset else None
+        if key not in writers:
+            path = output / f"{dataset}.{fmt}" if per_dataset else output
+            if fmt == 'csv':
+                writers[key] = open(path, 'w', newline='')
+                writers[key].write(','.join(EXPORT_HEADER) + '\n')
+            else:
+                schema = pa.schema([('dataset', pa.string()), ('trace', pa.string()), ('index', pa.int64())]
+                                   + [(k, pa.float64()) for k in EXPORT_COLUMNS])
+                writers[key] = pq.ParquetWriter(str(path), schema)
+            written[key] = path
+        return writers[key]
+
+    try:
+        for block in blocks:
+            if block is None:
+                continue
+            dataset, trace, num_rows, payload = block
+            writer = get_writer(dataset)
+            if num_rows == 0:
+                continue
+            if fmt == 'csv':
+                writer.write(payload)
+            else:
+                writer.write_table(pa.table({
+                    'dataset': pa.array([dataset] * num_rows, pa.string()),
+                    'trace': pa.array([trace] * num_rows, pa.string()),
+                    'index': pa.array(np.arange(num_rows, dtype=np.int64)),
+                    **{k: pa.array(payload[k], from_pandas=True) for k in EXPORT_COLUMNS},
+                }))
+            total_rows += num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.time() - start
+    print(f"\n成功导出 {len(files)} 个文件, 共 {total_rows:,} 行, 耗时 {elapsed:.2f}s")
+    for path in written.values():
+        print(f"  {path}")
+    return list(written.values())
+
+# 分位数草图: 每个文件一个可合并草图, 再合并成数据集/语料库视图
+SKETCH_VERSION = 1
+SKETCH_METRICS = {
+    'delay': '延迟 (ms)',
+    'loss_ratio': '丢包率',
+    'receiving_rate': '接收速率 (bps)',
+    'bandwidth_prediction': '带宽预测 (bps)',
+}
+
+def sketch_file(file_path):
+    """为单个文件的各指标构建分位数草图 (在工作进程中运行)"""
+    data = load_pickle(file_path)
+    if data is None:
+        return None
+    return {
+        key: QuantileSketch().add(np.asarray(data[key], dtype=np.float64)).to_dict()
+        for key in SKETCH_METRICS
+        if key in data and len(data[key]) > 0
+    }
+
+def collect_pickle_files(paths):
+    """展开目录参数 (递归查找 *.pickle)"""
+    files = []
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            files.extend(sorted(path.rglob('*.pickle')))
+        elif path.exists():
+            files.append(path)
+    return files
+
+def print_sketch_table(title, sketches):
+    print(f"\n{title}")
+    print(f"{'指标':<20} {'样本数':<12} {'中位数':<15} {'P95':<15} {'P99':<15} {'最大值':<15}")
+    print('-' * 92)
+    for key, label in SKETCH_METRICS.items():
+        if key not in sketches:
+            continue
+        sk = sketches[key]
+        p50, p95, p99 = sk.quantiles([0.5, 0.95, 0.99])
+        print(f"{label:<20} {sk.count:<12} {p50:<15.4f} {p95:<15.4f} {p99:<15.4f} {sk.max:<15.4f}")
+
+def corpus_quantiles(paths, workers=None, cache_path=None):
+    """按 文件 -> 数据集 -> 语料库 合并分位数草图并打印 (内存有界, 误差 <= 1%)"""
+    files = collect_pickle_files(paths)
+    if not files:
+        print("没有找到pickle文件")
+        return None
+    
+    if cache_path is None:
+        common = Path(os.path.commonpath([str(f.resolve().parent) for f in files]))
+        cache_path = common / '.cache' / 'quantile_sketches.json'
+    cache = SummaryCache(cache_path, version=SKETCH_VERSION)
+    
+    summaries, computed = map_cached(files, sketch_file, cache=cache, workers=workers)
+    cache.save()
+    print(f"\n共 {len(files)} 个文件 (新计算 {computed} 个, 缓存 {len(files) - computed} 个)")
+    
+    # 按数据集 (父目录) 分组合并
+    by_dataset = {}
+    for f, summary in zip(files, summaries):
+        if summary is None:
+            continue
+        group = by_dataset.setdefault(f.parent.name, {})
+        for key, payload in summary.items():
+            group.setdefault(key, []).append(QuantileSketch.from_dict(payload))
+    
+    dataset_views = {
+        name: {key: QuantileSketch.merged(sks) for key, sks in group.items()}
+        for name, group in sorted(by_dataset.items())
+    }
+    for name, sketches in dataset_views.items():
+        print_sketch_table(f"数据集: {name}", sketches)
+    
+    corpus_view = {}
+    for sketches in dataset_views.values():
+        for key, sk in sketches.items():
+            corpus_view.setdefault(key, []).append(sk)
+    corpus_view = {key: QuantileSketch.merged(sks) for key, sks in corpus_view.items()}
+    if len(dataset_views) > 1:
+        print_sketch_table("语料库 (全部数据集)", corpus_view)
+    
+    return dataset_views, corpus_view
+
 def main():
     if len(sys.argv) < 2:
         print("WebRTC GCC数据分析工具")
         print("\n使用方法:")
         print(f"  {sys.argv[0]} analyze <文件>        # 分析单个文件")
-        print(f"  {sys.argv[0]} compare <文件1> <文件2> ...  # 对比多个文件")
+        print(f"  {sys.argv[0]} compare <文件1> <文件2> ... [--workers N] [--out 结果.json|.csv]  # 对比多个文件")
         print(f"  {sys.argv[0]} export <文件> [输出.csv]     # 导出为CSV")
-        print(f"  {sys.argv[0]} batch-analyze <目录>   # 批量分析目录中的所有文件")
+        print(f"  {sys.argv[0]} batch-analyze <目录> [--workers N] [--out 结果.json|.csv] [--quiet]  # 批量分析目录中的所有文件")
+        print(f"  {sys.argv[0]} export-all <目录或文件> ... --out <输出.csv|.parquet> [--per-dataset] [--workers N]  # 批量导出整个数据集/语料库")
+        print(f"  {sys.argv[0]} quantiles <目录或文件> ... [--workers N]  # 数据集/语料库分位数 (草图合并)")
         print("\n示例:")
         print(f"  {sys.argv[0]} analyze ghent/rates_delay_loss_gcc_report_bicycle_0001.pickle")
         print(f"  {sys.argv[0]} compare ghent/*.pickle")
         print(f"  {sys.argv[0]} export ghent/rates_delay_loss_gcc_report_bicycle_0001.pickle")
         print(f"  {sys.argv[0]} batch-analyze ghent/")
+        print(f"  {sys.argv[0]} batch-analyze data/ --out reports/nightly.csv --quiet")
+        print(f"  {sys.argv[0]} export-all data/ghent data/NY --out exports/corpus.parquet")
+        print(f"  {sys.argv[0]} quantiles data/ghent data/NY")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -174,10 +470,13 @@ def main():
         analyze_file(sys.argv[2])
     
     elif command == 'compare':
-        if len(sys.argv) < 3:
+        args = sys.argv[2:]
+        workers = pop_option(args, '--workers')
+        output = pop_option(args, '--out')
+        if not args:
             print("错误: 需要至少一个文件路径")
             sys.exit(1)
-        compare_files(sys.argv[2:])
+        compare_files(args, workers=int(workers) if workers else None, output_path=output)
     
     elif command == 'export':
         if len(sys.argv) < 3:
@@ -186,16 +485,46 @@ def main():
         output = sys.argv[3] if len(sys.argv) > 3 else None
         export_to_csv(sys.argv[2], output)
     
+    elif command == 'export-all':
+        args = sys.argv[2:]
+        per_dataset = pop_flag(args, '--per-dataset')
+        output = pop_option(args, '--out', 'gcc_export' if per_dataset else 'gcc_export.csv')
+        fmt = pop_option(args, '--format')
+        workers = pop_option(args, '--workers')
+        if not args:
+            print("错误: 需要至少一个目录或文件路径")
+            sys.exit(1)
+        bulk_export(args, output, fmt=fmt, per_dataset=per_dataset,
+                    workers=int(workers) if workers else None)
+    
     elif command == 'batch-analyze':
-        if len(sys.argv) < 3:
+        args = sys.argv[2:]
+        workers = pop_option(args, '--workers')
+        output = pop_option(args, '--out')
+        quiet = pop_flag(args, '--quiet')
+        if not args:
             print("错误: 需要指定目录路径")
             sys.exit(1)
-        directory = sys.argv[2]
+        directory = args[0]
         pickle_files = sorted(Path(directory).glob('*.pickle'))
+        if not pickle_files:
+            pickle_files = sorted(Path(directory).rglob('*.pickle'))
         print(f"\n在 {directory} 中找到 {len(pickle_files)} 个文件")
-        for pf in pickle_files:
-            analyze_file(str(pf))
-            print("\n")
+        all_stats = analyze_files(pickle_files, workers=int(workers) if workers else None)
+        if not quiet:
+            for stats in all_stats:
+                print_file_statistics(stats)
+                print("\n")
+        if output:
+            write_results(all_stats, output)
+    
+    elif command == 'quantiles':
+        args = sys.argv[2:]
+        workers = pop_option(args, '--workers')
+        if not args:
+            print("错误: 需要至少一个目录或文件路径")
+            sys.exit(1)
+        corpus_quantiles(args, workers=int(workers) if workers else None)
     
     else:
         print(f"未知命令: {command}")
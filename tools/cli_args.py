@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Minimal option parsing shared by the sys.argv-driven tools
+
+The tools dispatch on a positional command and pull their few options out of
+the argument list before reading the positional arguments.
+"""
+import sys
+
+
+def pop_option(args, flag, default=None):
+    """Remove `flag value` from an argument list and return value (or default)"""
+    if flag not in args:
+        return default
+    i = args.index(flag)
+    if i + 1 >= len(args) or args[i + 1].startswith('--'):
+        print(f"Error: {flag} requires a value")
+        sys.exit(1)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+
+def pop_flag(args, flag):
+    """Remove a boolean switch from an argument list and return whether it was given"""
+    if flag in args:
+        args.remove(flag)
+        return True
+    return False
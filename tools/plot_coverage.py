@@ -1,40 +1,89 @@
 #!/usr/bin/env python3
 """
 Visualize dataset coverage
+
+All numbers are computed from the traces through analyze_coverage's cached
+per-file summaries (shared cache in <data-dir>/.cache/coverage_summaries.json),
+so regenerating the figures only re-reads new or modified files:
+
+    python tools/plot_coverage.py [--data-dir data] [--out-dir reports]
 """
+import argparse
+import re
+import time
+from pathlib import Path
+
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
 
-def plot_coverage_summary():
-    """Create comprehensive coverage visualization"""
-    
+from analyze_coverage import CACHE_RELPATH, DATASETS, SUMMARY_VERSION, analyze_dataset_cached
+from summary_cache import SummaryCache
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PALETTE = ['#3498db', '#2ecc71', '#e74c3c', '#f39c12', '#9b59b6', '#1abc9c', '#34495e', '#e67e22']
+
+
+def short_name(file_name):
+    """'rates_delay_loss_gcc_report_4G_3mbps.pickle' -> '4G_3mbps'"""
+    stem = Path(file_name).stem
+    return re.sub(r'^rates_delay_loss_gcc_(report_)?', '', stem)
+
+
+def collect_coverage(data_dir, datasets=None, cache_path=None, use_cache=True, workers=None):
+    """Coverage stats (analyze_coverage.merge_summaries format) for each dataset with data"""
+    data_dir = Path(data_dir)
+    cache = None
+    if use_cache:
+        cache = SummaryCache(cache_path or data_dir / CACHE_RELPATH, version=SUMMARY_VERSION)
+
+    all_stats = []
+    for dataset in datasets or DATASETS:
+        dataset_path = data_dir / dataset
+        if not dataset_path.exists():
+            print(f"Warning: Directory {dataset_path} not found, skipping...")
+            continue
+        print(f"{dataset}:", end='')
+        stats = analyze_dataset_cached(str(dataset_path), cache=cache, workers=workers)
+        if stats:
+            stats['name'] = dataset
+            all_stats.append(stats)
+    if cache is not None:
+        cache.save()
+    return all_stats
+
+
+def plot_coverage_summary(all_stats, out_dir='reports', dpi=300):
+    """Create comprehensive coverage visualization from collect_coverage() stats"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
     fig = plt.figure(figsize=(16, 12))
-    
+
     # Dataset information
-    datasets = ['ghent', 'norway', 'NY', 'opennetlab']
-    samples = [90202, 322515, 481200, 3992]
-    files = [40, 59, 25, 9]
-    
+    datasets = [s['name'] for s in all_stats]
+    samples = [s['total_samples'] for s in all_stats]
+    files = [s['num_files'] for s in all_stats]
+
     # Delay distribution (%)
-    delay_low = [89.87, 37.61, 35.65, 68.06]
-    delay_mid = [5.29, 15.46, 22.75, 17.36]
-    delay_high = [4.85, 46.93, 41.60, 14.58]
-    
+    delay_low = [s['delay_low'] for s in all_stats]
+    delay_mid = [s['delay_mid'] for s in all_stats]
+    delay_high = [s['delay_high'] for s in all_stats]
+
     # Loss distribution (%)
-    loss_zero = [99.49, 99.61, 98.85, 98.22]
-    loss_nonzero = [0.51, 0.39, 1.15, 1.78]
-    
+    loss_zero = [s['loss_zero'] for s in all_stats]
+    loss_nonzero = [100 - s['loss_zero'] for s in all_stats]
+
     # Bandwidth (Mbps)
-    bandwidth_mean = [1.74, 0.09, 3.36, 0.65]
-    
+    bandwidth_mean = [s['bw_mean'] for s in all_stats]
+
     # Create subplots
     gs = fig.add_gridspec(3, 3, hspace=0.3, wspace=0.3)
-    
+
     # 1. Dataset sizes
     ax1 = fig.add_subplot(gs[0, 0])
-    colors = ['#3498db', '#2ecc71', '#e74c3c', '#f39c12']
+    colors = [PALETTE[i % len(PALETTE)] for i in range(len(datasets))]
     bars = ax1.bar(datasets, samples, color=colors, alpha=0.7, edgecolor='black', linewidth=1.5)
     ax1.set_ylabel('Number of Samples', fontsize=11, fontweight='bold')
     ax1.set_title('Dataset Sizes', fontsize=12, fontweight='bold')
@@ -45,17 +94,17 @@ def plot_coverage_summary():
                 f'{s:,}\n({s/sum(samples)*100:.1f}%)',
                 ha='center', va='bottom', fontsize=9, fontweight='bold')
     ax1.grid(axis='y', alpha=0.3)
-    
+
     # 2. Delay distribution stacked bar
     ax2 = fig.add_subplot(gs[0, 1])
     x = np.arange(len(datasets))
     width = 0.6
-    
-    p1 = ax2.bar(x, delay_low, width, label='Low (<150ms)', color='#2ecc71', alpha=0.8)
-    p2 = ax2.bar(x, delay_mid, width, bottom=delay_low, label='Medium (150-300ms)', color='#f39c12', alpha=0.8)
-    p3 = ax2.bar(x, delay_high, width, bottom=np.array(delay_low)+np.array(delay_mid), 
-                 label='High (>300ms)', color='#e74c3c', alpha=0.8)
-    
+
+    ax2.bar(x, delay_low, width, label='Low (<150ms)', color='#2ecc71', alpha=0.8)
+    ax2.bar(x, delay_mid, width, bottom=delay_low, label='Medium (150-300ms)', color='#f39c12', alpha=0.8)
+    ax2.bar(x, delay_high, width, bottom=np.array(delay_low)+np.array(delay_mid),
+            label='High (>300ms)', color='#e74c3c', alpha=0.8)
+
     ax2.set_ylabel('Percentage (%)', fontsize=11, fontweight='bold')
     ax2.set_title('Delay Distribution by Dataset', fontsize=12, fontweight='bold')
     ax2.set_xticks(x)
@@ -63,22 +112,20 @@ def plot_coverage_summary():
     ax2.legend(loc='upper right', fontsize=9)
     ax2.grid(axis='y', alpha=0.3)
     ax2.set_ylim(0, 105)
-    
+
     # Add percentages on bars
     for i, (d1, d2, d3) in enumerate(zip(delay_low, delay_mid, delay_high)):
         if d3 > 3:
-            ax2.text(i, d1 + d2 + d3/2, f'{d3:.1f}%', ha='center', va='center', 
+            ax2.text(i, d1 + d2 + d3/2, f'{d3:.1f}%', ha='center', va='center',
                     fontsize=9, fontweight='bold', color='white')
-    
+
     # 3. Loss distribution
     ax3 = fig.add_subplot(gs[0, 2])
-    x = np.arange(len(datasets))
-    width = 0.6
-    
-    p1 = ax3.bar(x, loss_zero, width, label='No Loss (0%)', color='#95a5a6', alpha=0.7)
-    p2 = ax3.bar(x, loss_nonzero, width, bottom=loss_zero, label='Has Loss (>0%)', 
-                 color='#e74c3c', alpha=0.9, edgecolor='darkred', linewidth=2)
-    
+
+    ax3.bar(x, loss_zero, width, label='No Loss (0%)', color='#95a5a6', alpha=0.7)
+    ax3.bar(x, loss_nonzero, width, bottom=loss_zero, label='Has Loss (>0%)',
+            color='#e74c3c', alpha=0.9, edgecolor='darkred', linewidth=2)
+
     ax3.set_ylabel('Percentage (%)', fontsize=11, fontweight='bold')
     ax3.set_title('Packet Loss Distribution', fontsize=12, fontweight='bold')
     ax3.set_xticks(x)
@@ -86,12 +133,12 @@ def plot_coverage_summary():
     ax3.legend(loc='lower left', fontsize=9)
     ax3.grid(axis='y', alpha=0.3)
     ax3.set_ylim(0, 105)
-    
+
     # Highlight loss percentage
     for i, loss in enumerate(loss_nonzero):
-        ax3.text(i, 101, f'{loss:.2f}%', ha='center', va='bottom', 
+        ax3.text(i, 101, f'{loss:.2f}%', ha='center', va='bottom',
                 fontsize=10, fontweight='bold', color='red')
-    
+
     # 4. Bandwidth comparison
     ax4 = fig.add_subplot(gs[1, 0])
     bars = ax4.barh(datasets, bandwidth_mean, color=colors, alpha=0.7, edgecolor='black', linewidth=1.5)
@@ -103,93 +150,92 @@ def plot_coverage_summary():
         ax4.text(width, bar.get_y() + bar.get_height()/2.,
                 f'{bw:.2f}',
                 ha='left', va='center', fontsize=10, fontweight='bold')
-    
+
     # 5. Coverage heatmap
     ax5 = fig.add_subplot(gs[1, 1:])
-    
-    # Create coverage matrix
-    coverage_data = np.array([
-        [89.87, 5.29, 4.85, 0.51],   # ghent
-        [37.61, 15.46, 46.93, 0.39],  # norway
-        [35.65, 22.75, 41.60, 1.15],  # NY
-        [68.06, 17.36, 14.58, 1.78],  # opennetlab
-    ])
-    
+
+    # Coverage matrix: one row per dataset
+    coverage_data = np.array([delay_low, delay_mid, delay_high, loss_nonzero]).T
+
     im = ax5.imshow(coverage_data, cmap='RdYlGn', aspect='auto', vmin=0, vmax=100)
-    
+
     ax5.set_xticks(np.arange(4))
-    ax5.set_yticks(np.arange(4))
-    ax5.set_xticklabels(['Low Delay\n(<150ms)', 'Mid Delay\n(150-300ms)', 
+    ax5.set_yticks(np.arange(len(datasets)))
+    ax5.set_xticklabels(['Low Delay\n(<150ms)', 'Mid Delay\n(150-300ms)',
                          'High Delay\n(>300ms)', 'Has Loss\n(>0%)'], fontsize=10)
     ax5.set_yticklabels(datasets, fontsize=11, fontweight='bold')
-    
+
     # Add text annotations
-    for i in range(4):
+    for i in range(len(datasets)):
         for j in range(4):
-            text = ax5.text(j, i, f'{coverage_data[i, j]:.1f}%',
-                          ha="center", va="center", color="black", fontsize=11, fontweight='bold')
-    
+            ax5.text(j, i, f'{coverage_data[i, j]:.1f}%',
+                     ha="center", va="center", color="black", fontsize=11, fontweight='bold')
+
     ax5.set_title('Coverage Heatmap (% of samples in each category)', fontsize=12, fontweight='bold')
-    
+
     # Colorbar
     cbar = plt.colorbar(im, ax=ax5, orientation='vertical', pad=0.02)
     cbar.set_label('Percentage (%)', fontsize=10, fontweight='bold')
-    
+
     # 6. Summary statistics
     ax6 = fig.add_subplot(gs[2, :])
     ax6.axis('off')
-    
+
+    total_samples = sum(samples)
+    overall_loss = sum(n * l for n, l in zip(samples, loss_nonzero)) / total_samples
+    by_high_delay = sorted(zip(delay_high, datasets), reverse=True)[:2]
+    high_delay_text = ' and '.join(f'{name} ({pct:.2f}%)' for pct, name in by_high_delay)
+    best_loss = max(zip(loss_nonzero, datasets))[1]
+
     summary_text = f"""
     COVERAGE SUMMARY
-    
+
     ✓ STRENGTHS:
-      • Total samples: {sum(samples):,} across {sum(files)} files
-      • Excellent high-delay coverage in norway (46.93%) and NY (41.60%)
-      • Diverse scenarios: urban subway, rural ferry, bicycle, bus, car
-      • Good bandwidth range: 0.09 - 3.36 Mbps average
-    
-    ✗ CRITICAL GAPS:
-      • Packet loss severely limited: Only 0.51-1.78% of samples have any loss
-      • Overall <1% of samples have packet loss (weighted average)
-      • Risk: BC model won't learn proper congestion response
-    
+      • Total samples: {total_samples:,} across {sum(files)} files
+      • Best high-delay coverage in {high_delay_text}
+      • Bandwidth range: {min(bandwidth_mean):.2f} - {max(bandwidth_mean):.2f} Mbps average
+
+    ✗ GAPS:
+      • Packet loss: only {min(loss_nonzero):.2f}-{max(loss_nonzero):.2f}% of samples have any loss
+      • Overall {overall_loss:.2f}% of samples have packet loss (weighted average)
+      • Risk: BC model won't learn proper congestion response if loss stays rare
+
     ⚠ RECOMMENDATIONS:
-      1. Oversample packet loss scenarios 20-50x during training
-      2. Use weighted loss function (50x weight for loss>0 samples)
+      1. Oversample packet loss scenarios during training
+      2. Use weighted loss function for loss>0 samples
       3. Consider data augmentation to add synthetic packet loss
       4. Focus evaluation on extreme scenarios (high delay + loss)
-      5. Use NY dataset (best loss coverage) for validation
+      5. Use {best_loss} dataset (best loss coverage) for validation
     """
-    
+
     ax6.text(0.05, 0.95, summary_text, transform=ax6.transAxes,
             fontsize=11, verticalalignment='top', family='monospace',
             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.3))
-    
-    plt.suptitle('WebRTC GCC Dataset Coverage Analysis', 
+
+    plt.suptitle('WebRTC GCC Dataset Coverage Analysis',
                 fontsize=16, fontweight='bold', y=0.98)
-    
-    plt.savefig('coverage_analysis.png', dpi=300, bbox_inches='tight')
-    print("Coverage visualization saved to: coverage_analysis.png")
-    
+
+    coverage_path = out_dir / 'coverage_analysis.png'
+    plt.savefig(coverage_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    print(f"Coverage visualization saved to: {coverage_path}")
+
     # Create second figure for detailed loss analysis
     fig2, axes = plt.subplots(2, 2, figsize=(14, 10))
     fig2.suptitle('Detailed Packet Loss Analysis', fontsize=16, fontweight='bold')
-    
-    # Top files with loss
-    top_files = [
-        ('4G_3mbps', 20.33, 96.00, 'opennetlab'),
-        ('bus57New', 1.21, 99.82, 'NY'),
-        ('Ferry4', 1.57, 99.76, 'NY'),
-        ('7trainNew', 1.43, 99.72, 'NY'),
-        ('bus62New', 0.23, 99.84, 'NY'),
-    ]
-    
+
+    # Top files with loss (share of samples with loss > 0)
+    top_files = sorted(
+        ((short_name(f['name']), f['loss_nonzero_pct'], f['loss_max'] * 100, s['name'])
+         for s in all_stats for f in s['file_stats']),
+        key=lambda f: f[1], reverse=True)[:5]
+
     ax = axes[0, 0]
     files_names = [f[0] for f in top_files]
     nonzero_pct = [f[1] for f in top_files]
-    colors_map = {'opennetlab': '#f39c12', 'NY': '#e74c3c'}
+    colors_map = dict(zip(datasets, colors))
     colors_bars = [colors_map[f[3]] for f in top_files]
-    
+
     bars = ax.barh(files_names, nonzero_pct, color=colors_bars, alpha=0.7, edgecolor='black', linewidth=1.5)
     ax.set_xlabel('% of Samples with Loss > 0', fontsize=11, fontweight='bold')
     ax.set_title('Top 5 Files by Loss Coverage', fontsize=12, fontweight='bold')
@@ -198,7 +244,7 @@ def plot_coverage_summary():
         width = bar.get_width()
         ax.text(width, bar.get_y() + bar.get_height()/2.,
                f' {pct:.2f}%', va='center', fontsize=10, fontweight='bold')
-    
+
     # Max loss values
     ax = axes[0, 1]
     max_loss = [f[2] for f in top_files]
@@ -210,23 +256,18 @@ def plot_coverage_summary():
         width = bar.get_width()
         ax.text(width, bar.get_y() + bar.get_height()/2.,
                f' {loss:.1f}%', va='center', fontsize=10, fontweight='bold')
-    
+
     # Loss distribution across datasets
     ax = axes[1, 0]
     loss_categories = ['0%', '0-1%', '1-5%', '>5%']
-    ghent_loss = [99.49, 0.00, 0.03, 0.48]
-    norway_loss = [99.61, 0.00, 0.00, 0.39]
-    ny_loss = [98.85, 0.01, 0.10, 1.04]
-    opennet_loss = [98.22, 0.00, 0.05, 1.73]
-    
     x = np.arange(len(loss_categories))
-    width = 0.2
-    
-    ax.bar(x - 1.5*width, ghent_loss, width, label='ghent', alpha=0.7)
-    ax.bar(x - 0.5*width, norway_loss, width, label='norway', alpha=0.7)
-    ax.bar(x + 0.5*width, ny_loss, width, label='NY', alpha=0.7)
-    ax.bar(x + 1.5*width, opennet_loss, width, label='opennetlab', alpha=0.7)
-    
+    width = 0.8 / len(all_stats)
+
+    for i, s in enumerate(all_stats):
+        offset = (i - (len(all_stats) - 1) / 2) * width
+        ax.bar(x + offset, [s['loss_zero'], s['loss_low'], s['loss_mid'], s['loss_high']],
+               width, label=s['name'], color=colors[i], alpha=0.7)
+
     ax.set_ylabel('Percentage of Samples (%)', fontsize=11, fontweight='bold')
     ax.set_xlabel('Loss Ratio Range', fontsize=11, fontweight='bold')
     ax.set_title('Loss Distribution Breakdown', fontsize=12, fontweight='bold')
@@ -235,22 +276,26 @@ def plot_coverage_summary():
     ax.legend(fontsize=9)
     ax.set_yscale('log')
     ax.grid(axis='y', alpha=0.3)
-    
+
     # Recommendation text
     ax = axes[1, 1]
     ax.axis('off')
-    
-    rec_text = """
+
+    best_file = top_files[0] if top_files else ('-', 0.0, 0.0, '-')
+    top_datasets = [f[3] for f in top_files]
+    most_valuable = max(set(top_datasets), key=top_datasets.count) if top_datasets else '-'
+
+    rec_text = f"""
     KEY FINDINGS:
-    
-    1. 4G_3mbps.pickle is the BEST file:
-       • 20.33% samples have loss
-       • Should be oversampled 50x
-    
-    2. NY dataset is most valuable:
-       • 4 out of 5 top files
+
+    1. {best_file[0]} is the BEST file:
+       • {best_file[1]:.2f}% samples have loss
+       • Max loss {best_file[2]:.1f}%, oversample it
+
+    2. {most_valuable} dataset is most valuable:
+       • {top_datasets.count(most_valuable)} out of {len(top_files)} top files
        • Best for validation/test
-    
+
     3. Training Strategy:
        ┌─────────────────────────────┐
        │ Sample Weight Recommendation │
@@ -260,25 +305,51 @@ def plot_coverage_summary():
        │ Loss 1-5%:    30x            │
        │ Loss >5%:     50x            │
        └─────────────────────────────┘
-    
+
     4. Data Augmentation Ideas:
        • Add synthetic loss to traces
        • Simulate network handoffs
        • Create "worst case" scenarios
-    
+
     5. Model Evaluation:
        • MUST test on high-loss traces
        • Separate metrics for loss>0
        • Compare to GCC on edge cases
     """
-    
+
     ax.text(0.05, 0.95, rec_text, transform=ax.transAxes,
            fontsize=10, verticalalignment='top', family='monospace',
            bbox=dict(boxstyle='round', facecolor='lightyellow', alpha=0.5))
-    
+
     plt.tight_layout()
-    plt.savefig('loss_analysis.png', dpi=300, bbox_inches='tight')
-    print("Loss analysis saved to: loss_analysis.png")
+    loss_path = out_dir / 'loss_analysis.png'
+    plt.savefig(loss_path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig2)
+    print(f"Loss analysis saved to: {loss_path}")
+    return coverage_path, loss_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot dataset coverage from cached per-file summaries')
+    parser.add_argument('--data-dir', default=str(REPO_ROOT / 'data'), help='Data directory')
+    parser.add_argument('--datasets', default=None, help=f"Comma-separated datasets (default: {','.join(DATASETS)})")
+    parser.add_argument('--out-dir', default=str(REPO_ROOT / 'reports'), help='Output directory for the PNGs')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute all summaries')
+    parser.add_argument('--dpi', type=int, default=300)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    datasets = args.datasets.split(',') if args.datasets else None
+    all_stats = collect_coverage(args.data_dir, datasets, use_cache=not args.no_cache, workers=args.workers)
+    if not all_stats:
+        print("No data found!")
+        return
+    print(f"Statistics ready in {time.perf_counter() - start:.2f}s")
+
+    plot_coverage_summary(all_stats, args.out_dir, dpi=args.dpi)
+    print(f"Total time: {time.perf_counter() - start:.2f}s")
+
 
 if __name__ == '__main__':
-    plot_coverage_summary()
+    main()
@@ -3,10 +3,19 @@
 WebRTC GCC Data Visualization Tool
 Requirements: pip install matplotlib
 """
-import pickle
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import numpy as np
+
+from cli_args import pop_option
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from trace_store import load_trace  # noqa: E402
+
 try:
     import matplotlib
     matplotlib.use('Agg')  # 先设置backend
@@ -16,12 +25,81 @@ except ImportError:
     print("Run: pip install matplotlib")
     sys.exit(1)
 
+# Default number of points drawn per series (0 = draw every point)
+MAX_POINTS = 2000
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+
+# Each report step represents 200ms
+STEP_SECONDS = 0.2
+
 def load_pickle(file_path):
-    """Load pickle file"""
-    with open(file_path, 'rb') as f:
-        return pickle.load(f)
+    """Load a trace (from the trace store if available, otherwise the pickle)"""
+    return load_trace(file_path)
+
+def minmax_indices(y, max_points):
+    """
+    Indices keeping the min and max of each of max_points // 2 equal buckets
+
+    Fully vectorized; keeps every spike, so delay/loss peaks survive.
+    """
+    n = len(y)
+    if max_points <= 0 or n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(max_points // 2, 1))
+    num_buckets = -(-n // size)
+    # Pad the last bucket with its final value so all buckets have equal size
+    padded = np.concatenate([y, np.full(num_buckets * size - n, y[-1])]).reshape(num_buckets, size)
+    offsets = np.arange(num_buckets) * size
+    indices = np.concatenate([offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [0, n - 1]])
+    return np.unique(np.minimum(indices, n - 1))
+
+def lttb_indices(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets point selection
+
+    One point per bucket, the one forming the largest triangle with the previously
+    selected point and the next bucket's average (areas computed per bucket with NumPy).
+    """
+    n = len(y)
+    if max_points <= 0 or n <= max_points or max_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = hi, max(edges[i + 2], hi + 1)
+            avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def downsample(x, y, max_points=MAX_POINTS, method='minmax'):
+    """Shape-preserving downsampling of a series to about max_points points"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if method == 'lttb':
+        indices = lttb_indices(x, y, max_points)
+    elif method == 'minmax':
+        indices = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method} (choose from {DOWNSAMPLE_METHODS})")
+    return x[indices], y[indices]
 
-def plot_single_file(file_path, save_path=None):
+def save_or_show(fig, save_path, message, dpi=300):
+    if save_path:
+        fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
+        print(f"{message}: {save_path}")
+        plt.close(fig)
+    else:
+        plt.show()
+
+def plot_single_file(file_path, save_path=None, max_points=MAX_POINTS, method='minmax', dpi=300):
     """Plot all metrics for a single file"""
     data = load_pickle(file_path)
     trace_name = data.get('trace_name', Path(file_path).stem)
@@ -29,21 +107,21 @@ def plot_single_file(file_path, save_path=None):
     fig, axes = plt.subplots(3, 1, figsize=(14, 10))
     fig.suptitle(f'WebRTC GCC Analysis: {trace_name}', fontsize=16, fontweight='bold')
     
-    # Time axis (assuming each point represents 200ms)
-    time_ms = [i * 200 for i in range(len(data.get('bandwidth_prediction', [])))]
-    time_s = [t / 1000 for t in time_ms]  # Convert to seconds
+    # Time axis in seconds
+    time_s = np.arange(len(data.get('bandwidth_prediction', []))) * STEP_SECONDS
     
-    # Plot 1: Bandwidth and rates
+    def series(key, scale=1.0):
+        values = np.asarray(data[key], dtype=np.float64)[:len(time_s)] * scale
+        return downsample(time_s[:len(values)], values, max_points, method)
+    
+    # Plot 1: Bandwidth and rates (Mbps)
     ax1 = axes[0]
     if 'bandwidth_prediction' in data:
-        bw = [b / 1e6 for b in data['bandwidth_prediction']]  # Convert to Mbps
-        ax1.plot(time_s, bw, label='Bandwidth Prediction', linewidth=2, alpha=0.8)
+        ax1.plot(*series('bandwidth_prediction', 1e-6), label='Bandwidth Prediction', linewidth=2, alpha=0.8)
     if 'sending_rate' in data:
-        send = [s / 1e6 for s in data['sending_rate']]
-        ax1.plot(time_s, send, label='Sending Rate', linewidth=1.5, alpha=0.7)
+        ax1.plot(*series('sending_rate', 1e-6), label='Sending Rate', linewidth=1.5, alpha=0.7)
     if 'receiving_rate' in data:
-        recv = [r / 1e6 for r in data['receiving_rate']]
-        ax1.plot(time_s, recv, label='Receiving Rate', linewidth=1, alpha=0.6, linestyle='--')
+        ax1.plot(*series('receiving_rate', 1e-6), label='Receiving Rate', linewidth=1, alpha=0.6, linestyle='--')
     
     ax1.set_ylabel('Rate (Mbps)', fontsize=12, fontweight='bold')
     ax1.set_title('Bandwidth Prediction vs Actual Rates', fontsize=13, fontweight='bold')
@@ -53,8 +131,8 @@ def plot_single_file(file_path, save_path=None):
     # Plot 2: Delay
     ax2 = axes[1]
     if 'delay' in data:
-        ax2.plot(time_s, data['delay'], color='orange', linewidth=1.5, alpha=0.8)
-        ax2.axhline(y=sum(data['delay'])/len(data['delay']), 
+        ax2.plot(*series('delay'), color='orange', linewidth=1.5, alpha=0.8)
+        ax2.axhline(y=np.mean(data['delay']), 
                     color='r', linestyle='--', label=f'Average Delay', alpha=0.5)
     
     ax2.set_ylabel('Delay (ms)', fontsize=12, fontweight='bold')
@@ -65,9 +143,9 @@ def plot_single_file(file_path, save_path=None):
     # Plot 3: Loss ratio
     ax3 = axes[2]
     if 'loss_ratio' in data:
-        loss_percent = [l * 100 for l in data['loss_ratio']]
-        ax3.plot(time_s, loss_percent, color='red', linewidth=1.5, alpha=0.8)
-        ax3.fill_between(time_s, 0, loss_percent, color='red', alpha=0.2)
+        loss_time, loss_percent = series('loss_ratio', 100)
+        ax3.plot(loss_time, loss_percent, color='red', linewidth=1.5, alpha=0.8)
+        ax3.fill_between(loss_time, 0, loss_percent, color='red', alpha=0.2)
     
     ax3.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
     ax3.set_ylabel('Loss Ratio (%)', fontsize=12, fontweight='bold')
@@ -75,14 +153,9 @@ def plot_single_file(file_path, save_path=None):
     ax3.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"Plot saved to: {save_path}")
-    else:
-        plt.show()
+    save_or_show(fig, save_path, "Plot saved to", dpi)
 
-def plot_compare(file_paths, save_path=None):
+def plot_compare(file_paths, save_path=None, max_points=MAX_POINTS, method='minmax', dpi=300):
     """Compare bandwidth predictions from multiple files"""
     fig, ax = plt.subplots(figsize=(14, 8))
     
@@ -93,8 +166,8 @@ def plot_compare(file_paths, save_path=None):
         trace_name = data.get('trace_name', Path(fp).stem)
         
         if 'bandwidth_prediction' in data:
-            time_s = [i * 0.2 for i in range(len(data['bandwidth_prediction']))]
-            bw = [b / 1e6 for b in data['bandwidth_prediction']]
+            bw = np.asarray(data['bandwidth_prediction'], dtype=np.float64) / 1e6
+            time_s, bw = downsample(np.arange(len(bw)) * STEP_SECONDS, bw, max_points, method)
             ax.plot(time_s, bw, label=trace_name, linewidth=2, 
                    alpha=0.7, color=colors[i])
     
@@ -105,14 +178,9 @@ def plot_compare(file_paths, save_path=None):
     ax.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"Comparison plot saved to: {save_path}")
-    else:
-        plt.show()
+    save_or_show(fig, save_path, "Comparison plot saved to", dpi)
 
-def plot_delay_distribution(file_paths, save_path=None):
+def plot_delay_distribution(file_paths, save_path=None, dpi=300):
     """Plot delay distribution histogram"""
     fig, ax = plt.subplots(figsize=(12, 6))
     
@@ -133,25 +201,73 @@ def plot_delay_distribution(file_paths, save_path=None):
     ax.grid(True, alpha=0.3, axis='y')
     
     plt.tight_layout()
+    save_or_show(fig, save_path, "Delay distribution plot saved to", dpi)
+
+def _render_file(task, max_points, method, dpi):
+    """Worker: render one trace to a PNG (returns the path, or None on error)"""
+    file_path, save_path = task
+    try:
+        plot_single_file(file_path, save_path, max_points=max_points, method=method, dpi=dpi)
+        return save_path
+    except Exception as e:
+        print(f"Error plotting {file_path}: {e}")
+        return None
+
+def plot_batch(directory, output_dir='plots', workers=None, max_points=MAX_POINTS, method='minmax', dpi=150):
+    """Render plot_single_file for every trace under directory using a process pool"""
+    directory = Path(directory)
+    files = sorted(directory.rglob('*.pickle'))
+    if not files:
+        print(f"No pickle files found in {directory}")
+        return []
     
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"Delay distribution plot saved to: {save_path}")
+    output_dir = Path(output_dir)
+    tasks = []
+    for fp in files:
+        out = output_dir / fp.parent.relative_to(directory) / f"{fp.stem}.png"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tasks.append((str(fp), str(out)))
+    
+    render = partial(_render_file, max_points=max_points, method=method, dpi=dpi)
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(render, tasks))
     else:
-        plt.show()
+        results = [render(task) for task in tasks]
+    
+    rendered = [r for r in results if r is not None]
+    print(f"\nRendered {len(rendered)}/{len(tasks)} plots to {output_dir}")
+    return rendered
 
 def main():
+    # Options shared by all commands
+    max_points = int(pop_option(sys.argv, '--max-points', MAX_POINTS))
+    method = pop_option(sys.argv, '--method', 'minmax')
+    dpi = pop_option(sys.argv, '--dpi')
+    workers = pop_option(sys.argv, '--workers')
+    workers = int(workers) if workers else None
+    if method not in DOWNSAMPLE_METHODS:
+        print(f"Error: --method must be one of {DOWNSAMPLE_METHODS}")
+        sys.exit(1)
+    
     if len(sys.argv) < 2:
         print("WebRTC GCC Data Visualization Tool")
         print("\nUsage:")
         print(f"  {sys.argv[0]} plot <file> [output.png]")
         print(f"  {sys.argv[0]} compare <file1> <file2> ... [output.png]")
         print(f"  {sys.argv[0]} delay-dist <file1> <file2> ... [output.png]")
+        print(f"  {sys.argv[0]} batch <directory> [output_dir] [--workers N]")
+        print("\nOptions:")
+        print(f"  --max-points N   Points drawn per series (default {MAX_POINTS}, 0 = all)")
+        print(f"  --method M       Downsampling: minmax (keeps spikes, default) or lttb")
+        print(f"  --dpi N          Output resolution (default 300, batch: 150)")
         print("\nExamples:")
         print(f"  {sys.argv[0]} plot ghent/rates_delay_loss_gcc_report_bicycle_0001.pickle")
         print(f"  {sys.argv[0]} plot ghent/rates_delay_loss_gcc_report_bicycle_0001.pickle output.png")
         print(f"  {sys.argv[0]} compare ghent/*.pickle comparison.png")
         print(f"  {sys.argv[0]} delay-dist ghent/rates_delay_loss_gcc_report_*_0001.pickle")
+        print(f"  {sys.argv[0]} batch data/NY reports/plots/NY --workers 8")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -161,7 +277,7 @@ def main():
             print("Error: file path required")
             sys.exit(1)
         save_path = sys.argv[3] if len(sys.argv) > 3 else None
-        plot_single_file(sys.argv[2], save_path)
+        plot_single_file(sys.argv[2], save_path, max_points=max_points, method=method, dpi=int(dpi or 300))
     
     elif command == 'compare':
         if len(sys.argv) < 3:
@@ -176,7 +292,7 @@ def main():
             file_paths = sys.argv[2:]
             save_path = None
         
-        plot_compare(file_paths, save_path)
+        plot_compare(file_paths, save_path, max_points=max_points, method=method, dpi=int(dpi or 300))
     
     elif command == 'delay-dist':
         if len(sys.argv) < 3:
@@ -191,7 +307,15 @@ def main():
             file_paths = sys.argv[2:]
             save_path = None
         
-        plot_delay_distribution(file_paths, save_path)
+        plot_delay_distribution(file_paths, save_path, dpi=int(dpi or 300))
+    
+    elif command == 'batch':
+        if len(sys.argv) < 3:
+            print("Error: directory required")
+            sys.exit(1)
+        output_dir = sys.argv[3] if len(sys.argv) > 3 else 'plots'
+        plot_batch(sys.argv[2], output_dir, workers=workers, max_points=max_points, method=method,
+                   dpi=int(dpi or 150))
     
     else:
         print(f"Unknown command: {command}")
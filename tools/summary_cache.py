@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Per-file summary cache shared by the analysis tools
+
+Summaries are stored in one JSON file, keyed by absolute path and
+invalidated when the file's size/mtime change (or, with use_hash=True, only
+when its content hash changes). Missing summaries are computed in a process
+pool, so re-running a tool after adding a few traces only touches the new
+files.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """BLAKE2b digest of a file's content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """JSON cache of per-file summaries"""
+
+    def __init__(self, cache_path, version, use_hash=False):
+        """
+        Args:
+            cache_path: JSON file holding the cache
+            version: Summary format version; a mismatch discards the whole cache
+            use_hash: Validate entries by content hash when mtime changed
+        """
+        self.cache_path = Path(cache_path)
+        self.version = version
+        self.use_hash = use_hash
+        self.entries = {}
+        self.dirty = False
+
+        if self.cache_path.exists():
+            try:
+                with open(self.cache_path) as f:
+                    payload = json.load(f)
+                if payload.get('version') == version:
+                    self.entries = payload.get('entries', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    @staticmethod
+    def _key(path):
+        # abspath instead of resolve(): no per-component lstat on large directories
+        return os.path.abspath(path)
+
+    def get(self, path):
+        """Return the cached summary for path, or None if missing/stale"""
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return None
+        st = os.stat(path)
+        if entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['summary']
+        if self.use_hash and entry['size'] == st.st_size and entry.get('hash') == file_hash(path):
+            entry['mtime_ns'] = st.st_mtime_ns  # Touched but unchanged
+            self.dirty = True
+            return entry['summary']
+        return None
+
+    def put(self, path, summary):
+        st = os.stat(path)
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'summary': summary}
+        if self.use_hash:
+            entry['hash'] = file_hash(path)
+        self.entries[self._key(path)] = entry
+        self.dirty = True
+
+    def prune(self, keep_paths):
+        """Drop entries for files that are not in keep_paths and no longer exist"""
+        keep = {self._key(p) for p in keep_paths}
+        stale = [k for k in self.entries if k not in keep and not os.path.exists(k)]
+        for k in stale:
+            del self.entries[k]
+        self.dirty = self.dirty or bool(stale)
+
+    def save(self):
+        """Write the cache atomically (no-op if nothing changed)"""
+        if not self.dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f'.{self.cache_path.name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+
+def map_cached(files, fn, cache=None, workers=None):
+    """
+    Return [fn(path) for path in files], reusing cached summaries
+
+    Args:
+        files: File paths
+        fn: Top-level (picklable) function path -> JSON-serializable summary or None
+        cache: SummaryCache, or None to always recompute
+        workers: Process count (None = os.cpu_count(), <=1 = serial)
+
+    Returns:
+        (summaries, num_computed)
+    """
+    files = [str(f) for f in files]
+    results = [None] * len(files)
+    missing = []
+    for i, path in enumerate(files):
+        summary = cache.get(path) if cache is not None else None
+        if summary is None:
+            missing.append(i)
+        else:
+            results[i] = summary
+
+    workers = os.cpu_count() if workers is None else workers
+    missing_paths = [files[i] for i in missing]
+    if workers > 1 and len(missing_paths) > 1:
+        chunksize = max(1, len(missing_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing_paths))) as executor:
+            computed = list(executor.map(fn, missing_paths, chunksize=chunksize))
+    else:
+        computed = [fn(p) for p in missing_paths]
+
+    for i, summary in zip(missing, computed):
+        results[i] = summary
+        if cache is not None and summary is not None:
+            cache.put(files[i], summary)
+
+    return results, len(missing)
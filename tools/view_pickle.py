@@ -2,17 +2,26 @@
 """
 查看WebRTC GCC pickle文件内容的工具脚本
 """
-import pickle
+import glob
 import sys
 import os
 from pathlib import Path
 import json
 
+import numpy as np
+
+from summary_cache import SummaryCache, map_cached
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from trace_store import describe_trace, load_trace  # noqa: E402
+
+# 摘要缓存格式版本 (describe_trace 输出变化时递增)
+SUMMARY_VERSION = 1
+
 def view_pickle(file_path):
-    """读取并显示pickle文件的内容"""
+    """读取并显示pickle文件的内容 (有列式存储时直接从trace_store读取)"""
     try:
-        with open(file_path, 'rb') as f:
-            data = pickle.load(f)
+        data = load_trace(file_path)
         
         print(f"\n{'='*80}")
         print(f"文件: {file_path}")
@@ -32,7 +41,7 @@ def view_pickle(file_path):
                 print(f"\n键: {key}")
                 print(f"  类型: {type(value)}")
                 
-                if isinstance(value, (list, tuple)):
+                if isinstance(value, (list, tuple, np.ndarray)):
                     print(f"  长度: {len(value)}")
                     if len(value) > 0:
                         print(f"  首个元素: {value[0]}")
@@ -90,21 +99,121 @@ def list_pickle_files(directory='.', pattern='*.pickle'):
     
     return pickle_files
 
+def summarize_file(path):
+    """单个文件的摘要: 大小 + 各键的类型/长度/dtype/min/max/mean (在工作进程中运行)"""
+    try:
+        return {'size': os.path.getsize(path), 'keys': describe_trace(path)}
+    except Exception as e:
+        print(f"错误: 无法读取文件 {path}: {e}")
+        return None
+
+def summarize_directory(directory='.', pattern='*.pickle', workers=None, use_cache=True, cache_path=None):
+    """
+    并行生成目录下所有trace的摘要, 结果缓存在 <目录>/.cache/trace_summaries.json
+
+    有列式存储 (trace_store) 时直接从其索引读取统计量, 不读取任何数据列。
+    返回 [(路径, 摘要)]
+    """
+    path = Path(directory)
+    if path.is_file():
+        files = [str(path)]
+    else:
+        # 字符串路径排序比Path对象快得多 (上万文件时明显)
+        files = sorted(glob.glob(os.path.join(glob.escape(str(path)), '**', pattern), recursive=True))
+    cache = None
+    if use_cache:
+        root = path.parent if path.is_file() else path
+        cache = SummaryCache(cache_path or root / '.cache' / 'trace_summaries.json', version=SUMMARY_VERSION)
+    summaries, computed = map_cached(files, summarize_file, cache=cache, workers=workers)
+    if cache is not None:
+        cache.prune(files)
+        cache.save()
+    print(f"\n{len(files)} 个文件 (新读取 {computed} 个, 缓存 {len(files) - computed} 个)")
+    return [(f, s) for f, s in zip(files, summaries) if s is not None]
+
+def _column_mean(keys, name, scale=1.0):
+    item = keys.get(name)
+    if item is None or 'mean' not in item:
+        return '-'
+    return f"{item['mean'] * scale:.2f}"
+
+def _num_rows(keys):
+    return max((v['length'] for v in keys.values() if v['type'] == 'column'), default=0)
+
+def print_summaries(results, verbose=False):
+    """按目录分组打印摘要表"""
+    by_dir = {}
+    for f, summary in results:
+        by_dir.setdefault(os.path.basename(os.path.dirname(f)), []).append(
+            (os.path.basename(f), summary, _num_rows(summary['keys'])))
+    
+    for dir_name, items in sorted(by_dir.items()):
+        total_rows = sum(rows for _, _, rows in items)
+        total_size = sum(s['size'] for _, s, _ in items)
+        print(f"\n{dir_name}/ ({len(items)} 个文件, {total_rows:,} 行, {total_size / 1024**2:.1f} MB)")
+        
+        # 同一目录下键结构相同时只打印一次
+        layouts = {tuple((k, v['type'], v.get('dtype')) for k, v in s['keys'].items()) for _, s, _ in items}
+        if len(layouts) == 1:
+            keys = ', '.join(f"{k}({dtype or t})" for k, t, dtype in next(iter(layouts)))
+            print(f"  键: {keys}")
+        
+        print(f"  {'文件':<55} {'大小':>9} {'行数':>8} {'延迟均值(ms)':>12} {'丢包均值(%)':>11} {'带宽均值(Mbps)':>14}")
+        lines = []
+        for f, s, rows in items:
+            keys = s['keys']
+            lines.append(f"  {f:<55} {s['size'] / 1024:>7.1f}KB {rows:>8} "
+                         f"{_column_mean(keys, 'delay'):>12} {_column_mean(keys, 'loss_ratio', 100):>11} "
+                         f"{_column_mean(keys, 'bandwidth_prediction', 1e-6):>14}")
+            if verbose or len(layouts) > 1:
+                for name, item in keys.items():
+                    if item['type'] == 'column':
+                        stats = ''
+                        if 'mean' in item:
+                            stats = f"  min={item['min']:.4g} max={item['max']:.4g} mean={item['mean']:.4g}"
+                        lines.append(f"      {name:<22} {item['dtype']:<8} len={item['length']}{stats}")
+                    elif 'value' in item:
+                        lines.append(f"      {name:<22} {item['type']:<8} {item['value']}")
+                    else:
+                        lines.append(f"      {name:<22} {item['type']:<8} len={item.get('length', '-')}")
+        print('\n'.join(lines))
+
 def main():
     if len(sys.argv) < 2:
         print("使用方法:")
         print(f"  {sys.argv[0]} <pickle文件路径>  # 查看单个文件")
         print(f"  {sys.argv[0]} list              # 列出所有pickle文件")
         print(f"  {sys.argv[0]} list <目录>       # 列出指定目录的pickle文件")
+        print(f"  {sys.argv[0]} summary <目录> [--workers N] [--json 输出.json] [--verbose] [--no-cache]")
+        print(f"                                 # 每个trace的键/长度/dtype/min/max/mean (并行, 带缓存)")
         print("\n示例:")
         print(f"  {sys.argv[0]} ghent/rates_delay_loss_gcc_report_bicycle_0001.pickle")
         print(f"  {sys.argv[0]} list")
         print(f"  {sys.argv[0]} list ghent/")
+        print(f"  {sys.argv[0]} summary data/ --json reports/trace_summary.json")
         sys.exit(1)
     
     if sys.argv[1] == 'list':
         directory = sys.argv[2] if len(sys.argv) > 2 else '.'
         list_pickle_files(directory)
+    elif sys.argv[1] == 'summary':
+        args = sys.argv[2:]
+        options = {}
+        for flag in ('--workers', '--json'):
+            if flag in args:
+                i = args.index(flag)
+                options[flag] = args[i + 1]
+                del args[i:i + 2]
+        flags = {flag for flag in ('--verbose', '--no-cache') if flag in args}
+        args = [a for a in args if a not in flags]
+        directory = args[0] if args else '.'
+        workers = int(options['--workers']) if '--workers' in options else None
+        results = summarize_directory(directory, workers=workers, use_cache='--no-cache' not in flags)
+        print_summaries(results, verbose='--verbose' in flags)
+        if '--json' in options:
+            with open(options['--json'], 'w') as f:
+                json.dump(dict(results), f, indent=2, ensure_ascii=False)
+            print(f"\n摘要已写入: {options['--json']}")
     else:
         file_path = sys.argv[1]
         if not os.path.exists(file_path):